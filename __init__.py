@@ -5,6 +5,9 @@ NODE_CLASS_MAPPINGS = {
     "MultiStepKSampler": MultiStepKSampler,
     "CrossStepSwitchKSampler": CrossStepSwitchKSampler,
     "CrossMultiStepKSampler": CrossMultiStepKSampler,
+    "SwitchSamplerStage": SwitchSamplerStage,
+    "StagePlanKSampler": StagePlanKSampler,
+    "StepSwitchSweepKSampler": StepSwitchSweepKSampler,
 }
 
 __all__ = list(NODE_CLASS_MAPPINGS.keys())
\ No newline at end of file
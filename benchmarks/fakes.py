@@ -0,0 +1,101 @@
+import copy
+import uuid
+
+import torch
+import torch.nn.functional as F
+
+
+def _fold_frames(x):
+    """(B, C, T, H, W) → (B*T, C, H, W), plus the function undoing it."""
+    if x.ndim != 5:
+        return x, lambda y: y
+    b, c, t, h, w = x.shape
+    folded = x.permute(0, 2, 1, 3, 4).reshape(b * t, c, h, w)
+    return folded, lambda y: y.reshape(b, t, *y.shape[1:]).permute(0, 2, 1, 3, 4)
+
+
+class FakeModel:
+    """
+    Stand-in for a ModelPatcher. Every denoise call runs `cost` 3x3
+    convolutions of `width` channels over the latent, so the per-step cost
+    scales with batch, resolution and frames like a real denoiser would.
+    """
+
+    def __init__(self, channels=4, cost=1, width=32, seed=0):
+        generator = torch.Generator().manual_seed(seed)
+        layers = []
+        for i in range(max(cost, 0)):
+            layers.append(torch.nn.Conv2d(channels if i == 0 else width, width, 3, padding=1))
+            layers.append(torch.nn.SiLU())
+        layers.append(torch.nn.Conv2d(width if cost > 0 else channels, channels, 1))
+        self.model = torch.nn.Sequential(*layers).requires_grad_(False)
+        for p in self.model.parameters():
+            p.copy_(torch.randn(p.shape, generator=generator) * 0.05)
+        self.latent_channels = channels
+        self.load_device = torch.device("cpu")
+        self.patches = {}
+        self.patches_uuid = uuid.uuid4()
+        self.model_options = {"transformer_options": {}}
+
+    def clone(self):
+        """Shares the weights, like ModelPatcher.clone; options are copied."""
+        n = copy.copy(self)
+        n.model_options = copy.deepcopy(self.model_options)
+        return n
+
+    def get_model_object(self, name):
+        return getattr(self, name, None)
+
+    def model_size(self):
+        return sum(p.numel() * p.element_size() for p in self.model.parameters())
+
+    def denoise(self, x, sigma):
+        folded, unfold = _fold_frames(x)
+        return unfold(folded - self.model(folded.float()).to(folded.dtype) * float(sigma))
+
+
+class FakeVAE:
+    """
+    Stand-in for comfy.sd.VAE with a `factor`x spatial factor. `cost` extra
+    3x3 convolutions run at pixel resolution on decode and encode.
+    """
+
+    def __init__(self, channels=4, cost=1, seed=0, factor=8):
+        generator = torch.Generator().manual_seed(seed)
+        self.latent_channels = channels
+        self.downscale_ratio = self.upscale_ratio = factor
+        self.to_rgb = torch.randn(3, channels, 1, 1, generator=generator) * 0.3
+        self.from_rgb = torch.randn(channels, 3, 1, 1, generator=generator) * 0.3
+        self.pixel_convs = [torch.randn(3, 3, 3, 3, generator=generator) * 0.1 for _ in range(max(cost, 0))]
+        # the weights as a module, like comfy's VAE.first_stage_model, so the VAE can be fingerprinted
+        weights = {"to_rgb": self.to_rgb, "from_rgb": self.from_rgb,
+                   **{f"pixel_conv{i}": w for i, w in enumerate(self.pixel_convs)}}
+        self.first_stage_model = torch.nn.ParameterDict(
+            {k: torch.nn.Parameter(w, requires_grad=False) for k, w in weights.items()})
+
+    def _pixel_work(self, img):
+        for weight in self.pixel_convs:
+            img = img + F.conv2d(img, weight, padding=1) * 0.01
+        return img
+
+    def decode(self, samples):
+        folded, _ = _fold_frames(samples)
+        img = F.interpolate(F.conv2d(folded.float(), self.to_rgb), scale_factor=self.upscale_ratio,
+                            mode="nearest")
+        img = self._pixel_work(img).sigmoid().permute(0, 2, 3, 1)
+        if samples.ndim == 5:
+            b, _, t = samples.shape[:3]
+            img = img.reshape(b, t, *img.shape[1:])
+        return img
+
+    def encode(self, pixels):
+        img = self._pixel_work(pixels.float().permute(0, 3, 1, 2))
+        return F.conv2d(F.avg_pool2d(img, self.downscale_ratio), self.from_rgb)
+
+    def decode_tiled(self, samples, tile_x=64, tile_y=64, overlap=16, tile_t=None, overlap_t=None):
+        return self.decode(samples)
+
+
+def fake_conditioning(tokens=77, dim=64, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return [[torch.randn(1, tokens, dim, generator=generator), {"pooled_output": torch.randn(1, dim, generator=generator)}]]
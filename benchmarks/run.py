@@ -0,0 +1,201 @@
+"""
+CPU benchmarks for the switch sampler nodes, runnable without ComfyUI.
+
+Lightweight stand-ins for `comfy.*`, `latent_preview` and `nodes` live in
+benchmarks/stubs; models and VAEs are deterministic fakes whose cost is
+set on the command line (see benchmarks/fakes.py). Every case is timed over
+a matrix of batch sizes, latent resolutions and 4D (image) / 5D (video)
+layouts, and the results are written as JSON so runs can be compared:
+
+    python benchmarks/run.py --out before.json
+    python benchmarks/run.py --out after.json --compare before.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, os.path.join(HERE, "stubs"))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(ROOT, "headless"))
+
+import torch  # noqa: E402
+
+import nodes as comfy_nodes  # noqa: E402  (the stub of ComfyUI's nodes.py)
+from backends import load_package  # noqa: E402
+from fakes import FakeModel, FakeVAE, fake_conditioning  # noqa: E402
+
+
+load_package()
+from switch_samplers.nodes import bridge, cross_multistep, cross_step_switch, helpers, multistep, step_switch  # noqa: E402
+
+# cache and profiling off so every repeat does the full work
+_NODE_OPTIONS = {"stage_cache": "off", "profile": "off"}
+
+
+def _latent(batch, size, layout, frames, channels=4):
+    shape = (batch, channels, frames, size, size) if layout == "5d" else (batch, channels, size, size)
+    return {"samples": torch.zeros(shape)}
+
+
+def _cases(args):
+    """name → factory(latent) returning the zero-argument callable to time."""
+    m1 = FakeModel(4, args.model_cost, seed=1)
+    m2 = FakeModel(4, args.model_cost, seed=2)
+    m3 = FakeModel(4, args.model_cost, seed=3)
+    m_wide = FakeModel(16, args.model_cost, seed=4)
+    vae1, vae2 = FakeVAE(4, args.vae_cost, seed=1), FakeVAE(16, args.vae_cost, seed=2)
+    cond = fake_conditioning()
+    steps, half = args.steps, args.steps // 2
+    stage_steps = [max(1, args.steps // 3)] * 3
+    common = dict(seed=0, sampler_before="euler", sampler_after="dpmpp_2m", scheduler_before="normal",
+                  scheduler_after="karras", cfg_before=7.0, cfg_after=5.0, **_NODE_OPTIONS)
+    multi = {f"{key}_stage{i + 1}": value
+             for i in range(3)
+             for key, value in (("steps", stage_steps[i]), ("sampler", "euler"), ("scheduler", "normal"),
+                                ("cfg", 6.0))}
+
+    return {
+        "ksampler_baseline": lambda latent: lambda: comfy_nodes.KSampler().sample(
+            m1, 0, steps, 7.0, "euler", "normal", cond, cond, latent),
+        "prepare_latent": lambda latent: lambda: helpers._prepare_latent_samples(m1, latent),
+        "call_ksampler_overhead": lambda latent: lambda: helpers._call_ksampler(
+            FakeModel(4, 0), latent, 1, "euler", "normal", 1.0, cond, cond, 0),
+        "bridge_vae": lambda latent: lambda: bridge._bridge_latent(latent["samples"], vae1, vae2),
+        "bridge_tiled": lambda latent: lambda: bridge._bridge_latent(latent["samples"], vae1, vae2,
+                                                                     memory_mb=args.bridge_mb),
+        "step_switch": lambda latent: lambda: step_switch._step_switch_handler(None, latent, dict(
+            common, model1=m1, model2=m2, positive=cond, negative=cond, total_steps=steps, switch_point=half)),
+        "multistep": lambda latent: lambda: multistep._multistep_handler(None, latent, dict(
+            multi, model1=m1, model2=m2, model3=m3, positive=cond, negative=cond, **_NODE_OPTIONS)),
+        "cross_step_switch": lambda latent: lambda: cross_step_switch._cross_step_switch_handler(None, latent, dict(
+            common, model1=m1, model2=m_wide, vae1=vae1, vae2=vae2, positive1=cond, negative1=cond,
+            total_steps=steps, switch_point=half)),
+        "cross_multistep": lambda latent: lambda: cross_multistep._cross_multistep_handler(None, latent, dict(
+            multi, model1=m1, model2=m_wide, model3=m_wide, vae1=vae1, vae2=vae2, positive1=cond, negative1=cond,
+            **_NODE_OPTIONS)),
+    }
+
+
+def _time(fn, repeats, warmup):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    torch.manual_seed(0)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    cases = _cases(args)
+    selected = args.cases or list(cases)
+    unknown = set(selected) - set(cases)
+    if unknown:
+        raise SystemExit(f"Unknown cases: {', '.join(sorted(unknown))}. Available: {', '.join(cases)}")
+
+    results = []
+    for name, batch, size, layout in itertools.product(selected, args.batch, args.size, args.layout):
+        fn = cases[name](_latent(batch, size, layout, args.frames))
+        times = _time(fn, args.repeats, args.warmup)
+        results.append({
+            "case": name, "batch": batch, "size": size, "layout": layout,
+            "min_ms": round(min(times), 3), "median_ms": round(statistics.median(times), 3),
+            "mean_ms": round(statistics.fmean(times), 3), "repeats": len(times),
+        })
+        print(f"{name:24s} b={batch:<3d} {size:>4d}px {layout}  median {results[-1]['median_ms']:10.2f} ms")
+
+    return {
+        "meta": {
+            "git": _git_revision(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "torch": torch.__version__, "platform": platform.platform(), "threads": torch.get_num_threads(),
+            "steps": args.steps, "frames": args.frames, "model_cost": args.model_cost, "vae_cost": args.vae_cost,
+        },
+        "results": results,
+    }
+
+
+def _key(result):
+    return result["case"], result["batch"], result["size"], result["layout"]
+
+
+def compare(current, baseline, threshold):
+    """Print the median ratio against `baseline` per entry; returns the entries slower than 1 + threshold."""
+    previous = {_key(r): r for r in baseline["results"]}
+    regressions = []
+    print(f"\ncompared with {baseline['meta'].get('git') or 'baseline'} ({baseline['meta'].get('time')})")
+    for result in current["results"]:
+        old = previous.get(_key(result))
+        if old is None or old["median_ms"] <= 0:
+            continue
+        ratio = result["median_ms"] / old["median_ms"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append((result, ratio))
+        case, batch, size, layout = _key(result)
+        print(f"{case:24s} b={batch:<3d} {size:>4d}px {layout}  {old['median_ms']:10.2f} → "
+              f"{result['median_ms']:10.2f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", help="Write results JSON here (default benchmarks/results/<git rev>.json).")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Relative slowdown counted as a regression (default 0.15).")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on regressions.")
+    parser.add_argument("--cases", nargs="+", help="Subset of cases to run.")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--size", type=int, nargs="+", default=[32, 64], help="Latent height/width.")
+    parser.add_argument("--layout", nargs="+", choices=("4d", "5d"), default=["4d", "5d"])
+    parser.add_argument("--frames", type=int, default=4, help="Latent frames of 5D cases.")
+    parser.add_argument("--steps", type=int, default=6)
+    parser.add_argument("--model-cost", type=int, default=1, help="Conv layers per fake denoiser call.")
+    parser.add_argument("--vae-cost", type=int, default=1, help="Pixel-space convs per fake VAE call.")
+    parser.add_argument("--bridge-mb", type=int, default=64, help="Memory budget of the bridge_tiled case.")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=0, help="torch threads (0 keeps the default).")
+    parser.add_argument("--quick", action="store_true", help="Smallest matrix, for smoke runs.")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.batch, args.size, args.repeats = [1], [32], 2
+
+    current = run(args)
+    out = args.out or os.path.join(HERE, "results", f"{current['meta']['git'] or 'run'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"\nresults written to {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(current, json.load(f), args.threshold)
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
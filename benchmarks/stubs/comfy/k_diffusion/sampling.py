@@ -0,0 +1,63 @@
+import torch
+
+
+def default_noise_sampler(x, seed=None):
+    """k-diffusion's: fresh gaussian noise the size of the whole `x`, from a generator seeded with `seed`."""
+    generator = torch.Generator(device=x.device).manual_seed(seed) if seed is not None else None
+    return lambda sigma, sigma_next: torch.randn(x.size(), dtype=x.dtype, layout=x.layout, device=x.device,
+                                                 generator=generator)
+
+
+class BrownianTreeNoiseSampler:
+    """
+    Stand-in for k-diffusion's: noise is a function of the interval, the seed
+    and the whole `x` shape, so the same interval always gives the same noise.
+    """
+
+    def __init__(self, x, sigma_min, sigma_max, seed=None, transform=lambda x: x, cpu=False):
+        self.shape, self.dtype, self.device = x.shape, x.dtype, x.device
+        self.seed = 0 if seed is None else seed
+
+    def __call__(self, sigma, sigma_next):
+        key = hash((self.seed, round(float(sigma), 6), round(float(sigma_next), 6))) & 0xFFFFFFFF
+        generator = torch.Generator().manual_seed(key)
+        return torch.randn(self.shape, generator=generator).to(self.device, self.dtype)
+
+
+def _steps(model, x, sigmas, extra_args, callback, noise_sampler=None):
+    """
+    The stub's Euler-like update, calling the model once per step. With a
+    noise sampler, every step but the last adds noise scaled by the next sigma.
+    """
+    extra_args = {} if extra_args is None else extra_args
+    with torch.no_grad():
+        for i in range(len(sigmas) - 1):
+            denoised = model(x, sigmas[i], **extra_args)
+            if callback is not None:
+                callback({"x": x, "i": i, "sigma": sigmas[i], "sigma_hat": sigmas[i], "denoised": denoised})
+            x = x + (denoised - x) * (sigmas[i] - sigmas[i + 1])
+            if noise_sampler is not None and sigmas[i + 1] > 0:
+                x = x + noise_sampler(sigmas[i], sigmas[i + 1]) * sigmas[i + 1] * 0.5
+    return x
+
+
+def sample_euler(model, x, sigmas, extra_args=None, callback=None, disable=None):
+    return _steps(model, x, sigmas, extra_args, callback)
+
+
+def sample_dpmpp_2m(model, x, sigmas, extra_args=None, callback=None, disable=None):
+    return _steps(model, x, sigmas, extra_args, callback)
+
+
+def sample_euler_ancestral(model, x, sigmas, extra_args=None, callback=None, disable=None, noise_sampler=None):
+    seed = (extra_args or {}).get("seed")
+    noise_sampler = default_noise_sampler(x, seed=seed) if noise_sampler is None else noise_sampler
+    return _steps(model, x, sigmas, extra_args, callback, noise_sampler)
+
+
+def sample_dpmpp_sde(model, x, sigmas, extra_args=None, callback=None, disable=None, noise_sampler=None):
+    seed = (extra_args or {}).get("seed")
+    sigma_min, sigma_max = sigmas[sigmas > 0].min(), sigmas.max()
+    noise_sampler = BrownianTreeNoiseSampler(x, sigma_min, sigma_max, seed=seed, cpu=True) \
+        if noise_sampler is None else noise_sampler
+    return _steps(model, x, sigmas, extra_args, callback, noise_sampler)
@@ -0,0 +1,31 @@
+import torch
+
+
+def get_torch_device():
+    return torch.device("cpu")
+
+
+def get_free_memory(dev=None, torch_free_too=False):
+    return 64 * 1024 ** 3
+
+
+def minimum_inference_memory():
+    return 1024 ** 3
+
+
+_loaded = []
+
+
+def loaded_models(only_currently_used=False):
+    return list(_loaded)
+
+
+def load_models_gpu(models, memory_required=0, force_patch_weights=False, minimum_memory_required=None,
+                    force_full_load=False):
+    for m in models:
+        if not any(m is l for l in _loaded):
+            _loaded.append(m)
+
+
+def throw_exception_if_processing_interrupted():
+    pass
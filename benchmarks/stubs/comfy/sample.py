@@ -0,0 +1,49 @@
+import torch
+
+import comfy.samplers
+
+
+def prepare_noise(latent_image, seed, noise_inds=None):
+    generator = torch.manual_seed(seed)
+    if noise_inds is None:
+        return torch.randn(latent_image.size(), dtype=latent_image.dtype, layout=latent_image.layout,
+                           generator=generator, device="cpu")
+    unique_inds, inverse = torch.unique(torch.tensor(noise_inds), return_inverse=True)
+    noises = []
+    for i in range(int(unique_inds[-1]) + 1):
+        noise = torch.randn([1] + list(latent_image.size())[1:], dtype=latent_image.dtype,
+                            layout=latent_image.layout, generator=generator, device="cpu")
+        if i in unique_inds:
+            noises.append(noise)
+    return torch.cat([noises[i] for i in inverse], dim=0)
+
+
+def fix_empty_latent_channels(model, latent_image):
+    channels = getattr(model, "latent_channels", latent_image.shape[1])
+    if latent_image.shape[1] != channels and torch.count_nonzero(latent_image) == 0:
+        shape = list(latent_image.shape)
+        shape[1] = channels
+        return torch.zeros(shape, dtype=latent_image.dtype, device=latent_image.device)
+    return latent_image
+
+
+def sample(model, noise, steps, cfg, sampler_name, scheduler, positive, negative, latent_image, denoise=1.0,
+           disable_noise=False, start_step=None, last_step=None, force_full_denoise=False, noise_mask=None,
+           sigmas=None, callback=None, disable_pbar=False, seed=None):
+    """
+    comfy's: a KSampler over the stub's linear schedule. Samplers are
+    Euler-like loops in comfy.k_diffusion.sampling; ancestral ones add
+    per-step noise from k-diffusion's default noise sampler for the whole `x`.
+    """
+    sampler = comfy.samplers.KSampler(model, steps=steps, device="cpu", sampler=sampler_name, scheduler=scheduler,
+                                      denoise=denoise, model_options=getattr(model, "model_options", {}))
+    return sampler.sample(noise, positive, negative, cfg=cfg, latent_image=latent_image, start_step=start_step,
+                          last_step=last_step, force_full_denoise=force_full_denoise, denoise_mask=noise_mask,
+                          sigmas=sigmas, callback=callback, disable_pbar=disable_pbar, seed=seed)
+
+
+def sample_custom(model, noise, cfg, sampler, sigmas, positive, negative, latent_image, noise_mask=None,
+                  callback=None, disable_pbar=False, seed=None):
+    return comfy.samplers.sample(model, noise, positive, negative, cfg, "cpu", sampler, sigmas,
+                                 model_options=getattr(model, "model_options", {}), latent_image=latent_image,
+                                 denoise_mask=noise_mask, callback=callback, disable_pbar=disable_pbar, seed=seed)
@@ -0,0 +1,106 @@
+import torch
+
+import comfy.k_diffusion.sampling as k_diffusion_sampling
+
+
+class KSAMPLER:
+    def __init__(self, sampler_function, extra_options={}, inpaint_options={}):
+        self.sampler_function = sampler_function
+        self.extra_options = extra_options
+        self.inpaint_options = inpaint_options
+
+    def sample(self, model_k, sigmas, extra_args, callback, noise, latent_image=None, denoise_mask=None,
+               disable_pbar=False):
+        total_steps = len(sigmas) - 1
+        k_callback = None
+        if callback is not None:
+            k_callback = lambda x: callback(x["i"], x["denoised"], x["x"], total_steps)  # noqa: E731
+        # comfy's noise scaling for eps models
+        x = latent_image + noise.to(latent_image.device) * sigmas[0]
+        return self.sampler_function(model_k, x, sigmas, extra_args=extra_args, callback=k_callback,
+                                     disable=disable_pbar, **self.extra_options)
+
+
+def ksampler(sampler_name, extra_options={}, inpaint_options={}):
+    return KSAMPLER(getattr(k_diffusion_sampling, "sample_{}".format(sampler_name)), extra_options, inpaint_options)
+
+
+class KSampler:
+    SAMPLERS = ["euler", "euler_ancestral", "dpmpp_2m", "dpmpp_sde"]
+    SCHEDULERS = ["normal", "karras", "exponential", "simple"]
+
+    def __init__(self, model, steps, device, sampler=None, scheduler=None, denoise=None, model_options={}):
+        self.model = model
+        self.device = device
+        self.sampler = sampler
+        self.model_options = model_options
+        self.sigmas = calculate_sigmas(None, scheduler, steps)
+
+    def sample(self, noise, positive, negative, cfg, latent_image=None, start_step=None, last_step=None,
+               force_full_denoise=False, denoise_mask=None, sigmas=None, callback=None, disable_pbar=False,
+               seed=None):
+        """comfy's step-window slicing of the schedule."""
+        sigmas = self.sigmas if sigmas is None else sigmas
+        if last_step is not None and last_step < (len(sigmas) - 1):
+            sigmas = sigmas[:last_step + 1].clone()
+            if force_full_denoise:
+                sigmas[-1] = 0
+        if start_step is not None:
+            if start_step < (len(sigmas) - 1):
+                sigmas = sigmas[start_step:]
+            elif latent_image is not None:
+                return latent_image
+            else:
+                return torch.zeros_like(noise)
+        return sample(self.model, noise, positive, negative, cfg, self.device, ksampler(self.sampler), sigmas,
+                      self.model_options, latent_image=latent_image, denoise_mask=denoise_mask, callback=callback,
+                      disable_pbar=disable_pbar, seed=seed)
+
+
+def _predict(model, x, sigma, cfg, positive, negative):
+    """comfy's sampling_function: no negative pass at cfg 1.0, calc_cond_batch hook honoured."""
+    options = getattr(model, "model_options", {})
+    uncond = None if cfg == 1.0 and not options.get("disable_cfg1_optimization", False) else negative
+    args = {"conditions": [positive, uncond], "input": x, "sigma": torch.full((x.shape[0],), float(sigma)),
+            "model": model, "model_options": options}
+    hook = options.get("sampler_calc_cond_batch_function")
+    if hook is not None:
+        cond, uncond = hook(args)[:2]
+    else:
+        cond, uncond = calc_cond_batch(model, args["conditions"], x, args["sigma"], options)
+    return uncond + (cond - uncond) * cfg
+
+
+def sample(model, noise, positive, negative, cfg, device, sampler, sigmas, model_options={}, latent_image=None,
+           denoise_mask=None, callback=None, disable_pbar=False, seed=None):
+    """Runs `sampler` over `sigmas`, calling the fake model once per step and condition."""
+    latent_image = latent_image.to(noise.dtype)
+    model_k = lambda x, sigma, **kwargs: _predict(model, x, sigma, cfg, positive, negative)  # noqa: E731
+    return sampler.sample(model_k, sigmas, {"model_options": model_options, "seed": seed}, callback, noise,
+                          latent_image, denoise_mask, disable_pbar)
+
+
+def calculate_sigmas(model_sampling, scheduler_name, steps):
+    return torch.linspace(1.0, 0.0, steps + 1)
+
+
+def calc_cond_batch(model, conds, x_in, timestep, model_options):
+    """
+    One fake model call per condition that is set; unset ones come back as
+    zeros, like comfy's. A `model_function_wrapper` gets the call as in comfy.
+    """
+    wrapper = model_options.get("model_function_wrapper")
+
+    def apply_model(x, t, **c):
+        return model.denoise(x, float(t.flatten()[0]))
+
+    out = []
+    for i, cond in enumerate(conds):
+        if cond is None:
+            out.append(torch.zeros_like(x_in))
+        elif wrapper is not None:
+            out.append(wrapper(apply_model, {"input": x_in, "timestep": timestep, "c": {"transformer_options": {}},
+                                             "cond_or_uncond": [i]}))
+        else:
+            out.append(apply_model(x_in, timestep))
+    return out
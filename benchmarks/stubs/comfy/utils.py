@@ -0,0 +1,20 @@
+import torch.nn.functional as F
+
+PROGRESS_BAR_ENABLED = False
+
+
+def common_upscale(samples, width, height, upscale_method, crop):
+    """4D resize like comfy's; bislerp is approximated by bilinear, and 5D input is rejected like older comfy."""
+    if samples.ndim != 4:
+        raise ValueError(f"common_upscale expects a 4D tensor, got {samples.ndim}D")
+    mode = "bilinear" if upscale_method == "bislerp" else upscale_method
+    return F.interpolate(samples, size=(height, width), mode=mode)
+
+
+class ProgressBar:
+    def __init__(self, total):
+        self.total = total
+        self.current = 0
+
+    def update_absolute(self, value, total=None, preview=None):
+        self.current = value
@@ -0,0 +1,16 @@
+class Latent2RGBPreviewer:
+    def __init__(self, latent_rgb_factors, latent_rgb_factors_bias=None):
+        self.latent_rgb_factors = latent_rgb_factors
+
+    def decode_latent_to_preview_image(self, preview_format, x0):
+        return preview_format, None, 512
+
+
+def get_previewer(device, latent_format):
+    return None
+
+
+def prepare_callback(model, steps, x0_output_dict=None):
+    def callback(step, x0, x, total_steps):
+        pass
+    return callback
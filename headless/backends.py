@@ -0,0 +1,164 @@
+"""
+Backends resolve the MODEL / VAE / CONDITIONING / LATENT inputs of a job
+and make `comfy.*` importable before the node package is loaded.
+
+Each worker process creates one backend and keeps every model, VAE and
+encoded prompt it resolved for the jobs that follow, so consecutive jobs
+on the same checkpoints never reload them.
+
+A custom backend is any class with the `Backend` interface, passed to the
+runner as `--backend package.module:ClassName`.
+"""
+import importlib
+import importlib.util
+import os
+import sys
+import zlib
+
+import torch
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+
+def load_package():
+    """Import the repo as `switch_samplers`; its directory name is not a valid module name."""
+    if "switch_samplers" in sys.modules:
+        return sys.modules["switch_samplers"]
+    spec = importlib.util.spec_from_file_location("switch_samplers", os.path.join(ROOT, "__init__.py"),
+                                                  submodule_search_locations=[ROOT])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules["switch_samplers"] = package
+    spec.loader.exec_module(package)
+    return package
+
+
+class Backend:
+    """
+    Resolves job inputs by name. Subclasses implement the `_load_*` methods;
+    results are kept resident for the lifetime of the worker.
+    """
+
+    def __init__(self, **options):
+        self.options = options
+        self._resident = {}
+
+    def setup(self):
+        """Make `comfy.*`, `latent_preview` and `folder_paths` importable."""
+
+    def _cached(self, kind, key, load):
+        if (kind, key) not in self._resident:
+            self._resident[(kind, key)] = load()
+        return self._resident[(kind, key)]
+
+    def model(self, name):
+        return self._cached("model", name, lambda: self._load_model(name))
+
+    def vae(self, name):
+        return self._cached("vae", name, lambda: self._load_vae(name))
+
+    def conditioning(self, text, clip):
+        """`text` encoded with the text encoder of checkpoint `clip`."""
+        return self._cached("conditioning", (clip, text), lambda: self._encode(text, clip))
+
+    def empty_latent(self, width, height, batch_size=1, length=None):
+        """Zero latent like EmptyLatentImage; `length` frames make it 5D. Channels are fixed up per model."""
+        shape = (batch_size, 4, length, height // 8, width // 8) if length else (batch_size, 4, height // 8, width // 8)
+        return {"samples": torch.zeros(shape)}
+
+    def _load_model(self, name):
+        raise NotImplementedError
+
+    def _load_vae(self, name):
+        raise NotImplementedError
+
+    def _encode(self, text, clip):
+        raise NotImplementedError
+
+
+class ComfyBackend(Backend):
+    """
+    Real checkpoints from a ComfyUI install (`--comfy-root`). MODEL and
+    CONDITIONING names are checkpoints; a VAE name is either a checkpoint
+    already loaded for the job or a file in models/vae.
+    """
+
+    def setup(self):
+        root = self.options.get("comfy_root") or os.environ.get("COMFYUI_ROOT")
+        if not root:
+            raise ValueError("The comfy backend needs --comfy-root (or $COMFYUI_ROOT).")
+        sys.path.insert(0, os.path.abspath(root))
+
+    def _checkpoint(self, name):
+        def load():
+            import comfy.sd
+            import folder_paths
+            path = folder_paths.get_full_path_or_raise("checkpoints", name)
+            return comfy.sd.load_checkpoint_guess_config(
+                path, output_vae=True, output_clip=True,
+                embedding_directory=folder_paths.get_folder_paths("embeddings"))[:3]
+        return self._cached("checkpoint", name, load)
+
+    def _load_model(self, name):
+        return self._checkpoint(name)[0]
+
+    def _load_vae(self, name):
+        import comfy.sd
+        import comfy.utils
+        import folder_paths
+        if ("checkpoint", name) in self._resident or name in folder_paths.get_filename_list("checkpoints"):
+            return self._checkpoint(name)[2]
+        return comfy.sd.VAE(sd=comfy.utils.load_torch_file(folder_paths.get_full_path_or_raise("vae", name)))
+
+    def _encode(self, text, clip):
+        encoder = self._checkpoint(clip)[1]
+        tokens = encoder.tokenize(text)
+        if hasattr(encoder, "encode_from_tokens_scheduled"):
+            return encoder.encode_from_tokens_scheduled(tokens)
+        cond, pooled = encoder.encode_from_tokens(tokens, return_pooled=True)
+        return [[cond, {"pooled_output": pooled}]]
+
+
+class StubBackend(Backend):
+    """
+    CPU fakes from benchmarks/ for testing the runner without ComfyUI.
+    A name like "flux:16" gives a model or VAE with 16 latent channels;
+    weights are seeded from the name, so a name always means the same fake.
+    """
+
+    def setup(self):
+        benchmarks = os.path.join(ROOT, "benchmarks")
+        sys.path.insert(0, os.path.join(benchmarks, "stubs"))
+        sys.path.insert(0, benchmarks)
+
+    @staticmethod
+    def _spec(name):
+        base, _, channels = str(name).partition(":")
+        return zlib.crc32(base.encode()), int(channels or 4)
+
+    def _load_model(self, name):
+        from fakes import FakeModel
+        seed, channels = self._spec(name)
+        return FakeModel(channels, int(self.options.get("stub_cost", 1)), seed=seed)
+
+    def _load_vae(self, name):
+        from fakes import FakeVAE
+        seed, channels = self._spec(name)
+        return FakeVAE(channels, int(self.options.get("stub_cost", 1)), seed=seed)
+
+    def _encode(self, text, clip):
+        from fakes import fake_conditioning
+        return fake_conditioning(seed=zlib.crc32(f"{clip}\0{text}".encode()))
+
+
+BACKENDS = {"comfy": ComfyBackend, "stub": StubBackend}
+
+
+def make_backend(spec, **options):
+    """`spec` is a name from BACKENDS or "module:ClassName"."""
+    if spec in BACKENDS:
+        return BACKENDS[spec](**options)
+    module, _, attr = spec.partition(":")
+    if not attr:
+        raise ValueError(f"Unknown backend '{spec}', expected one of {sorted(BACKENDS)} or module:ClassName")
+    return getattr(importlib.import_module(module), attr)(**options)
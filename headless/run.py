@@ -0,0 +1,226 @@
+"""
+Headless batch runner for the switch sampler nodes, without the graph executor.
+
+Jobs are read from a JSONL file, one per line. Each names a node from
+NODE_CLASS_MAPPINGS and gives its inputs as the node's own parameters:
+
+    {"id": "cat-01", "node": "MultiStepKSampler",
+     "inputs": {"model1": "sdxl.safetensors", "model2": "sdxl_refiner.safetensors",
+                "positive": "a cat", "negative": "blurry", "seed": 1,
+                "latent_image": {"width": 1024, "height": 1024, "batch_size": 2},
+                "steps_stage1": 12, "sampler_stage1": "euler", "scheduler_stage1": "normal", ...}}
+
+Inputs are resolved by their declared type. MODEL and VAE values are
+names. CONDITIONING is prompt text, or {"text": ..., "clip": checkpoint}.
+The text is encoded by the job's "clip", else by the model with the same
+suffix ("positive2" -> "model2"), else by the first model. LATENT is an
+empty-latent size ({"width", "height", "batch_size", "length"}) or
+{"path": "file.latent"}. STAGE_PLAN is a list of SwitchSamplerStage input
+dicts. Everything else is passed through as is.
+
+Jobs are spread over `--workers` processes. Each worker keeps the models it
+loaded resident for the jobs that follow (see backends.py). Output latents
+are written as `<out>/<id>.latent`, in the same format as SaveLatent. One
+record per job goes to `<out>/results.jsonl`:
+
+    python headless/run.py jobs.jsonl --out out/ --workers 2 --comfy-root ~/ComfyUI --devices 0 1
+    python headless/run.py jobs.jsonl --out /tmp/out --backend stub
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import torch
+
+from backends import load_package, make_backend
+
+_worker = {}
+
+
+def _init_worker(backend_spec, options, out_dir, devices=None, counter=None):
+    if devices:
+        index = 0
+        if counter is not None:
+            # one device per pool worker, round robin
+            with counter.get_lock():
+                index = counter.value
+                counter.value += 1
+        # before anything touches CUDA in this process
+        os.environ["CUDA_VISIBLE_DEVICES"] = devices[index % len(devices)]
+    backend = make_backend(backend_spec, **options)
+    backend.setup()
+    _worker.update(backend=backend, mappings=load_package().NODE_CLASS_MAPPINGS, out_dir=out_dir)
+
+
+def _input_types(cls):
+    types = cls.INPUT_TYPES()
+    return {**types.get("optional", {}), **types["required"]}
+
+
+def _default_clip(name, inputs, types, clip):
+    if clip:
+        return clip
+    models = [k for k in inputs if types.get(k, (None,))[0] == "MODEL"]
+    digits = name[len(name.rstrip("0123456789")):]
+    for k in models:
+        if digits and k[len(k.rstrip("0123456789")):] == digits:
+            return inputs[k]
+    if not models:
+        raise ValueError(f"No model to encode '{name}' with; give the job a \"clip\" checkpoint.")
+    return inputs[sorted(models)[0]]
+
+
+def _load_latent(path):
+    import safetensors.torch
+    sd = safetensors.torch.load_file(path)
+    # same convention as LoadLatent: files without the version key are pre-scaled
+    multiplier = 1.0 if "latent_format_version_0" in sd else 1.0 / 0.18215
+    return {"samples": sd["latent_tensor"].float() * multiplier}
+
+
+def _save_latent(latent, path):
+    import safetensors.torch
+    safetensors.torch.save_file({"latent_tensor": latent["samples"].detach().cpu().contiguous(),
+                                 "latent_format_version_0": torch.tensor([])}, path)
+
+
+def _resolve(node, inputs, clip=None):
+    """Node class and its inputs with names, prompts and sizes turned into objects."""
+    backend, mappings = _worker["backend"], _worker["mappings"]
+    if node not in mappings:
+        raise ValueError(f"Unknown node '{node}', expected one of {sorted(mappings)}")
+    cls = mappings[node]
+    types = _input_types(cls)
+    resolved = {}
+    for name, value in inputs.items():
+        kind = types.get(name, (None,))[0]
+        if kind == "MODEL":
+            value = backend.model(value)
+        elif kind == "VAE":
+            value = backend.vae(value)
+        elif kind == "CONDITIONING":
+            if isinstance(value, dict):
+                value = backend.conditioning(value["text"],
+                                             value.get("clip") or _default_clip(name, inputs, types, clip))
+            else:
+                value = backend.conditioning(value, _default_clip(name, inputs, types, clip))
+        elif kind == "LATENT":
+            value = _load_latent(value["path"]) if "path" in value else backend.empty_latent(
+                value.get("width", 1024), value.get("height", 1024), value.get("batch_size", 1), value.get("length"))
+        elif kind == "STAGE_PLAN":
+            plan = None
+            for stage in value:
+                stage_cls, stage_inputs = _resolve("SwitchSamplerStage", stage, clip)
+                plan = stage_cls().sample(**stage_inputs, stage_plan=plan)[0]
+            value = plan
+        resolved[name] = value
+    return cls, resolved
+
+
+def _run_job(job):
+    start = time.perf_counter()
+    record = {"id": job["id"], "worker": os.getpid()}
+    try:
+        cls, inputs = _resolve(job["node"], job.get("inputs", {}), job.get("clip"))
+        results = cls().sample(**inputs)
+        names = getattr(cls, "RETURN_NAMES", cls.RETURN_TYPES)
+        latents = sum(kind == "LATENT" for kind in cls.RETURN_TYPES)
+        outputs = {}
+        for name, kind, value in zip(names, cls.RETURN_TYPES, results):
+            if kind == "LATENT":
+                path = os.path.join(_worker["out_dir"], f"{job['id']}.latent" if latents == 1
+                                    else f"{job['id']}.{name}.latent")
+                _save_latent(value, path)
+                value = path
+            outputs[name] = value
+        record.update(status="ok", outputs=outputs)
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}", traceback=traceback.format_exc())
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def _read_jobs(path):
+    jobs, seen = [], set()
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            job["id"] = str(job.get("id", line_no))
+            if "node" not in job:
+                raise ValueError(f"{path}:{line_no}: job '{job['id']}' has no \"node\"")
+            if job["id"] in seen:
+                raise ValueError(f"{path}:{line_no}: duplicate job id '{job['id']}'")
+            seen.add(job["id"])
+            jobs.append(job)
+    return jobs
+
+
+def _report(record, done, total, results):
+    results.write(json.dumps(record, default=str) + "\n")
+    results.flush()
+    line = f"[{done}/{total}] {record['id']}: {record['status']} in {record['seconds']:.1f}s"
+    if record["status"] != "ok":
+        line += f" ({record['error']})"
+    print(line, flush=True)
+
+
+def run(jobs, out_dir, backend="comfy", workers=1, devices=None, **options):
+    """Run `jobs`, writing latents and results.jsonl to `out_dir`. Returns the number of failed jobs."""
+    os.makedirs(out_dir, exist_ok=True)
+    failed = 0
+    with open(os.path.join(out_dir, "results.jsonl"), "w") as results:
+        if workers <= 1:
+            _init_worker(backend, options, out_dir, devices)
+            for done, job in enumerate(jobs, 1):
+                record = _run_job(job)
+                failed += record["status"] != "ok"
+                _report(record, done, len(jobs), results)
+            return failed
+
+        # spawn, so each worker initialises CUDA itself on its own device
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(backend, options, out_dir, devices, context.Value("i", 0))) as pool:
+            futures = {pool.submit(_run_job, job): job for job in jobs}
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    record = future.result()
+                except Exception as e:
+                    # the worker itself died (e.g. killed for memory); the job never reported back
+                    record = {"id": futures[future]["id"], "status": "error", "seconds": 0.0,
+                              "error": f"worker failed: {type(e).__name__}: {e}"}
+                failed += record["status"] != "ok"
+                _report(record, done, len(jobs), results)
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("jobs", help="JSONL file with one job per line.")
+    parser.add_argument("--out", required=True, help="Directory for output latents and results.jsonl.")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (1 runs in this process).")
+    parser.add_argument("--backend", default="comfy",
+                        help="comfy, stub, or module:ClassName of a custom backend (default comfy).")
+    parser.add_argument("--comfy-root", help="ComfyUI directory for the comfy backend (or $COMFYUI_ROOT).")
+    parser.add_argument("--devices", nargs="+", help="CUDA devices handed to workers round-robin.")
+    parser.add_argument("--stub-cost", type=int, default=1, help="Conv layers per fake model call (stub backend).")
+    args = parser.parse_args(argv)
+
+    jobs = _read_jobs(args.jobs)
+    start = time.perf_counter()
+    failed = run(jobs, args.out, args.backend, args.workers, args.devices,
+                 comfy_root=args.comfy_root, stub_cost=args.stub_cost)
+    print(f"{len(jobs) - failed}/{len(jobs)} jobs ok in {time.perf_counter() - start:.1f}s, "
+          f"results in {os.path.join(args.out, 'results.jsonl')}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
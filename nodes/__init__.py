@@ -3,8 +3,12 @@ from .step_switch import StepSwitchKSampler
 from .multistep import MultiStepKSampler
 from .cross_step_switch import CrossStepSwitchKSampler
 from .cross_multistep import CrossMultiStepKSampler
+from .plan import SwitchSamplerStage, StagePlanKSampler
+from .sweep import StepSwitchSweepKSampler
 
 __all__ = [
     "StepSwitchKSampler", "MultiStepKSampler",
     "CrossStepSwitchKSampler", "CrossMultiStepKSampler",
+    "SwitchSamplerStage", "StagePlanKSampler",
+    "StepSwitchSweepKSampler",
 ]
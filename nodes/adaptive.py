@@ -0,0 +1,148 @@
+import logging
+
+import comfy.samplers as cs
+
+ADAPTIVE_MODES = ("off", "sigma", "convergence")
+
+
+def _schema_for_adaptive():
+    return {
+        "adaptive_switch": (ADAPTIVE_MODES, {"default": "off",
+                                             "tooltip": "sigma: hand off once the schedule reaches switch_sigma. "
+                                                        "convergence: hand off once the denoised latent changes less "
+                                                        "than convergence_tol per step. switch_point becomes the "
+                                                        "latest possible switch."}),
+        "switch_sigma": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 1000.0, "step": 0.01}),
+        "convergence_tol": ("FLOAT", {"default": 0.002, "min": 0.0, "max": 1.0, "step": 0.0005}),
+        "adaptive_min_steps": ("INT", {"default": 2, "min": 1, "max": 10000}),
+        "early_stop_final": ("BOOLEAN", {"default": False,
+                                         "tooltip": "Also end the last stage early once it has converged."}),
+    }
+
+
+def _schedule_sigmas(model, scheduler, steps, denoise=1.0):
+    """The sigmas comfy's KSampler would use for `steps` at `denoise`, or None if they can't be computed."""
+    try:
+        sampling = model.get_model_object("model_sampling")
+        if 0.0 < denoise < 1.0:
+            return cs.calculate_sigmas(sampling, scheduler, int(steps / denoise)).cpu()[-(steps + 1):]
+        return cs.calculate_sigmas(sampling, scheduler, steps).cpu()
+    except Exception as e:
+        logging.debug(f"Sigma schedule unavailable for adaptive switching: {e}")
+        return None
+
+
+def _latent_out(model, latent, sigma=0.0):
+    """
+    Callback latents are in the model's internal scale; bring them back to
+    the LATENT scale like comfy's sampler does with its final sample: undo
+    the noise scaling at `sigma` (the latent's own noise level; None skips
+    it), then `process_latent_out`.
+    """
+    sampling = model.get_model_object("model_sampling") if hasattr(model, "get_model_object") else None
+    inverse = getattr(sampling, "inverse_noise_scaling", None)
+    if inverse is not None and sigma is not None:
+        latent = inverse(sigma, latent)
+    fn = getattr(getattr(model, "model", None), "process_latent_out", None)
+    return fn(latent) if fn is not None else latent
+
+
+class _StageStopped(Exception):
+    def __init__(self, latent):
+        super().__init__("stage stopped early")
+        self.latent = latent
+
+
+class AdaptiveStop:
+    """
+    Per-step check run from the sampler callback. The callback fires right
+    after the model was evaluated at step i, with `x` still at sigma_i and
+    `x0` the denoised estimate. Once the criterion holds the sampler is
+    aborted through `_StageStopped`, carrying either `x` ("noisy", to be
+    continued from step i by the next stage) or `x0` ("clean").
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.sigmas = None
+        self.previous = None
+        self.steps_run = 0
+        self.stopped_at = None
+
+    def wrap(self, callback, model, steps, scheduler, denoise, start_step=None, last_step=None):
+        # the schedule also gives a noisy hand-off its noise level
+        sigmas = _schedule_sigmas(model, scheduler, steps, denoise)
+        if sigmas is not None:
+            # comfy slices the schedule the same way and counts callback steps from the slice start
+            if last_step is not None and last_step < len(sigmas) - 1:
+                sigmas = sigmas[:last_step + 1]
+            self.sigmas = sigmas[start_step or 0:]
+
+        def adaptive_callback(step, x0, x, total_steps):
+            if callback is not None:
+                callback(step, x0, x, total_steps)
+            self.check(step, x0, x, total_steps, model)
+        return adaptive_callback
+
+    def check(self, i, x0, x, total_steps, model):
+        self.steps_run = i + 1
+        if i + 1 >= total_steps:
+            return
+        spec, stop = self.spec, False
+        if i + 1 >= spec["min_steps"]:
+            if spec["mode"] == "sigma" and self.sigmas is not None and i + 1 < len(self.sigmas):
+                stop = float(self.sigmas[i + 1]) <= spec["sigma"]
+            elif spec["mode"] == "convergence" and self.previous is not None:
+                change = (x0 - self.previous).norm() / x0.norm().clamp_min(1e-8)
+                stop = float(change) < spec["tol"]
+        self.previous = x0
+        if stop:
+            self.stopped_at = i
+            if spec["hand_off"] == "clean":
+                raise _StageStopped(_latent_out(model, x0))
+            if self.sigmas is None or i >= len(self.sigmas):
+                logging.warning("Switch samplers: noise level of the stopped step unknown, handing off unscaled.")
+                raise _StageStopped(_latent_out(model, x, None))
+            raise _StageStopped(_latent_out(model, x, self.sigmas[i]))
+
+    def completed(self):
+        """Schedule steps the handed-off latent has gone through."""
+        return self.stopped_at + (0 if self.spec["hand_off"] == "noisy" else 1)
+
+
+def _plan_adaptive(calls, options, continuous):
+    """
+    Attach stop specs to compiled calls. The first call may switch early
+    (bounded by its planned window); with `early_stop_final` the last call
+    may stop on convergence. In continuous handoff a sigma switch is fixed
+    up front from the schedule, so it costs nothing at sampling time.
+    """
+    mode = options.get("adaptive_switch", "off")
+    spec = {"mode": mode, "sigma": float(options.get("switch_sigma", 1.0)),
+            "tol": float(options.get("convergence_tol", 0.002)),
+            "min_steps": int(options.get("adaptive_min_steps", 2))}
+
+    if mode != "off" and len(calls) > 1:
+        first, nxt = calls[0], calls[1]
+        window = first["window"]
+        sigmas = None
+        if continuous and mode == "sigma":
+            sigmas = _schedule_sigmas(first["model"], first["scheduler"], window["steps"], first["denoise"])
+        if sigmas is not None:
+            lo = window["start_step"] + spec["min_steps"]
+            switch = next((k for k in range(lo, window["last_step"]) if float(sigmas[k]) <= spec["sigma"]),
+                          window["last_step"])
+            window["last_step"] = nxt["window"]["start_step"] = switch
+        else:
+            noisy = continuous and not window.get("force_full_denoise")
+            first["stop"] = dict(spec, hand_off="noisy" if noisy else "clean")
+
+    if options.get("early_stop_final", False) and calls and "stop" not in calls[-1]:
+        calls[-1]["stop"] = dict(spec, mode="convergence", hand_off="clean")
+
+
+def _continue_after_stop(calls, i, completed, continuous):
+    """Start the next continuous call where call `i` actually stopped."""
+    if not continuous or i + 1 >= len(calls) or completed is None:
+        return
+    calls[i + 1]["window"]["start_step"] = calls[i]["window"].get("start_step", 0) + completed
@@ -0,0 +1,310 @@
+import functools
+import logging
+
+import torch
+import torch.nn.functional as F
+
+from .buffers import _buffer_pool
+from .capabilities import _vae_fingerprint, _vae_profile
+from .latent_adapter import adapter_names, resolve_latent_adapter
+from .precision import _bridge_dtype
+from .profiling import _span
+from .spill import _spill
+
+BRIDGE_MODES = ("vae", "adapter")
+
+# rough decode cost per latent pixel of an 8x VAE at fp32, same order as comfy's SD VAE estimate
+_DECODE_BYTES_PER_LATENT_PIXEL = 2178 * 4
+_MIN_TILE = 16
+
+
+def _schema_for_bridge(adapter_inputs=("bridge_adapter",)):
+    choices = ["none"] + adapter_names()
+    schema = {"bridge_mode": (BRIDGE_MODES, {"default": "vae"})}
+    for name in adapter_inputs:
+        schema[name] = (choices,)
+    schema.update({
+        "bridge_memory_mb": ("INT", {"default": 0, "min": 0, "max": 65536, "step": 64,
+                                     "tooltip": "Memory budget for a tiled VAE bridge. 0 bridges the whole batch at once."}),
+        "bridge_tile_overlap": ("INT", {"default": 8, "min": 0, "max": 64,
+                                        "tooltip": "Tile overlap in latent pixels, blended linearly."}),
+        "bridge_frame_chunk": ("INT", {"default": 16, "min": 1, "max": 4096,
+                                       "tooltip": "Frames bridged together for video latents."}),
+    })
+    return schema
+
+
+def _bridge_kwargs(kwargs):
+    """Collect the bridge options shared by every bridge of a node."""
+    return {
+        "bridge_mode": kwargs.get("bridge_mode", "vae"),
+        "memory_mb": kwargs.get("bridge_memory_mb", 0),
+        "tile_overlap": kwargs.get("bridge_tile_overlap", 8),
+        "frame_chunk": kwargs.get("bridge_frame_chunk", 16),
+        "precision": kwargs.get("precision", "fp32"),
+    }
+
+
+def _bridge_decision(vae_src, vae_dst):
+    """
+    (needed, reason) for moving latents of `vae_src` into `vae_dst`. Distinct
+    but equivalent VAE objects (one file loaded twice, two loader nodes) pass
+    the latent through untouched.
+    """
+    if vae_src is None or vae_dst is None:
+        return False, "no VAE on one side"
+    if vae_src is vae_dst:
+        return False, "same VAE"
+    src, dst = _vae_fingerprint(vae_src), _vae_fingerprint(vae_dst)
+    if src["weights"] is None or dst["weights"] is None:
+        return True, "VAE weights can't be fingerprinted"
+    differs = [k for k in src if src[k] != dst[k]]
+    if differs:
+        return True, "VAEs differ in " + ", ".join(differs)
+    return False, "equivalent VAEs (same latent format, channels, scaling and weights)"
+
+
+def _to_encoder_pixels(img, dtype=None, multiple=8, take=None):
+    """
+    Bring decoder output into the NHWC layout `vae.encode` expects, with sides
+    a multiple of the target VAE's spatial factor. With `dtype` the resize
+    work happens in that (usually reduced) precision, cast into a buffer from
+    `take` (a `BufferPool.lease()`) when given. Output that already fits is
+    passed through as a view, without copies.
+    """
+    img = torch.as_tensor(img)
+
+    # handle both 4D and 5D (video-like) outputs
+    if img.dim() == 5:
+        # merge temporal dimension for encoding into 2D vae
+        b, f, h, w, c = img.shape
+        img = img.reshape(b * f, h, w, c)
+    elif img.dim() == 3:
+        img = img.unsqueeze(0)
+
+    if dtype is not None and img.dtype != dtype:
+        img = take(img.shape, dtype, img.device).copy_(img) if take is not None else img.to(dtype)
+
+    nhwc = img.shape[-1] in (3, 1)
+    h, w = img.shape[1:3] if nhwc else img.shape[-2:]
+    hm, wm = (max(multiple, (h // multiple) * multiple), max(multiple, (w // multiple) * multiple))
+    if (h, w) == (hm, wm):
+        return img if nhwc else img.permute(0, 2, 3, 1)
+
+    img = img.permute(0, 3, 1, 2) if nhwc else img
+    try:
+        img = F.interpolate(img, size=(hm, wm), mode="bilinear", align_corners=False)
+    except RuntimeError:
+        # no reduced-precision bilinear kernel on this device
+        img = F.interpolate(img.float(), size=(hm, wm), mode="bilinear", align_corners=False).to(img.dtype)
+
+    # NHWC view of the resized NCHW tensor; encode()'s movedim(-1, 1) gets the contiguous layout back
+    return img.permute(0, 2, 3, 1)
+
+
+def _decode(vae, samples, src_name, context):
+    img = vae.decode(samples)
+    if img is None:
+        raise RuntimeError(f"{src_name} decode returned None — cannot continue {context}.")
+    return img
+
+
+def _encode(vae, img, label):
+    try:
+        return vae.encode(img)
+    except Exception as e:
+        raise RuntimeError(f"{label} encode failed: {e}\nShape: {tuple(img.shape)}")
+
+
+def _vae_bridge(samples, vae_src, vae_dst, label="Cross-switch", src_name="VAE1", context="switch", dtype=None,
+                spill="off"):
+    """
+    Decode with `vae_src`, resize to multiples of `vae_dst`'s factor and
+    re-encode with `vae_dst`. The decoded pixels are spilled per `spill`.
+    """
+    with _buffer_pool.lease() as take:
+        img = _to_encoder_pixels(_spill(_decode(vae_src, samples, src_name, context), spill), dtype,
+                                 _vae_profile(vae_dst)["spatial_factor"], take)
+        return _encode(vae_dst, img, label)
+
+
+def _tile_starts(size, tile, overlap):
+    if size <= tile:
+        return [0]
+    stride = max(1, tile - overlap)
+    return list(range(0, size - tile, stride)) + [size - tile]
+
+
+@functools.lru_cache(maxsize=64)
+def _blend_ramp(h, w, overlap):
+    """Linear feathering over `overlap` pixels on every side; never zero. Cached on the CPU, so read-only."""
+    def ramp(n):
+        r = torch.clamp((torch.arange(n, dtype=torch.float32) + 1) / (overlap + 1), max=1.0)
+        return torch.minimum(r, r.flip(0))
+    return (ramp(h)[:, None] * ramp(w)[None, :])[None, None]
+
+
+def _blend_weights(h, w, overlap, device):
+    """`_blend_ramp` on `device`; the cache holds no device memory."""
+    return _blend_ramp(h, w, overlap).to(device)
+
+
+def _stream_tiles(height, width, tile, overlap, run_tile):
+    """
+    Run `run_tile(y0, y1, x0, x1)` over an overlapping tile grid and blend the
+    returned BCHW tiles into one output. The output grid is derived from the
+    first tile's size ratio, so the producer may change resolution or channels.
+    Tiles are accumulated in place and the weight sum lives in a pooled buffer.
+    """
+    th, tw = min(tile, height), min(tile, width)
+    out = wsum = None
+    with _buffer_pool.lease() as take:
+        for y0 in _tile_starts(height, th, overlap):
+            for x0 in _tile_starts(width, tw, overlap):
+                enc = run_tile(y0, y0 + th, x0, x0 + tw)
+                if out is None:
+                    ry, rx = enc.shape[-2] / th, enc.shape[-1] / tw
+                    out_h, out_w = round(height * ry), round(width * rx)
+                    out = torch.zeros((enc.shape[0], enc.shape[1], out_h, out_w), dtype=torch.float32,
+                                      device=enc.device)
+                    wsum = take((1, 1, out_h, out_w), torch.float32, enc.device).zero_()
+                    dst_overlap = round(overlap * ry)
+                dy, dx = min(round(y0 * ry), out_h - enc.shape[-2]), min(round(x0 * rx), out_w - enc.shape[-1])
+                eh, ew = enc.shape[-2], enc.shape[-1]
+                wts = _blend_weights(eh, ew, dst_overlap, enc.device)
+                out[:, :, dy:dy + eh, dx:dx + ew].addcmul_(enc, wts)
+                wsum[:, :, dy:dy + eh, dx:dx + ew] += wts
+        return out.div_(wsum)
+
+
+def _decode_bytes_per_latent_pixel(vae):
+    factor = _vae_profile(vae)["spatial_factor"]
+    return _DECODE_BYTES_PER_LATENT_PIXEL * (factor / 8) ** 2
+
+
+def _budget_tile(budget_bytes, batch, bytes_per_pixel=_DECODE_BYTES_PER_LATENT_PIXEL):
+    side = int((budget_bytes / max(1, batch * bytes_per_pixel)) ** 0.5)
+    return max(_MIN_TILE, side)
+
+
+def _tiled_vae_bridge(samples, vae_src, vae_dst, memory_mb, tile_overlap=8, frame_chunk=16,
+                      label="Cross-switch", src_name="VAE1", context="switch", dtype=None):
+    """
+    Memory-bounded bridge: image latents are decoded and re-encoded tile by
+    tile (never materialising the full-resolution image), video latents are
+    decoded with the VAE's own tiled decoder and re-encoded in frame chunks.
+    Tiles overlap by `tile_overlap` latent pixels and are blended linearly.
+    """
+    budget = memory_mb * 1024 * 1024
+    if samples.ndim == 5:
+        return _chunked_video_bridge(samples, vae_src, vae_dst, budget, tile_overlap, frame_chunk,
+                                     label, src_name, context, dtype)
+
+    b, _, h, w = samples.shape
+    bytes_per_pixel = _decode_bytes_per_latent_pixel(vae_src)
+    multiple = _vae_profile(vae_dst)["spatial_factor"]
+    batch_chunk = max(1, min(b, int(budget // (bytes_per_pixel * h * w))))
+    tile = _budget_tile(budget, batch_chunk, bytes_per_pixel)
+    overlap = min(tile_overlap, tile // 2)
+
+    outs = []
+    for b0 in range(0, b, batch_chunk):
+        chunk = samples[b0:b0 + batch_chunk]
+
+        def run_tile(y0, y1, x0, x1):
+            with _buffer_pool.lease() as take:
+                img = _to_encoder_pixels(_decode(vae_src, chunk[:, :, y0:y1, x0:x1], src_name, context), dtype,
+                                         multiple, take)
+                return _encode(vae_dst, img, label)
+
+        outs.append(_stream_tiles(h, w, tile, overlap, run_tile))
+    return torch.cat(outs) if len(outs) > 1 else outs[0]
+
+
+def _decode_frames(vae, samples, tile, overlap, frame_chunk, src_name, context):
+    """Decode a 5D latent with the VAE's tiled decoder where it has one, as (frames, H, W, C) batch-major."""
+    img = None
+    if hasattr(vae, "decode_tiled"):
+        try:
+            img = vae.decode_tiled(samples, tile_x=tile, tile_y=tile, overlap=overlap,
+                                   tile_t=frame_chunk, overlap_t=min(frame_chunk - 1, max(1, frame_chunk // 4)))
+        except TypeError:
+            # older comfy without temporal tiling arguments
+            img = None
+    if img is None:
+        img = _decode(vae, samples, src_name, context)
+    img = torch.as_tensor(img)
+    return img.reshape(-1, *img.shape[-3:]) if img.dim() == 5 else img
+
+
+def _chunked_video_bridge(samples, vae_src, vae_dst, budget, tile_overlap, frame_chunk, label, src_name, context,
+                          dtype=None):
+    """
+    Bridge a 5D latent `frame_chunk` latent frames at a time: each chunk is
+    decoded and its frames re-encoded tile by tile before the next chunk is
+    decoded, so only one chunk's pixels are ever held. A source VAE that
+    compresses time is causal, so its clip is decoded whole (with its own
+    temporal tiling) and only the re-encode is chunked. Frames come back
+    folded into the batch, batch-major, like the untiled bridge.
+    """
+    batch, frames = samples.shape[0], samples.shape[2]
+    bytes_per_pixel = _decode_bytes_per_latent_pixel(vae_src)
+    tile = _budget_tile(budget, batch * min(frame_chunk, frames), bytes_per_pixel)
+    overlap = min(tile_overlap, tile // 2)
+    src_factor = _vae_profile(vae_src)["spatial_factor"]
+    multiple = _vae_profile(vae_dst)["spatial_factor"]
+
+    def encode(pixels):
+        def run_tile(y0, y1, x0, x1):
+            with _buffer_pool.lease() as take:
+                return _encode(vae_dst, _to_encoder_pixels(pixels[:, y0:y1, x0:x1, :], dtype, multiple, take), label)
+        return _stream_tiles(pixels.shape[1], pixels.shape[2], tile * src_factor, overlap * src_factor, run_tile)
+
+    if _vae_profile(vae_src)["temporal_factor"]:
+        pixels = _decode_frames(vae_src, samples, tile, overlap, frame_chunk, src_name, context)
+        return torch.cat([encode(pixels[f0:f0 + frame_chunk]) for f0 in range(0, pixels.shape[0], frame_chunk)])
+
+    outs = []
+    for t0 in range(0, frames, frame_chunk):
+        enc = encode(_decode_frames(vae_src, samples[:, :, t0:t0 + frame_chunk], tile, overlap, frame_chunk,
+                                    src_name, context))
+        outs.append(enc.reshape(batch, -1, *enc.shape[1:]))
+    out = torch.cat(outs, dim=1)
+    return out.reshape(-1, *out.shape[2:])
+
+
+def _bridge_latent(samples, vae_src, vae_dst, bridge_mode="vae", adapter_name=None,
+                   memory_mb=0, tile_overlap=8, frame_chunk=16, precision="fp32", spill="off", **labels):
+    """
+    Move `samples` from `vae_src`'s latent space into `vae_dst`'s.
+    In "adapter" mode a precomputed latent adapter is tried first; the full
+    VAE decode/encode round trip stays the fallback whenever no adapter is
+    selected or it does not fit the latent. A non-zero `memory_mb` switches
+    the VAE round trip to the tiled, memory-bounded bridge.
+
+    Pixels are resized and the result is returned in `_bridge_dtype`, so a
+    reduced-precision latent stays reduced across the bridge; tile blending
+    still accumulates in fp32. With `spill` the full-size decoded image of
+    the untiled round trip is kept off the device (see `_spill`).
+    """
+    dtype = _bridge_dtype(samples, precision)
+    with _span(labels.get("label", "bridge"), "bridge", src_shape=list(samples.shape)) as span:
+        out = None
+        if bridge_mode == "adapter":
+            adapter = resolve_latent_adapter(adapter_name)
+            if adapter is not None:
+                try:
+                    out = adapter.apply(samples)
+                    span.set(path="adapter")
+                except ValueError as e:
+                    logging.warning(f"Latent adapter '{adapter_name}' skipped: {e}. Falling back to VAE bridge.")
+        if out is None and memory_mb and memory_mb > 0:
+            out = _tiled_vae_bridge(samples, vae_src, vae_dst, memory_mb, tile_overlap, frame_chunk, dtype=dtype,
+                                    **labels)
+            span.set(path="tiled_vae")
+        elif out is None:
+            out = _vae_bridge(samples, vae_src, vae_dst, dtype=dtype, spill=spill, **labels)
+            span.set(path="vae")
+        out = out.to(dtype)
+        span.set(dst_shape=list(out.shape), dtype=str(dtype))
+        return out
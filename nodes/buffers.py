@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import torch
+
+
+class BufferPool:
+    """
+    Scratch tensors keyed by (shape, dtype, device), handed back and reused
+    by later bridge calls and stages instead of being reallocated each time.
+    Idle buffers are kept up to `max_bytes`, least recently returned first out,
+    until `clear()`: every node run ends with one, and so does an OOM in the
+    micro-batcher, so no idle device memory outlives a prompt.
+
+    Buffers come out uninitialised, and only through `lease()`, which takes
+    them all back when the block ends. They must not escape the block.
+    """
+
+    def __init__(self, max_bytes=512 << 20):
+        self.max_bytes = max_bytes
+        self._free = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(shape, dtype, device):
+        return tuple(shape), dtype, torch.device(device)
+
+    def _take(self, shape, dtype, device):
+        key = self._key(shape, dtype, device)
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                buf = free.pop()
+                if not free:
+                    del self._free[key]
+                self._bytes -= buf.numel() * buf.element_size()
+                self.hits += 1
+                return buf
+            self.misses += 1
+        return torch.empty(key[0], dtype=dtype, device=device)
+
+    def _give(self, buf):
+        size = buf.numel() * buf.element_size()
+        if size > self.max_bytes:
+            return
+        key = self._key(buf.shape, buf.dtype, buf.device)
+        with self._lock:
+            self._free.setdefault(key, []).append(buf)
+            self._free.move_to_end(key)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                old_key, free = next(iter(self._free.items()))
+                old = free.pop(0)
+                if not free:
+                    del self._free[old_key]
+                self._bytes -= old.numel() * old.element_size()
+
+    @contextmanager
+    def lease(self):
+        """Yield `take(shape, dtype, device)`; every buffer taken returns to the pool on exit."""
+        taken = []
+
+        def take(shape, dtype, device):
+            taken.append(self._take(shape, dtype, device))
+            return taken[-1]
+        try:
+            yield take
+        finally:
+            for buf in taken:
+                self._give(buf)
+
+    def clear(self):
+        with self._lock:
+            self._free.clear()
+            self._bytes = 0
+
+
+_buffer_pool = BufferPool()
@@ -0,0 +1,209 @@
+import hashlib
+import weakref
+
+import torch
+import comfy.model_management as mm
+
+# what nearly every image VAE uses; only a fallback when the VAE doesn't say
+_DEFAULT_SPATIAL_FACTOR = 8
+
+# parameters sampled (spread over the whole VAE) and values hashed per parameter for VAE fingerprints
+_VAE_SAMPLED_PARAMS = 32
+_VAE_SAMPLED_VALUES = 256
+
+_model_profiles = weakref.WeakKeyDictionary()
+_vae_profiles = weakref.WeakKeyDictionary()
+_vae_fingerprints = weakref.WeakKeyDictionary()
+
+
+def _infer_expected_latent_channels(model):
+    """
+    Try several common locations to infer how many latent channels `model` expects.
+    Returns int or None if unknown.
+    """
+    if model is None:
+        return None
+
+    checks = [
+        lambda m: getattr(m, "latent_channels", None),
+        lambda m: getattr(m, "ndim_latent", None),
+        lambda m: getattr(getattr(m, "first_stage_model", None), "latent_channels", None),
+        lambda m: getattr(getattr(m, "first_stage", None), "latent_channels", None),
+        lambda m: getattr(getattr(m, "vae", None), "latent_channels", None),
+        lambda m: getattr(getattr(m, "model_config", None), "latent_channels", None),
+        lambda m: getattr(getattr(m, "model_config", None), "z_channels", None),
+        lambda m: getattr(getattr(m, "diffusion_model", None), "in_channels", None),
+        lambda m: getattr(getattr(m, "diffusion_model", None), "latent_channels", None),
+    ]
+
+    for fn in checks:
+        try:
+            v = fn(model)
+            if isinstance(v, int) and v > 0:
+                return int(v)
+        except Exception:
+            continue
+    return None
+
+
+def _model_dtype(model):
+    """Working dtype of a ModelPatcher-like `model`; float32 when it can't be told."""
+    for fn in (lambda m: m.model_dtype(),
+               lambda m: m.model.get_dtype(),
+               lambda m: m.model.dtype,
+               lambda m: next(m.model.parameters()).dtype):
+        try:
+            dtype = fn(model)
+        except Exception:
+            continue
+        if isinstance(dtype, torch.dtype) and dtype.is_floating_point:
+            return dtype
+    return torch.float32
+
+
+def _model_device(model):
+    try:
+        device_attr = getattr(model, "load_device", None)
+        if callable(device_attr):
+            device = device_attr()
+        else:
+            device = device_attr
+        if device is None:
+            device = mm.get_torch_device()
+    except Exception:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    return device
+
+
+def _latent_format(model):
+    fmt = getattr(getattr(model, "model", None), "latent_format", None)
+    return type(fmt).__name__ if fmt is not None else None
+
+
+def _cached(registry, obj, build):
+    try:
+        profile = registry.get(obj)
+    except TypeError:
+        # not weak-referenceable: resolve every time rather than pin it
+        return build(obj)
+    if profile is None:
+        profile = registry[obj] = build(obj)
+    return profile
+
+
+def _build_model_profile(model):
+    return {
+        "latent_channels": _infer_expected_latent_channels(model),
+        "latent_format": _latent_format(model),
+        "device": _model_device(model),
+        "dtype": _model_dtype(model),
+    }
+
+
+def _model_profile(model):
+    """
+    Capabilities of a sampling model, resolved once per model object:
+    latent channels, latent format name, load device and working dtype.
+    """
+    return _cached(_model_profiles, model, _build_model_profile)
+
+
+def _ratio(value):
+    """Spatial factor from an int or a (temporal, h, w) downscale tuple; None for callables/unknowns."""
+    if isinstance(value, (tuple, list)) and value:
+        value = value[-1]
+    return int(value) if isinstance(value, (int, float)) and value > 0 else None
+
+
+def _build_vae_profile(vae):
+    spatial = None
+    for fn in (lambda v: v.spacial_compression_encode(),
+               lambda v: _ratio(v.downscale_ratio),
+               lambda v: _ratio(v.upscale_ratio)):
+        try:
+            spatial = _ratio(fn(vae))
+        except Exception:
+            continue
+        if spatial:
+            break
+    temporal = None
+    try:
+        temporal = int(vae.temporal_compression_decode() or 0) or None
+    except Exception:
+        pass
+    return {
+        "spatial_factor": spatial or _DEFAULT_SPATIAL_FACTOR,
+        "temporal_factor": temporal,
+        "latent_channels": getattr(vae, "latent_channels", None),
+        "latent_dim": getattr(vae, "latent_dim", None),
+        "device": getattr(vae, "device", None),
+        "dtype": getattr(vae, "vae_dtype", None),
+    }
+
+
+def _vae_profile(vae):
+    """Capabilities of a VAE, resolved once per VAE object: spatial/temporal factor, channels, device, dtype."""
+    return _cached(_vae_profiles, vae, _build_vae_profile)
+
+
+def _scaling(vae):
+    """scale_factor / shift_factor found on the VAE, its latent format or its module."""
+    found = {}
+    for obj in (vae, getattr(vae, "latent_format", None), getattr(vae, "first_stage_model", None)):
+        for name in ("scale_factor", "shift_factor"):
+            value = getattr(obj, name, None)
+            if name in found or value is None:
+                continue
+            if torch.is_tensor(value):
+                value = value.detach().float().cpu().reshape(-1).tolist()
+            if isinstance(value, (int, float, list, tuple)):
+                found[name] = value
+    return found.get("scale_factor"), found.get("shift_factor")
+
+
+def _weight_digest(vae):
+    """
+    Hash of the VAE's parameter names and shapes plus a sample of values from
+    `_VAE_SAMPLED_PARAMS` of them, or None without a weights module. Values are
+    hashed as fp16 so one file loaded at fp16 and fp32 fingerprints the same.
+    """
+    module = getattr(vae, "first_stage_model", None)
+    if not isinstance(module, torch.nn.Module):
+        return None
+    state = list(module.state_dict().items())
+    h = hashlib.blake2b(digest_size=16)
+    h.update(type(module).__name__.encode())
+    for name, t in state:
+        h.update(f"{name}{tuple(t.shape)};".encode())
+    step = max(1, len(state) // _VAE_SAMPLED_PARAMS)
+    for _, t in state[::step][:_VAE_SAMPLED_PARAMS]:
+        if t.is_floating_point() and t.numel():
+            values = t.detach().reshape(-1)[:_VAE_SAMPLED_VALUES].to("cpu", torch.float16)
+            h.update(values.contiguous().view(torch.uint8).numpy().tobytes())
+    return h.hexdigest()
+
+
+def _build_vae_fingerprint(vae):
+    profile = _vae_profile(vae)
+    fmt = getattr(vae, "latent_format", None)
+    scale, shift = _scaling(vae)
+    return {
+        "latent_format": type(fmt).__name__ if fmt is not None else None,
+        "latent_channels": profile["latent_channels"],
+        "latent_dim": profile["latent_dim"],
+        "spatial_factor": profile["spatial_factor"],
+        "temporal_factor": profile["temporal_factor"],
+        "scale_factor": scale,
+        "shift_factor": shift,
+        "weights": _weight_digest(vae),
+    }
+
+
+def _vae_fingerprint(vae):
+    """
+    What decides whether two VAEs share a latent space, resolved once per VAE
+    object: latent format, channels, latent dims, spatial/temporal factors,
+    scale/shift and a weight hash sample. Equal fingerprints mean the same
+    VAE, however it was loaded.
+    """
+    return _cached(_vae_fingerprints, vae, _build_vae_fingerprint)
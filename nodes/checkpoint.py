@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from .stage_cache import _detach_latent, _load_latent, _save_latent, _stage_key
+
+CHECKPOINT_MODES = ("off", "resume", "keep")
+
+# job directories untouched for this long are removed when a new job opens
+_JOB_MAX_AGE = 7 * 24 * 3600
+
+
+def _schema_for_checkpoint():
+    return {
+        "stage_checkpoint": (CHECKPOINT_MODES, {"default": "off",
+                                                 "tooltip": "Save every finished stage to a job directory so a "
+                                                            "re-queued run with the same inputs resumes at the "
+                                                            "first unfinished stage after an interrupt or error. "
+                                                            "resume: the directory is removed once the job "
+                                                            "completes. keep: it stays."}),
+    }
+
+
+def _checkpoint_root():
+    env = os.environ.get("SWITCH_SAMPLERS_CHECKPOINT_DIR")
+    if env:
+        return env
+    try:
+        import folder_paths
+        return os.path.join(folder_paths.get_user_directory(), "switch_samplers_jobs")
+    except Exception:
+        return os.path.join(tempfile.gettempdir(), "switch_samplers_jobs")
+
+
+def _prune_jobs(root, keep):
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return
+    now = time.time()
+    for name in names:
+        path = os.path.join(root, name)
+        if name == keep or not os.path.isdir(path):
+            continue
+        try:
+            stale = now - os.path.getmtime(path) > _JOB_MAX_AGE
+        except OSError:
+            continue
+        if stale:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _json_params(sampler_kwargs):
+    return {k: v for k, v in sampler_kwargs.items() if v is None or isinstance(v, (bool, int, float, str))}
+
+
+class StageCheckpoints:
+    """
+    Durable stage outputs of one job under `<root>/<job id>`, as safetensors:
+    every compiled call's final output ("done") and, while that is not yet
+    written, its sampled latent from before an outbound bridge ("sampled").
+    `job.json` records the parameters that produced them. An entry is only
+    used when the chained stage key it was written under still matches.
+    """
+
+    def __init__(self, directory, mode="resume"):
+        self.directory = directory
+        self.mode = mode
+        self.manifest = self._read_manifest()
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, "job.json")
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path(), encoding="utf-8") as f:
+                manifest = json.load(f)
+            if isinstance(manifest.get("stages"), dict):
+                return manifest
+        except (OSError, ValueError, AttributeError):
+            pass
+        return {"stages": {}}
+
+    def _write_manifest(self):
+        self.manifest["updated"] = time.time()
+        path = self._manifest_path()
+        try:
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self.manifest, f, indent=2)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logging.warning(f"Stage checkpoint manifest {path} not written: {e}")
+
+    def _path(self, index, phase):
+        return os.path.join(self.directory, f"stage{index + 1}_{phase}.safetensors")
+
+    def has(self, index, phase, key):
+        entry = self.manifest["stages"].get(str(index + 1), {}).get(phase)
+        return entry is not None and entry.get("key") == key and os.path.isfile(self._path(index, phase))
+
+    def load(self, index, phase, key):
+        """(latent, stage meta) checkpointed for call `index` under `key`, or (None, None)."""
+        if key is None or not self.has(index, phase, key):
+            return None, None
+        latent, record = _load_latent(self._path(index, phase))
+        if latent is None or not isinstance(record, dict) or record.get("key") != key:
+            return None, None
+        return latent, record.get("meta")
+
+    def save(self, index, phase, key, latent, meta, sampler_kwargs, model=None):
+        if key is None or self.has(index, phase, key):
+            return
+        if not _save_latent(self._path(index, phase), _detach_latent(latent), {"key": key, "meta": meta}):
+            return
+        stage = self.manifest["stages"].setdefault(str(index + 1), {})
+        if phase == "done" and stage.pop("sampled", None) is not None:
+            # the bridged output supersedes the sampled one
+            _remove(self._path(index, "sampled"))
+        stage[phase] = {"key": key, "meta": meta, "model": type(model).__name__ if model is not None else None,
+                        "params": _json_params(sampler_kwargs), "saved": time.time()}
+        self._write_manifest()
+
+    def reset(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".safetensors"):
+                _remove(os.path.join(self.directory, name))
+        self.manifest = {"stages": {}}
+
+    def finish(self):
+        if self.mode == "resume":
+            shutil.rmtree(self.directory, ignore_errors=True)
+        else:
+            self.manifest["completed"] = True
+            self._write_manifest()
+
+
+def _job_checkpoints(options, *job_parts):
+    """
+    `StageCheckpoints` for the job identified by `job_parts` (input latent,
+    seed, stage plan, ...), or None when checkpoints are off or the inputs
+    can't be hashed. A job that already completed (kept by "keep") is only
+    served from its checkpoints when the stage cache is on; otherwise it
+    starts over, so "keep" never turns into a cache behind `stage_cache=off`.
+    """
+    mode = options.get("stage_checkpoint", "off")
+    if mode == "off":
+        return None
+    job = _stage_key("job", *job_parts)
+    if job is None:
+        logging.warning("Switch samplers: stage checkpoints disabled, the job inputs can't be fingerprinted.")
+        return None
+    root = _checkpoint_root()
+    directory = os.path.join(root, job)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        os.utime(directory)
+    except OSError as e:
+        logging.warning(f"Switch samplers: stage checkpoints disabled, {directory} not writable: {e}")
+        return None
+    _prune_jobs(root, job)
+    checkpoints = StageCheckpoints(directory, mode)
+    if checkpoints.manifest.get("completed") and options.get("stage_cache", "off") == "off":
+        checkpoints.reset()
+    return checkpoints
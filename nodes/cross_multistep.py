@@ -1,12 +1,18 @@
-import torch
-import torch.nn.functional as F
-import comfy.model_management as mm
 import comfy.samplers as cs
-from .helpers import _call_ksampler, _make_node_class
+from .bridge import _schema_for_bridge
+from .checkpoint import _schema_for_checkpoint
+from .guidance import _truncate_input
+from .helpers import _make_node_class, _schema_for_handoff
+from .microbatch import _schema_for_micro_batch
+from .pipeline import _schema_for_pipeline
+from .plan import _run_stage_plan, _stage
+from .precision import _schema_for_precision
+from .residency import _schema_for_residency
+from .spill import _schema_for_spill
+from .stage_cache import _schema_for_stage_cache
+from .temporal import _schema_for_temporal
 
 def _cross_multistep_handler(model, latent, kwargs):
-    device = mm.get_torch_device()
-
     # --- Stage setup ---
     steps = [kwargs.get("steps_stage1", 10),
              kwargs.get("steps_stage2", 10),
@@ -28,6 +34,10 @@ def _cross_multistep_handler(model, latent, kwargs):
                 kwargs.get("denoise_stage2", 1.0),
                 kwargs.get("denoise_stage3", 1.0)]
 
+    truncate = [kwargs.get("cfg_truncate_sigma_stage1", 0.0),
+                kwargs.get("cfg_truncate_sigma_stage2", 0.0),
+                kwargs.get("cfg_truncate_sigma_stage3", 0.0)]
+
     seed = kwargs.get("seed", 0)
 
     # --- Models / VAEs / Conditioning ---
@@ -46,79 +56,15 @@ def _cross_multistep_handler(model, latent, kwargs):
     pos3 = kwargs.get("positive3", pos1)
     neg3 = kwargs.get("negative3", neg1)
 
-    # --- Stage 1 ---
-    out1 = _call_ksampler(m1, latent, steps[0], samplers[0], schedulers[0],
-                          cfgs[0], pos1, neg1, seed, denoises[0])
-
-    # --- Between Stage 1 → 2 ---
-    if vae1 is not None and vae2 is not None and vae1 != vae2:
-        img = vae1.decode(out1["samples"])
-        if img is None:
-            raise RuntimeError("VAE1 decode returned None — cannot continue multi-step.")
-
-        img = img if torch.is_tensor(img) else torch.tensor(img)
-        if img.dim() == 5:
-            b, f, h, w, c = img.shape
-            img = img.view(b * f, h, w, c)
-        elif img.dim() == 3:
-            img = img.unsqueeze(0)
-
-        if img.shape[-1] in (3, 1):
-            img = img.permute(0, 3, 1, 2)
-
-        img = img[..., :max(1, img.shape[-2]), :max(1, img.shape[-1])]
-        h, w = img.shape[-2:]
-        h8, w8 = (max(8, (h // 8) * 8), max(8, (w // 8) * 8))
-        if (h, w) != (h8, w8):
-            img = F.interpolate(img, size=(h8, w8), mode="bilinear", align_corners=False)
-
-        img = img.permute(0, 2, 3, 1)
-        try:
-            latent2 = vae2.encode(img)
-        except Exception as e:
-            raise RuntimeError(f"Stage 1→2 encode failed: {e}\nShape: {tuple(img.shape)}")
-    else:
-        latent2 = out1["samples"]
-
-    # --- Stage 2 ---
-    out2 = _call_ksampler(m2, {"samples": latent2}, steps[1], samplers[1], schedulers[1],
-                          cfgs[1], pos2, neg2, seed + 1, denoises[1])
-
-    # --- Between Stage 2 → 3 ---
-    if vae2 is not None and vae3 is not None and vae2 != vae3:
-        img = vae2.decode(out2["samples"])
-        if img is None:
-            raise RuntimeError("VAE2 decode returned None — cannot continue multi-step.")
-
-        img = img if torch.is_tensor(img) else torch.tensor(img)
-        if img.dim() == 5:
-            b, f, h, w, c = img.shape
-            img = img.view(b * f, h, w, c)
-        elif img.dim() == 3:
-            img = img.unsqueeze(0)
-
-        if img.shape[-1] in (3, 1):
-            img = img.permute(0, 3, 1, 2)
-
-        img = img[..., :max(1, img.shape[-2]), :max(1, img.shape[-1])]
-        h, w = img.shape[-2:]
-        h8, w8 = (max(8, (h // 8) * 8), max(8, (w // 8) * 8))
-        if (h, w) != (h8, w8):
-            img = F.interpolate(img, size=(h8, w8), mode="bilinear", align_corners=False)
-
-        img = img.permute(0, 2, 3, 1)
-        try:
-            latent3 = vae3.encode(img)
-        except Exception as e:
-            raise RuntimeError(f"Stage 2→3 encode failed: {e}\nShape: {tuple(img.shape)}")
-    else:
-        latent3 = out2["samples"]
-
-    # --- Stage 3 ---
-    out3 = _call_ksampler(m3, {"samples": latent3}, steps[2], samplers[2], schedulers[2],
-                          cfgs[2], pos3, neg3, seed + 2, denoises[2])
-
-    return out3
+    stages = [
+        _stage(m1, pos1, neg1, steps[0], samplers[0], schedulers[0], cfgs[0], denoises[0], vae=vae1,
+               cfg_truncate_sigma=truncate[0]),
+        _stage(m2, pos2, neg2, steps[1], samplers[1], schedulers[1], cfgs[1], denoises[1], vae=vae2,
+               bridge_adapter=kwargs.get("bridge_adapter_1_2"), cfg_truncate_sigma=truncate[1]),
+        _stage(m3, pos3, neg3, steps[2], samplers[2], schedulers[2], cfgs[2], denoises[2], vae=vae3,
+               bridge_adapter=kwargs.get("bridge_adapter_2_3"), cfg_truncate_sigma=truncate[2]),
+    ]
+    return _run_stage_plan(stages, latent, seed, kwargs)
 
 CrossMultiStepKSampler = _make_node_class(
     "CrossMultiStepKSampler",
@@ -153,5 +99,15 @@ CrossMultiStepKSampler = _make_node_class(
         "denoise_stage3": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0, "step": 0.01}),
         "latent_image": ("LATENT",),
     },
-    _cross_multistep_handler
+    _cross_multistep_handler,
+    optional_schema_callable=lambda: {**_schema_for_handoff(),
+                                      **_schema_for_bridge(("bridge_adapter_1_2", "bridge_adapter_2_3")),
+                                      **_schema_for_pipeline(),
+                                      **_schema_for_residency(), **_schema_for_stage_cache(),
+                                      **_schema_for_precision(), **_schema_for_temporal(), **_schema_for_spill(),
+                                      **_schema_for_checkpoint(), **_schema_for_micro_batch(),
+                                      **_truncate_input("cfg_truncate_sigma_stage1"),
+                                      **_truncate_input("cfg_truncate_sigma_stage2"),
+                                      **_truncate_input("cfg_truncate_sigma_stage3")},
+    profiled=True, previewed=True,
 )
\ No newline at end of file
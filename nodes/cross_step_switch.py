@@ -1,8 +1,17 @@
-import torch
-import torch.nn.functional as F
-import comfy.model_management as mm
 import comfy.samplers as cs
-from .helpers import _call_ksampler, _make_node_class
+from .adaptive import _schema_for_adaptive
+from .bridge import _schema_for_bridge
+from .checkpoint import _schema_for_checkpoint
+from .guidance import _truncate_input
+from .helpers import _make_node_class, _schema_for_handoff
+from .microbatch import _schema_for_micro_batch
+from .pipeline import _schema_for_pipeline
+from .plan import _run_stage_plan, _stage
+from .precision import _schema_for_precision
+from .residency import _schema_for_residency
+from .spill import _schema_for_spill
+from .stage_cache import _schema_for_stage_cache
+from .temporal import _schema_for_temporal
 
 def _cross_step_switch_handler(model, latent, kwargs):
     switch_point = kwargs.get("switch_point", 10)
@@ -20,6 +29,9 @@ def _cross_step_switch_handler(model, latent, kwargs):
     denoise_before = kwargs.get("denoise_before", 1.0)
     denoise_after  = kwargs.get("denoise_after", 1.0)
 
+    truncate_before = kwargs.get("cfg_truncate_sigma_before", 0.0)
+    truncate_after  = kwargs.get("cfg_truncate_sigma_after", 0.0)
+
     seed = kwargs.get("seed", 0)
 
     m1 = kwargs.get("model1")
@@ -33,59 +45,16 @@ def _cross_step_switch_handler(model, latent, kwargs):
     pos2 = kwargs.get("positive2", pos1)
     neg2 = kwargs.get("negative2", neg1)
 
-    device = mm.get_torch_device()
-
-    # --- FIRST SAMPLING ---
-    out1 = _call_ksampler(m1, latent, switch_point, sampler_before, scheduler_before,
-                         cfg_before, pos1, neg1, seed, denoise_before)
-
-# ---- Decode and re-encode between models ----
-    if vae1 is not None and vae2 is not None and vae1 != vae2:
-        img = vae1.decode(out1["samples"])
-        if img is None:
-            raise RuntimeError("VAE1 decode returned None — cannot continue switch.")
-        
-         # ensure tensor
-        img = img if torch.is_tensor(img) else torch.tensor(img)
-
-        # handle both 4D and 5D (video-like) outputs
-        if img.dim() == 5:
-            # merge temporal dimension for encoding into 2D vae
-            b, f, h, w, c = img.shape
-            img = img.view(b * f, h, w, c)
-        elif img.dim() == 3:
-            img = img.unsqueeze(0)
-
-        # convert NHWC → NCHW
-        if img.shape[-1] in (3, 1):
-            img = img.permute(0, 3, 1, 2)
-
-        # remove invalid zero dimensions
-        img = img[..., :max(1, img.shape[-2]), :max(1, img.shape[-1])]
-
-        # ensure dimensions are multiples of 8
-        h, w = img.shape[-2:]
-        h8, w8 = (max(8, (h // 8) * 8), max(8, (w // 8) * 8))
-        if (h, w) != (h8, w8):
-            img = F.interpolate(img, size=(h8, w8), mode="bilinear", align_corners=False)
-
-        # Convert NCHW → NHWC for encode()
-        img = img.permute(0, 2, 3, 1)
-
-        # Encode safely
-        try:
-            latent_m2_samples = vae2.encode(img)
-        except Exception as e:
-            raise RuntimeError(f"Cross-switch encode failed: {e}\nShape passed: {tuple(img.shape)}")
-    else:
-        latent_m2_samples = out1["samples"]
-        
-    # --- SECOND SAMPLING ---
-    steps_after = max(total_steps - switch_point, 0)
-    if steps_after > 0:
-        out2 = _call_ksampler(m2, {"samples": latent_m2_samples}, steps_after, sampler_after, scheduler_after,
-                             cfg_after, pos2, neg2, seed + 1, denoise_after)
-    return out2
+    stages = [
+        _stage(m1, pos1, neg1, switch_point, sampler_before, scheduler_before, cfg_before, denoise_before,
+               vae=vae1, cfg_truncate_sigma=truncate_before),
+        _stage(m2, pos2, neg2, max(total_steps - switch_point, 0), sampler_after, scheduler_after, cfg_after,
+               denoise_after, vae=vae2, bridge_adapter=kwargs.get("bridge_adapter"),
+               cfg_truncate_sigma=truncate_after),
+    ]
+    report = {}
+    out = _run_stage_plan(stages, latent, seed, kwargs, report)
+    return out, report["steps_used"]
 
 CrossStepSwitchKSampler = _make_node_class(
     "CrossStepSwitchKSampler",
@@ -111,5 +80,14 @@ CrossStepSwitchKSampler = _make_node_class(
         "denoise_after":  ("FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0, "step": 0.01}),
         "latent_image": ("LATENT",),
     },
-    _cross_step_switch_handler
+    _cross_step_switch_handler,
+    extra_outputs=(("INT", "steps_used"),),
+    optional_schema_callable=lambda: {**_schema_for_handoff(), **_schema_for_bridge(), **_schema_for_pipeline(),
+                                      **_schema_for_residency(), **_schema_for_stage_cache(),
+                                      **_schema_for_precision(), **_schema_for_adaptive(),
+                                      **_schema_for_temporal(), **_schema_for_spill(), **_schema_for_checkpoint(),
+                                      **_schema_for_micro_batch(),
+                                      **_truncate_input("cfg_truncate_sigma_before"),
+                                      **_truncate_input("cfg_truncate_sigma_after")},
+    profiled=True, previewed=True,
 )
\ No newline at end of file
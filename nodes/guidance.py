@@ -0,0 +1,49 @@
+import math
+
+import comfy.samplers as cs
+
+
+def _truncate_input(name):
+    return {name: ("FLOAT", {"default": 0.0, "min": 0.0, "max": 1000.0, "step": 0.01,
+                             "tooltip": "Drop the negative (unconditional) pass once sigma falls below this, "
+                                        "halving model calls for those steps. 0 keeps CFG for the whole stage."})}
+
+
+def _cfg_passes(model, cfg):
+    """Model passes per step at `cfg`: comfy already skips the unconditional one at cfg 1.0."""
+    options = getattr(model, "model_options", None) or {}
+    return 1 if math.isclose(cfg, 1.0) and not options.get("disable_cfg1_optimization", False) else 2
+
+
+def _truncated_cfg(truncate_sigma, previous=None):
+    """`sampler_calc_cond_batch_function` running the cond pass alone below `truncate_sigma`."""
+    def calc_cond_batch(args):
+        conds = args["conditions"]
+        drop = len(conds) > 1 and conds[1] is not None and float(args["sigma"].max()) < truncate_sigma
+        if drop:
+            args = dict(args, conditions=[conds[0], None, *conds[2:]])
+        if previous is not None:
+            out = previous(args)
+        else:
+            out = cs.calc_cond_batch(args["model"], args["conditions"], args["input"], args["sigma"],
+                                     args["model_options"])
+        if drop:
+            # cfg over (cond, cond) is cond at any scale
+            out = [out[0], out[0], *out[2:]]
+        return out
+    return calc_cond_batch
+
+
+def _guided_model(model, cfg, truncate_sigma=0.0):
+    """
+    `model` patched so the negative branch is dropped once sigma falls below
+    `truncate_sigma`. The model itself is returned when there is nothing to
+    drop (no threshold, or cfg 1.0 which is single-pass anyway) or it can't
+    be cloned.
+    """
+    if not truncate_sigma or truncate_sigma <= 0 or _cfg_passes(model, cfg) == 1 or not hasattr(model, "clone"):
+        return model
+    guided = model.clone()
+    previous = guided.model_options.get("sampler_calc_cond_batch_function")
+    guided.model_options["sampler_calc_cond_batch_function"] = _truncated_cfg(truncate_sigma, previous)
+    return guided
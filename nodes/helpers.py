@@ -1,8 +1,19 @@
 import torch
-import nodes
 import comfy.samplers as cs
 import comfy.sample as csample
 import comfy.model_management as mm
+import comfy.utils
+
+from .adaptive import _StageStopped
+from .buffers import _buffer_pool
+from .capabilities import _model_profile
+from .guidance import _cfg_passes, _guided_model
+from .microbatch import _chunk_seed, _micro_batch_size, _run_micro_batched
+from .noise import _batch_slice_sampler, get_noise
+from .precision import _precision_dtypes
+from .preview import _preview_callback, _previewing, _schema_for_preview
+from .profiling import _profiling, _schema_for_profiling, _span
+from .spill import _is_spilled, _unspill
 
 try:
     from comfy.nodes import Node
@@ -26,36 +37,6 @@ def _schema_for_basic():
     }
 
 
-def _infer_expected_latent_channels(model):
-    """
-    Try several common locations to infer how many latent channels `model` expects.
-    Returns int or None if unknown.
-    """
-    if model is None:
-        return None
-
-    checks = [
-        lambda m: getattr(m, "latent_channels", None),
-        lambda m: getattr(m, "ndim_latent", None),
-        lambda m: getattr(getattr(m, "first_stage_model", None), "latent_channels", None),
-        lambda m: getattr(getattr(m, "first_stage", None), "latent_channels", None),
-        lambda m: getattr(getattr(m, "vae", None), "latent_channels", None),
-        lambda m: getattr(getattr(m, "model_config", None), "latent_channels", None),
-        lambda m: getattr(getattr(m, "model_config", None), "z_channels", None),
-        lambda m: getattr(getattr(m, "diffusion_model", None), "in_channels", None),
-        lambda m: getattr(getattr(m, "diffusion_model", None), "latent_channels", None),
-    ]
-
-    for fn in checks:
-        try:
-            v = fn(model)
-            if isinstance(v, int) and v > 0:
-                return int(v)
-        except Exception:
-            continue
-    return None
-
-
 def _format_latent_summary(latent_tensor):
     if not torch.is_tensor(latent_tensor):
         return f"type={type(latent_tensor)}"
@@ -67,7 +48,7 @@ def _fix_empty_latent_channels_fallback(model, latent_tensor):
     Emulate comfy.sample.fix_empty_latent_channels if missing.
     Ensures latent has correct channel count and proper dtype/device.
     """
-    expected = _infer_expected_latent_channels(model)
+    expected = _model_profile(model)["latent_channels"]
     if expected is None:
         return latent_tensor
 
@@ -89,35 +70,28 @@ def _fix_empty_latent_channels_fallback(model, latent_tensor):
     return latent
 
 
-def _call_ksampler(model, latent, steps, sampler_name, scheduler, cfg, positive, negative, seed, denoise=1.0):
+def _prepare_latent_samples(model, latent, dtype=torch.float32):
     """
-    Robust KSampler caller:
-      - unwraps latent dicts,
-      - fixes empty-latent channel mismatch via comfy.sample.fix_empty_latent_channels or fallback,
-      - validates latent channels,
-      - prepares noise correctly (supports batch_index),
-      - uses comfy.sample.sample for full ComfyUI compatibility.
+    Unwrap a latent dict, fix empty-latent channel mismatches, move the
+    samples to the model's device as `dtype` and validate the channel count.
+    Spilled samples stay on the host; `_call_ksampler` moves them over one
+    micro-batch at a time.
     """
     if model is None:
         raise ValueError("No model provided to KSampler")
 
-    # --- DEVICE ---
-    try:
-        device_attr = getattr(model, "load_device", None)
-        if callable(device_attr):
-            device = device_attr()
-        else:
-            device = device_attr
-        if device is None:
-            device = mm.get_torch_device()
-    except Exception:
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    # --- DEVICE / CHANNELS (resolved once per model) ---
+    profile = _model_profile(model)
+    device = profile["device"]
 
     # --- UNWRAP LATENT ---
     latent_samples = latent["samples"] if isinstance(latent, dict) and "samples" in latent else latent
     if not torch.is_tensor(latent_samples):
         raise TypeError(f"Invalid latent type: {type(latent)}. Expected torch.Tensor or dict with 'samples'.")
 
+    if _is_spilled(latent_samples):
+        device = latent_samples.device
+
     # --- FIX EMPTY LATENT CHANNELS ---
     try:
         if hasattr(csample, "fix_empty_latent_channels"):
@@ -127,71 +101,269 @@ def _call_ksampler(model, latent, steps, sampler_name, scheduler, cfg, positive,
     except Exception:
         latent_samples = _fix_empty_latent_channels_fallback(model, latent_samples)
 
-    # Move to device
-    latent_samples = latent_samples.to(device).float()
+    # Move to device, casting only when the dtype differs
+    latent_samples = latent_samples.to(device=device, dtype=dtype)
 
     # --- VALIDATE CHANNEL COUNT ---
-    expected_channels = _infer_expected_latent_channels(model)
+    expected_channels = profile["latent_channels"]
     actual_channels = latent_samples.shape[1] if latent_samples.ndim >= 2 else None
     if expected_channels and actual_channels and expected_channels != actual_channels:
         raise RuntimeError(
             f"Latent channel mismatch: model expects {expected_channels} channels, "
             f"got {actual_channels} ({_format_latent_summary(latent_samples)})."
         )
+    return latent_samples
+
+
+def _stage_noise(model, latent, seed, add_noise=True, precision="fp32"):
+    """Noise `_call_ksampler` would draw for `latent`, so callers can slice it across batch chunks."""
+    batch_inds = latent.get("batch_index", None) if isinstance(latent, dict) else None
+    latent_samples = _prepare_latent_samples(model, latent, _precision_dtypes(model, precision)[1])
+    return get_noise(latent_samples, seed, batch_inds, disable_noise=not add_noise)
+
+
+def _window_sigmas(model, steps, sampler_name, scheduler, denoise, start_step, last_step, force_full_denoise):
+    """
+    The sigmas comfy's KSampler samples for a [start_step, last_step) window,
+    sliced the way `KSampler.sample` slices them; None for an empty window.
+    """
+    sigmas = cs.KSampler(model, steps=steps, device=model.load_device, sampler=sampler_name, scheduler=scheduler,
+                         denoise=denoise, model_options=model.model_options).sigmas
+    if last_step is not None and last_step < len(sigmas) - 1:
+        sigmas = sigmas[:last_step + 1].clone()
+        if force_full_denoise:
+            sigmas[-1] = 0
+    if start_step is not None:
+        if start_step >= len(sigmas) - 1:
+            return None
+        sigmas = sigmas[start_step:]
+    return sigmas
+
+
+def _call_ksampler(model, latent, steps, sampler_name, scheduler, cfg, positive, negative, seed, denoise=1.0,
+                   start_step=None, last_step=None, add_noise=True, force_full_denoise=False, noise=None,
+                   precision="fp32", stop=None, cfg_truncate_sigma=0.0, micro_batch="on_oom", within_batch=None):
+    """
+    Robust KSampler caller:
+      - unwraps latent dicts,
+      - fixes empty-latent channel mismatch via comfy.sample.fix_empty_latent_channels or fallback,
+      - validates latent channels,
+      - prepares noise correctly (supports batch_index),
+      - uses comfy.sample.sample for full ComfyUI compatibility.
+
+    `start_step`, `last_step`, `add_noise` and `force_full_denoise` follow the
+    KSamplerAdvanced semantics, so a stage can run a slice of a `steps`-long
+    schedule and continue from a partially denoised latent. A precomputed
+    `noise` tensor (e.g. a batch slice of `_stage_noise`) replaces the drawn one.
+
+    `precision` picks the dtype the sampler integrates in and the one the
+    returned latent is stored in (see `_precision_dtypes`). An `AdaptiveStop`
+    passed as `stop` may end sampling early from the step callback; it then
+    holds the number of steps that actually ran.
+
+    `micro_batch` picks when the batch is split into chunks: "on_oom" runs
+    it whole and halves only after an out-of-memory error, "auto" sizes the
+    chunks from free device memory up front, "off" never splits (see
+    `_run_micro_batched`). With a `stop` the batch always runs whole, since
+    the stopping decision is made for the batch as a unit.
+
+    A spilled latent (see `_spill`) is always sampled in micro-batches sized
+    from free device memory, whatever `micro_batch` says, and each one is
+    copied to the device only when it samples. Its per-step noise is drawn
+    as for the whole batch, so the result doesn't depend on the split.
+
+    With `cfg_truncate_sigma` the negative pass is skipped for every step
+    whose sigma is below it (see `_guided_model`).
+
+    `within_batch=(size, start)` says `latent` holds items [start, start + n)
+    of a `size`-item batch (with `noise` the matching slice of its noise).
+    Per-step noise is then drawn for the whole batch and sliced, so the
+    result equals the same rows of the whole-batch run (see
+    `_batch_slice_sampler`); micro-batch splits keep that property.
+    """
+    storage_dtype, sampling_dtype = _precision_dtypes(model, precision)
+    spilled = _is_spilled(latent["samples"] if isinstance(latent, dict) and "samples" in latent else latent)
+    with _span("prepare_latent", "fixup") as span:
+        latent_samples = _prepare_latent_samples(model, latent, sampling_dtype)
+        span.set(shape=list(latent_samples.shape))
 
     # --- NOISE / MASK HANDLING ---
     batch_inds = latent.get("batch_index", None) if isinstance(latent, dict) else None
     noise_mask = latent.get("noise_mask", None) if isinstance(latent, dict) else None
 
-    try:
-        noise = csample.prepare_noise(latent_samples, seed, batch_inds)
-    except TypeError:
-        noise = csample.prepare_noise(latent_samples, seed)
+    # generated once per (seed, shape, batch_index) and handed straight to the sampler
+    if noise is None:
+        noise = get_noise(latent_samples, seed, batch_inds, disable_noise=not add_noise)
 
     # --- NATIVE COMFYUI SAMPLER PATH (with built-in preview) ---
-   
-        # use Comfy's own node sampler for full preview support
-    ksampler_node = nodes.KSampler()
-    out = ksampler_node.sample(
-        model=model,
-        seed=seed,
-        steps=steps,
-        cfg=cfg,
-        sampler_name=sampler_name,
-        scheduler=scheduler,
-        positive=positive,
-        negative=negative,
-        latent_image={"samples": latent_samples},
-        denoise=denoise,
-    )
+    disable_pbar = not getattr(comfy.utils, "PROGRESS_BAR_ENABLED", True)
+    sampling_model = _guided_model(model, cfg, cfg_truncate_sigma)
+
+    if spilled and stop is None and within_batch is None:
+        within_batch = (latent_samples.shape[0], 0)
+
+    def sample_chunk(chunk, chunk_noise, start=0):
+        if spilled:
+            chunk = dict(chunk, samples=_unspill(chunk["samples"], _model_profile(model)["device"]))
+        # same preview callback / progress bar wiring as nodes.common_ksampler, under the node's preview policy
+        callback = _preview_callback(model, steps)
+        if stop is not None and noise_mask is None:
+            callback = stop.wrap(callback, model, steps, scheduler, denoise, start_step, last_step)
+        sampler = None
+        if within_batch is not None:
+            sampler = _batch_slice_sampler(sampler_name, within_batch[0], within_batch[1] + start)
+        if sampler is not None:
+            sigmas = _window_sigmas(sampling_model, steps, sampler_name, scheduler, denoise, start_step, last_step,
+                                    force_full_denoise)
+            if sigmas is None:
+                return chunk["samples"]
+            return csample.sample_custom(sampling_model, chunk_noise, cfg, sampler, sigmas, positive, negative,
+                                         chunk["samples"], noise_mask=chunk.get("noise_mask"), callback=callback,
+                                         disable_pbar=disable_pbar, seed=seed)
+        return csample.sample(
+            sampling_model,
+            chunk_noise,
+            steps,
+            cfg,
+            sampler_name,
+            scheduler,
+            positive,
+            negative,
+            chunk["samples"],
+            denoise=denoise,
+            disable_noise=not add_noise,
+            start_step=start_step,
+            last_step=last_step,
+            force_full_denoise=force_full_denoise,
+            noise_mask=chunk.get("noise_mask"),
+            callback=callback,
+            disable_pbar=disable_pbar,
+            seed=seed if within_batch is not None else _chunk_seed(seed, start),
+        )
 
-    mm.throw_exception_if_processing_interrupted()
+    batch = {"samples": latent_samples, "noise_mask": noise_mask}
+    chunk_size = latent_samples.shape[0]
+    if stop is None and (micro_batch == "auto" or spilled):
+        chunk_size = _micro_batch_size(model, latent_samples, _cfg_passes(model, cfg))
+    steps_run = (last_step if last_step is not None else steps) - (start_step or 0)
+    with _span("sample", "sampler", steps=min(steps_run, steps), sampler=sampler_name, scheduler=scheduler,
+               cfg=cfg, shape=list(latent_samples.shape)) as span:
+        try:
+            if stop is not None or (micro_batch == "off" and not spilled):
+                samples = sample_chunk(batch, noise)
+            else:
+                samples = _run_micro_batched(sample_chunk, batch, noise, chunk_size)
+                span.set(micro_batch=chunk_size)
+        except _StageStopped as stopped:
+            samples = stopped.latent
+            if hasattr(mm, "intermediate_device"):
+                samples = samples.to(mm.intermediate_device())
+            span.set(steps=stop.steps_run, stopped_early=True)
+    out = dict(latent) if isinstance(latent, dict) else {}
+    out["samples"] = samples.to(storage_dtype)
 
-    # Normalize output
-    if isinstance(out, tuple) and len(out) > 0:
-        out = out[0]
-    if isinstance(out, torch.Tensor):
-        out = {"samples": out}
+    mm.throw_exception_if_processing_interrupted()
 
     return out
 
 
-def _make_node_class(class_name, schema_callable, handler, return_types=("LATENT",), category="Azazeal / Switch Samplers"):
+HANDOFF_MODES = ("restart", "continuous")
+
+
+def _schema_for_handoff():
+    return {
+        "handoff_mode": (HANDOFF_MODES, {"default": "restart"}),
+    }
+
+
+def _stage_windows(stage_steps, handoff_mode="restart"):
+    """
+    Turn per-stage step counts into `_call_ksampler` keyword arguments.
+
+    "restart" gives every stage its own full schedule and fresh noise (the
+    original behaviour). "continuous" builds one schedule of `sum(stage_steps)`
+    steps and gives each stage its own [start_step, last_step) slice of it:
+    only the first stage adds noise and only the last one fully denoises.
+    Zero-step stages map to None and must be skipped by the caller.
+    """
+    if handoff_mode not in HANDOFF_MODES:
+        raise ValueError(f"Unknown handoff_mode '{handoff_mode}', expected one of {HANDOFF_MODES}")
+
+    stage_steps = [max(int(s), 0) for s in stage_steps]
+    if handoff_mode == "restart":
+        return [{"steps": s} if s > 0 else None for s in stage_steps]
+
+    total = sum(stage_steps)
+    active = [i for i, s in enumerate(stage_steps) if s > 0]
+    windows = []
+    start = 0
+    for i, s in enumerate(stage_steps):
+        if s <= 0:
+            windows.append(None)
+            continue
+        windows.append({
+            "steps": total,
+            "start_step": start,
+            "last_step": start + s,
+            "add_noise": i == active[0],
+            "force_full_denoise": i == active[-1],
+        })
+        start += s
+    return windows
+
+
+def _make_node_class(class_name, schema_callable, handler, return_types=("LATENT",), category="Azazeal / Switch Samplers",
+                     optional_schema_callable=None, requires_latent=True, return_names=None, profiled=False,
+                     previewed=False, extra_outputs=()):
+    """
+    Build a ComfyUI node class around `handler(model, latent, kwargs)`.
+    A `profiled` node gets the `profile` inputs and an extra STRING output
+    carrying the JSON profile of the run (empty when profiling is off).
+    A `previewed` node gets the `preview` inputs, applied to all its stages.
+    `extra_outputs` are (type, name) pairs returned after all of those, so
+    outputs added later never shift the slots existing workflows link to.
+    """
+    outputs = len(return_types)
+    if profiled:
+        return_names = (*(return_names or return_types), "profile")
+        return_types = (*return_types, "STRING")
+    if extra_outputs:
+        return_names = (*(return_names or return_types), *(name for _, name in extra_outputs))
+        return_types = (*return_types, *(kind for kind, _ in extra_outputs))
+
     def INPUT_TYPES():
-        return {"required": schema_callable()}
+        types = {"required": schema_callable()}
+        optional = optional_schema_callable() if optional_schema_callable is not None else {}
+        if profiled:
+            optional = {**optional, **_schema_for_profiling()}
+        if previewed:
+            optional = {**optional, **_schema_for_preview()}
+        if optional:
+            types["optional"] = optional
+        return types
 
     def sample(self, *args, **kwargs):
         latent = kwargs.get("latent_image", None)
-        if latent is None:
+        if latent is None and requires_latent:
             raise RuntimeError("No latent input provided. Connect an Empty Latent node.")
-        out = handler(kwargs.get("model", None), latent, kwargs)
-        return (out,)
-
-    new_cls = type(class_name, (Node,), {
+        try:
+            with _profiling(class_name, kwargs if profiled else {}) as profile, \
+                    _previewing(kwargs if previewed else {}):
+                out = handler(kwargs.get("model", None), latent, kwargs)
+        finally:
+            _buffer_pool.clear()
+        # nodes with several outputs return them as a tuple from the handler
+        out = out if outputs + len(extra_outputs) > 1 else (out,)
+        return (*out[:outputs], profile.report, *out[outputs:]) if profiled else out
+
+    attrs = {
         "INPUT_TYPES": staticmethod(INPUT_TYPES),
         "RETURN_TYPES": return_types,
         "FUNCTION": "sample",
         "CATEGORY": category,
         "sample": sample,
-    })
+    }
+    if return_names is not None:
+        attrs["RETURN_NAMES"] = return_names
+    new_cls = type(class_name, (Node,), attrs)
     return new_cls
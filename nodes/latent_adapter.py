@@ -0,0 +1,221 @@
+"""
+Latent-to-latent bridge adapters.
+
+An adapter maps latents of one VAE family straight into another VAE's latent
+space (e.g. 4-channel SD/SDXL <-> 16-channel SD3/Flux) with a per-pixel
+linear channel projection wrapped in per-channel scale/shift normalisation:
+
+    out = (W @ ((x - in_mean) / in_std) + b) * out_std + out_mean
+
+This is far cheaper than a full VAE decode -> resize -> encode round trip.
+Adapters are stored as safetensors files in `models/latent_adapters` and can
+be fitted on CPU from paired latents with this module's CLI:
+
+    python latent_adapter.py --src sdxl.latent --dst flux.latent --out sdxl_to_flux.safetensors
+"""
+import argparse
+import logging
+import os
+import threading
+
+import torch
+import torch.nn.functional as F
+
+try:
+    import folder_paths
+
+    if "latent_adapters" not in folder_paths.folder_names_and_paths:
+        folder_paths.folder_names_and_paths["latent_adapters"] = (
+            [os.path.join(folder_paths.models_dir, "latent_adapters")], {".safetensors"})
+except Exception:
+    folder_paths = None
+
+_LATENT_KEYS = ("samples", "latent_tensor", "latent")
+
+
+class LatentAdapter:
+    def __init__(self, weight, bias, in_mean, in_std, out_mean, out_std, spatial_scale=1.0):
+        self.weight = weight
+        self.bias = bias
+        self.in_mean = in_mean
+        self.in_std = in_std
+        self.out_mean = out_mean
+        self.out_std = out_std
+        self.spatial_scale = float(spatial_scale)
+
+    @property
+    def in_channels(self):
+        return self.weight.shape[1]
+
+    @property
+    def out_channels(self):
+        return self.weight.shape[0]
+
+    def apply(self, samples):
+        """Map a (B, C, H, W) or (B, C, T, H, W) latent into the target latent space."""
+        if not torch.is_tensor(samples) or samples.ndim < 3:
+            raise ValueError(f"Adapter expects a BC... latent tensor, got {type(samples)}")
+        if samples.shape[1] != self.in_channels:
+            raise ValueError(f"Adapter expects {self.in_channels} input channels, got {samples.shape[1]}")
+
+        dtype = samples.dtype if samples.is_floating_point() else torch.float32
+        view = (1, -1) + (1,) * (samples.ndim - 2)
+        w = self.weight.to(samples.device, dtype)
+        x = (samples.to(dtype) - self.in_mean.to(samples.device, dtype).view(view)) \
+            / self.in_std.to(samples.device, dtype).view(view)
+        y = torch.einsum("oc,bc...->bo...", w, x) + self.bias.to(samples.device, dtype).view(view)
+        y = y * self.out_std.to(samples.device, dtype).view(view) + self.out_mean.to(samples.device, dtype).view(view)
+
+        if self.spatial_scale != 1.0:
+            size = [max(1, round(s * self.spatial_scale)) for s in y.shape[-2:]]
+            if y.ndim == 5:
+                b, c, t = y.shape[:3]
+                y = F.interpolate(y.reshape(b, c * t, *y.shape[-2:]), size=size, mode="bilinear",
+                                  align_corners=False).reshape(b, c, t, *size)
+            else:
+                y = F.interpolate(y, size=size, mode="bilinear", align_corners=False)
+        return y.contiguous()
+
+    def state_dict(self):
+        return {
+            "weight": self.weight, "bias": self.bias,
+            "in_mean": self.in_mean, "in_std": self.in_std,
+            "out_mean": self.out_mean, "out_std": self.out_std,
+            "spatial_scale": torch.tensor(self.spatial_scale),
+        }
+
+    @classmethod
+    def from_state_dict(cls, sd):
+        missing = [k for k in ("weight", "bias", "in_mean", "in_std", "out_mean", "out_std") if k not in sd]
+        if missing:
+            raise ValueError(f"Not a latent adapter file, missing tensors: {missing}")
+        scale = sd.get("spatial_scale", None)
+        return cls(sd["weight"].float(), sd["bias"].float(), sd["in_mean"].float(), sd["in_std"].float(),
+                   sd["out_mean"].float(), sd["out_std"].float(),
+                   float(scale) if scale is not None else 1.0)
+
+
+def _channel_stats(x):
+    flat = x.transpose(0, 1).reshape(x.shape[1], -1).double()
+    return flat.mean(dim=1), flat.std(dim=1).clamp_min(1e-6)
+
+
+def fit_latent_adapter(src, dst, ridge=1e-4):
+    """
+    Fit an adapter on paired latents (same images encoded by both VAEs).
+    Pure torch on CPU: closed-form ridge regression over every latent pixel.
+    """
+    src = src.detach().cpu().double()
+    dst = dst.detach().cpu().double()
+    if src.shape[0] != dst.shape[0]:
+        raise ValueError(f"Paired latents need the same batch size, got {src.shape[0]} and {dst.shape[0]}")
+
+    spatial_scale = dst.shape[-1] / src.shape[-1]
+    if dst.shape[2:] != src.shape[2:]:
+        # fit at the source resolution, resize at apply time
+        if dst.ndim == 5:
+            b, c, t = dst.shape[:3]
+            dst = F.interpolate(dst.reshape(b, c * t, *dst.shape[-2:]), size=src.shape[-2:], mode="bilinear",
+                                align_corners=False).reshape(b, c, t, *src.shape[-2:])
+        else:
+            dst = F.interpolate(dst, size=src.shape[-2:], mode="bilinear", align_corners=False)
+
+    in_mean, in_std = _channel_stats(src)
+    out_mean, out_std = _channel_stats(dst)
+    view = (1, -1) + (1,) * (src.ndim - 2)
+    x = ((src - in_mean.view(view)) / in_std.view(view)).transpose(0, 1).reshape(src.shape[1], -1).T
+    y = ((dst - out_mean.view(view)) / out_std.view(view)).transpose(0, 1).reshape(dst.shape[1], -1).T
+
+    x = torch.cat([x, torch.ones(x.shape[0], 1, dtype=x.dtype)], dim=1)
+    gram = x.T @ x + ridge * x.shape[0] * torch.eye(x.shape[1], dtype=x.dtype)
+    coef = torch.linalg.solve(gram, x.T @ y)
+
+    return LatentAdapter(coef[:-1].T.float().contiguous(), coef[-1].float().contiguous(),
+                         in_mean.float(), in_std.float(), out_mean.float(), out_std.float(), spatial_scale)
+
+
+def save_latent_adapter(adapter, path):
+    from safetensors.torch import save_file
+    save_file({k: v.contiguous() for k, v in adapter.state_dict().items()}, path)
+
+
+def _load_safetensors(path):
+    from safetensors.torch import load_file
+    return load_file(path, device="cpu")
+
+
+_adapter_cache = {}
+_adapter_lock = threading.Lock()
+
+
+def load_latent_adapter(path):
+    """Load an adapter file, cached per (path, mtime)."""
+    key = (os.path.abspath(path), os.path.getmtime(path))
+    with _adapter_lock:
+        adapter = _adapter_cache.get(key)
+    if adapter is None:
+        adapter = LatentAdapter.from_state_dict(_load_safetensors(path))
+        with _adapter_lock:
+            _adapter_cache[key] = adapter
+    return adapter
+
+
+def adapter_names():
+    if folder_paths is None:
+        return []
+    try:
+        return folder_paths.get_filename_list("latent_adapters")
+    except Exception:
+        return []
+
+
+def resolve_latent_adapter(name):
+    """Resolve a node-input adapter name to a LatentAdapter, or None for "none"/missing files."""
+    if not name or name == "none":
+        return None
+    path = name
+    if folder_paths is not None and not os.path.isfile(path):
+        path = folder_paths.get_full_path("latent_adapters", name)
+    if not path or not os.path.isfile(path):
+        logging.warning(f"Latent adapter '{name}' not found, falling back to VAE bridge.")
+        return None
+    try:
+        return load_latent_adapter(path)
+    except Exception as e:
+        logging.warning(f"Failed to load latent adapter '{name}': {e}. Falling back to VAE bridge.")
+        return None
+
+
+def _load_latents(path):
+    sd = _load_safetensors(path)
+    for key in _LATENT_KEYS:
+        if key in sd:
+            return sd[key]
+    if len(sd) == 1:
+        return next(iter(sd.values()))
+    raise ValueError(f"{path}: expected one of {_LATENT_KEYS}, found {list(sd.keys())}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit a latent-to-latent bridge adapter from paired latents.")
+    parser.add_argument("--src", nargs="+", required=True, help="latent files from the source VAE")
+    parser.add_argument("--dst", nargs="+", required=True, help="latent files from the target VAE, same order")
+    parser.add_argument("--out", required=True, help="output adapter .safetensors")
+    parser.add_argument("--ridge", type=float, default=1e-4)
+    args = parser.parse_args(argv)
+
+    if len(args.src) != len(args.dst):
+        parser.error("--src and --dst need the same number of files")
+    src = torch.cat([_load_latents(p) for p in args.src])
+    dst = torch.cat([_load_latents(p) for p in args.dst])
+
+    adapter = fit_latent_adapter(src, dst, ridge=args.ridge)
+    mapped = adapter.apply(src.float())
+    mse = F.mse_loss(mapped, dst.float()).item() if mapped.shape == dst.shape else None
+    save_latent_adapter(adapter, args.out)
+    print(f"adapter {adapter.in_channels}->{adapter.out_channels} channels, spatial x{adapter.spatial_scale:g}"
+          + (f", fit mse {mse:.6f}" if mse is not None else "") + f" -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
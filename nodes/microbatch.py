@@ -0,0 +1,110 @@
+import logging
+
+import torch
+import comfy.model_management as mm
+
+from .buffers import _buffer_pool
+from .capabilities import _model_profile
+from .residency import _is_loaded, _model_size
+
+_OOM_EXCEPTION = getattr(mm, "OOM_EXCEPTION", torch.cuda.OutOfMemoryError)
+
+MICRO_BATCH_MODES = ("on_oom", "auto", "off")
+
+
+def _schema_for_micro_batch():
+    return {
+        "micro_batch": (MICRO_BATCH_MODES, {"default": "on_oom",
+                                            "tooltip": "on_oom: sample the whole batch and split it only after "
+                                                       "an out-of-memory error. auto: split up front into chunks "
+                                                       "sized from free device memory. off: never split. Split "
+                                                       "batches give ancestral/SDE samplers different per-step "
+                                                       "noise than a whole-batch run."}),
+    }
+
+
+def _chunk_seed(seed, start):
+    """
+    Sampler seed for the batch chunk starting at item `start`. The first
+    chunk keeps the stage seed; later chunks get their own, so chunks don't
+    replay the same per-step noise stream of ancestral/SDE samplers.
+    """
+    return seed if start == 0 else (seed * 1000003 + start) % (1 << 64)
+
+
+def _slice_batch(value, sl, batch):
+    if torch.is_tensor(value) and value.ndim >= 3 and value.shape[0] == batch:
+        return value[sl]
+    if isinstance(value, (list, tuple)) and len(value) == batch:
+        return list(value[sl])
+    return value
+
+
+def _split_latent(latent, chunk_size):
+    """Yield (slice, latent dict) batch chunks, keeping batch_index / noise_mask aligned."""
+    batch = latent["samples"].shape[0]
+    for start in range(0, batch, chunk_size):
+        sl = slice(start, min(start + chunk_size, batch))
+        yield sl, {k: _slice_batch(v, sl, batch) for k, v in latent.items()}
+
+
+def _sample_bytes(model, latent_samples, passes=2):
+    """Device memory one batch item needs inside the sampler at `passes` model passes per step, or None."""
+    try:
+        return int(model.model.memory_required([passes, *latent_samples.shape[1:]]))
+    except Exception:
+        return None
+
+
+def _micro_batch_size(model, latent_samples, passes=2):
+    """
+    Largest chunk of `latent_samples` expected to fit in free device memory.
+    Without an estimate from the model the whole batch is tried first and
+    the OOM back-off in `_run_micro_batched` does the rest.
+    """
+    batch = latent_samples.shape[0]
+    per_item = _sample_bytes(model, latent_samples, passes)
+    if batch <= 1 or not per_item:
+        return batch
+    try:
+        free = mm.get_free_memory(_model_profile(model)["device"])
+    except Exception:
+        return batch
+    if not _is_loaded(model):
+        free -= _model_size(model)
+    return max(1, min(batch, int(free // per_item)))
+
+
+def _run_micro_batched(sample_fn, latent, noise, chunk_size):
+    """
+    Run `sample_fn(latent_chunk, noise_chunk, start)` over batch chunks of at most
+    `chunk_size` items and concatenate the results in batch order. A chunk
+    that runs out of memory is retried at half the size, and the smaller
+    size is kept for the rest of the batch.
+
+    `noise` is the whole batch's noise (drawn with its batch_index), so every
+    item gets the initial noise of the unchunked run. `start` is the chunk's
+    first batch item, for `_chunk_seed`.
+    """
+    batch = latent["samples"].shape[0]
+    results = []
+    start = 0
+    while start < batch:
+        sl = slice(start, min(start + chunk_size, batch))
+        part = {k: _slice_batch(v, sl, batch) for k, v in latent.items()}
+        try:
+            results.append(sample_fn(part, noise[sl], sl.start))
+        except _OOM_EXCEPTION:
+            size = sl.stop - sl.start
+            if size <= 1:
+                raise
+            chunk_size = size // 2
+            logging.warning(f"Switch samplers: out of memory sampling {size} latents, retrying {chunk_size} at a time.")
+            _buffer_pool.clear()
+            if hasattr(mm, "soft_empty_cache"):
+                mm.soft_empty_cache()
+            continue
+        start = sl.stop
+        if start < batch:
+            mm.throw_exception_if_processing_interrupted()
+    return results[0] if len(results) == 1 else torch.cat(results)
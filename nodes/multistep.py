@@ -1,4 +1,14 @@
-from .helpers import _call_ksampler, _make_node_class, _schema_for_basic
+from .checkpoint import _schema_for_checkpoint
+from .guidance import _truncate_input
+from .helpers import _make_node_class, _schema_for_handoff
+from .microbatch import _schema_for_micro_batch
+from .plan import _run_stage_plan, _stage
+from .precision import _schema_for_precision
+from .progressive import _scale_input, _schema_for_progressive
+from .residency import _schema_for_residency
+from .spill import _schema_for_spill
+from .stage_cache import _schema_for_stage_cache
+from .temporal import _schema_for_temporal
 import comfy.samplers as cs
 
 def _multistep_handler(model, latent, kwargs):
@@ -22,6 +32,13 @@ def _multistep_handler(model, latent, kwargs):
     d2 = kwargs.get("denoise_stage2", 1.00)
     d3 = kwargs.get("denoise_stage3", 1.00)
 
+    t1 = kwargs.get("cfg_truncate_sigma_stage1", 0.0)
+    t2 = kwargs.get("cfg_truncate_sigma_stage2", 0.0)
+    t3 = kwargs.get("cfg_truncate_sigma_stage3", 0.0)
+
+    sc1 = kwargs.get("scale_stage1", 1.0)
+    sc2 = kwargs.get("scale_stage2", 1.0)
+
     seed = kwargs.get("seed", 0)
 
     # Models: fallback to earlier stage if missing
@@ -29,21 +46,14 @@ def _multistep_handler(model, latent, kwargs):
     m2 = kwargs.get("model2", m1)
     m3 = kwargs.get("model3", m2)
 
-    out = latent
-    if steps1 > 0:
-        out = _call_ksampler(m1, out, steps1, s1, sch1, cfg1,
-                             kwargs.get("positive"), kwargs.get("negative"),
-                             seed, d1)
-    if steps2 > 0:
-        out = _call_ksampler(m2, out, steps2, s2, sch2, cfg2,
-                             kwargs.get("positive"), kwargs.get("negative"),
-                             seed + 1, d2)
-    if steps3 > 0:
-        out = _call_ksampler(m3, out, steps3, s3, sch3, cfg3,
-                             kwargs.get("positive"), kwargs.get("negative"),
-                             seed + 2, d3)
+    pos, neg = kwargs.get("positive"), kwargs.get("negative")
+    stages = [
+        _stage(m1, pos, neg, steps1, s1, sch1, cfg1, d1, scale=sc1, cfg_truncate_sigma=t1),
+        _stage(m2, pos, neg, steps2, s2, sch2, cfg2, d2, scale=sc2, cfg_truncate_sigma=t2),
+        _stage(m3, pos, neg, steps3, s3, sch3, cfg3, d3, cfg_truncate_sigma=t3),
+    ]
+    return _run_stage_plan(stages, latent, seed, kwargs)
 
-    return out
 
 
 
@@ -71,4 +81,10 @@ MultiStepKSampler = _make_node_class("MultiStepKSampler", lambda: {
     "denoise_stage2": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0, "step": 0.01}),
     "denoise_stage3": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0, "step": 0.01}),
     "latent_image": ("LATENT",),
-}, _multistep_handler)
\ No newline at end of file
+}, _multistep_handler, optional_schema_callable=lambda: {
+    **_schema_for_handoff(), **_schema_for_residency(), **_schema_for_stage_cache(),
+    **_schema_for_precision(), **_scale_input("scale_stage1"), **_scale_input("scale_stage2"),
+    **_schema_for_progressive(), **_schema_for_temporal(), **_schema_for_spill(), **_schema_for_checkpoint(),
+    **_schema_for_micro_batch(),
+    **_truncate_input("cfg_truncate_sigma_stage1"), **_truncate_input("cfg_truncate_sigma_stage2"),
+    **_truncate_input("cfg_truncate_sigma_stage3")}, profiled=True, previewed=True)
\ No newline at end of file
@@ -0,0 +1,125 @@
+import inspect
+import threading
+from collections import OrderedDict
+
+import torch
+import comfy.sample as csample
+import comfy.samplers as cs
+
+try:
+    import comfy.k_diffusion.sampling as k_sampling
+except Exception:
+    k_sampling = None
+
+
+def _batch_key(batch_inds):
+    if batch_inds is None:
+        return None
+    if torch.is_tensor(batch_inds):
+        batch_inds = batch_inds.flatten().tolist()
+    return tuple(int(i) for i in batch_inds)
+
+
+class NoiseProvider:
+    """
+    Generates initial sampling noise once per (seed, shape, dtype, batch_index)
+    and keeps the most recent results in a small LRU cache, so stages and
+    re-queued prompts that reuse a seed/latent skip the RNG pass entirely.
+
+    Returned tensors are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=4, max_bytes=1 << 30):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._cache = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, latent_samples, seed, batch_inds=None, disable_noise=False):
+        key = (int(seed), tuple(latent_samples.shape), latent_samples.dtype, latent_samples.layout,
+               _batch_key(batch_inds), bool(disable_noise))
+
+        with self._lock:
+            noise = self._cache.get(key)
+            if noise is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return noise
+            self.misses += 1
+
+        if disable_noise:
+            noise = torch.zeros(latent_samples.size(), dtype=latent_samples.dtype,
+                                layout=latent_samples.layout, device="cpu")
+        else:
+            try:
+                noise = csample.prepare_noise(latent_samples, seed, batch_inds)
+            except TypeError:
+                noise = csample.prepare_noise(latent_samples, seed)
+
+        self._store(key, noise)
+        return noise
+
+    def _store(self, key, noise):
+        size = noise.numel() * noise.element_size()
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = noise
+            self._bytes += size
+            while len(self._cache) > self.max_entries or self._bytes > self.max_bytes:
+                _, old = self._cache.popitem(last=False)
+                self._bytes -= old.numel() * old.element_size()
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._bytes = 0
+
+
+_noise_provider = NoiseProvider()
+
+
+def get_noise(latent_samples, seed, batch_inds=None, disable_noise=False):
+    """Shared-provider shortcut used by `_call_ksampler`."""
+    return _noise_provider.get(latent_samples, seed, batch_inds, disable_noise)
+
+
+def _step_noise_sampler(sampler_name, x, sigmas, seed):
+    """The per-step noise sampler comfy's `sampler_name` builds for `x` when it is given none."""
+    if sampler_name.startswith("dpmpp") and "sde" in sampler_name:
+        sigma_min, sigma_max = sigmas[sigmas > 0].min(), sigmas.max()
+        return k_sampling.BrownianTreeNoiseSampler(x, sigma_min, sigma_max, seed=seed,
+                                                   cpu=not sampler_name.endswith("_gpu"))
+    return k_sampling.default_noise_sampler(x, seed=seed)
+
+
+def _batch_slice_sampler(sampler_name, batch, start):
+    """
+    comfy sampler object for `sampler_name` that samples items [start, start + n)
+    of a `batch`-item batch: every step draws its ancestral/SDE noise for the
+    whole batch and keeps the chunk's slice, so the chunk gets exactly the
+    noise it would get inside the whole-batch run. None when the sampler takes
+    no per-step noise sampler, in which case the chunk needs no special care.
+    """
+    if k_sampling is None or not hasattr(cs, "ksampler"):
+        return None
+    sampler = cs.ksampler(sampler_name)
+    function = sampler.sampler_function
+    if "noise_sampler" not in inspect.signature(function).parameters:
+        return None
+
+    def sampler_function(model, x, sigmas, *args, extra_args=None, **kwargs):
+        rows = slice(start, start + x.shape[0])
+        # a view with the whole batch's shape; the noise samplers only read its size, dtype and device
+        whole = _step_noise_sampler(sampler_name, x[:1].expand(batch, *x.shape[1:]), sigmas,
+                                    (extra_args or {}).get("seed"))
+        kwargs["noise_sampler"] = lambda sigma, sigma_next: whole(sigma, sigma_next)[rows]
+        return function(model, x, sigmas, *args, extra_args=extra_args, **kwargs)
+
+    sampler.sampler_function = sampler_function
+    return sampler
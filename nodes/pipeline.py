@@ -0,0 +1,100 @@
+import contextlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+import comfy.model_management as mm
+
+from .helpers import _call_ksampler, _stage_noise
+from .microbatch import _split_latent
+
+
+def _schema_for_pipeline():
+    return {
+        "pipeline_chunk": ("INT", {"default": 0, "min": 0, "max": 4096,
+                                   "tooltip": "Batch chunk size for overlapping the VAE bridge with sampling. "
+                                              "0 runs every stage on the whole batch."}),
+    }
+
+
+def _use_pipeline(latent, chunk_size):
+    samples = latent["samples"] if isinstance(latent, dict) else latent
+    return torch.is_tensor(samples) and 0 < chunk_size < samples.shape[0]
+
+
+@contextlib.contextmanager
+def _serialized_loads(model):
+    """
+    While the pipeline runs, `mm.load_models_gpu` calls from the sampling and
+    bridge threads run one at a time, and a load issued off the calling thread
+    also loads `model`, so the bridge's VAE load never evicts the sampling model.
+    """
+    load = getattr(mm, "load_models_gpu", None)
+    if load is None:
+        yield
+        return
+    owner = threading.get_ident()
+    lock = threading.RLock()
+
+    @functools.wraps(load)
+    def serialized(models, *args, **kwargs):
+        if threading.get_ident() != owner and not any(m is model for m in models):
+            models = [*models, model]
+        with lock:
+            return load(models, *args, **kwargs)
+
+    mm.load_models_gpu = serialized
+    try:
+        yield
+    finally:
+        mm.load_models_gpu = load
+
+
+def _bridge_chunk(bridge_fn, samples, stream, sampled):
+    if stream is None:
+        return bridge_fn(samples)
+    with torch.cuda.stream(stream):
+        stream.wait_event(sampled)
+        return bridge_fn(samples)
+
+
+def _pipelined_sample_bridge(model, latent, sampler_kwargs, bridge_fn, chunk_size):
+    """
+    Run one `_call_ksampler` stage in batch chunks and bridge every finished
+    chunk on a worker thread while the next chunk samples. Model loads are
+    serialized for the duration (see `_serialized_loads`); on CUDA the bridge
+    runs on a side stream once the chunk's sampling kernels are done.
+
+    Noise is drawn once for the whole batch and sliced per chunk, and each
+    chunk draws its per-step noise for the whole batch and keeps its slice
+    (`within_batch`), so the result equals the unpipelined stage followed by
+    the bridge. Results come back in the original batch order.
+    """
+    latent = latent if isinstance(latent, dict) else {"samples": latent}
+    batch = latent["samples"].shape[0]
+    noise = _stage_noise(model, latent, sampler_kwargs["seed"], sampler_kwargs.get("add_noise", True),
+                         sampler_kwargs.get("precision", "fp32"))
+
+    stream = None
+    futures = []
+    with _serialized_loads(model), ThreadPoolExecutor(max_workers=1, thread_name_prefix="switch-bridge") as pool:
+        for sl, chunk in _split_latent(latent, chunk_size):
+            # stop sampling as soon as a bridge has failed
+            for future in futures:
+                if future.done():
+                    future.result()
+            samples = _call_ksampler(model, chunk, noise=noise[sl], within_batch=(batch, sl.start),
+                                     **sampler_kwargs)["samples"]
+            sampled = None
+            if samples.is_cuda:
+                stream = stream or torch.cuda.Stream(samples.device)
+                sampled = torch.cuda.Event()
+                sampled.record(torch.cuda.current_stream(samples.device))
+                # the sampled chunk is read on the side stream; keep its memory until that is done
+                samples.record_stream(stream)
+            futures.append(pool.submit(_bridge_chunk, bridge_fn, samples, stream, sampled))
+        outs = [future.result() for future in futures]
+    if stream is not None:
+        torch.cuda.current_stream(stream.device).wait_stream(stream)
+    return torch.cat(outs)
@@ -0,0 +1,422 @@
+import logging
+
+import comfy.samplers as cs
+
+from .adaptive import AdaptiveStop, _continue_after_stop, _plan_adaptive
+from .bridge import _bridge_decision, _bridge_kwargs, _bridge_latent, _schema_for_bridge
+from .capabilities import _vae_profile
+from .checkpoint import _job_checkpoints, _schema_for_checkpoint
+from .guidance import _truncate_input
+from .helpers import _call_ksampler, _make_node_class, _schema_for_handoff, _stage_windows
+from .latent_adapter import adapter_names
+from .microbatch import _schema_for_micro_batch
+from .pipeline import _pipelined_sample_bridge, _schema_for_pipeline, _use_pipeline
+from .precision import _output_latent, _schema_for_precision
+from .progressive import _latent_resizer, _schema_for_progressive, _scale_input, _spatial_size, _target_size
+from .profiling import _instant, _span
+from .residency import _schema_for_residency, _stage_residency
+from .spill import _schema_for_spill, _spill
+from .stage_cache import _cache_settings, _schema_for_stage_cache, _stage_cache, _stage_key
+from .temporal import _sample_temporal, _schema_for_temporal, _stream_frames, _temporal_settings, _use_temporal
+
+
+def _stage(model, positive, negative, steps, sampler_name, scheduler, cfg, denoise=1.0, vae=None,
+           bridge_adapter=None, scale=1.0, cfg_truncate_sigma=0.0):
+    """
+    One entry of a STAGE_PLAN. `bridge_adapter` is used for the bridge *into*
+    this stage; `scale` is its latent resolution relative to the input latent;
+    below `cfg_truncate_sigma` it samples without the negative pass.
+    """
+    return {
+        "model": model, "vae": vae, "positive": positive, "negative": negative,
+        "sampler_name": sampler_name, "scheduler": scheduler, "cfg": cfg, "denoise": denoise,
+        "steps": steps, "bridge_adapter": bridge_adapter, "scale": scale,
+        "cfg_truncate_sigma": cfg_truncate_sigma,
+    }
+
+
+def _fusable(a, b):
+    return (a["bridge_from"] is None and b["bridge_from"] is None and not b["resize"]
+            and a["model"] is b["model"]
+            and a["sampler_name"] == b["sampler_name"] and a["scheduler"] == b["scheduler"]
+            and a["cfg"] == b["cfg"] and a.get("cfg_truncate_sigma", 0.0) == b.get("cfg_truncate_sigma", 0.0)
+            and a["positive"] is b["positive"] and a["negative"] is b["negative"])
+
+
+def _warn_unshared(stages, windows, first):
+    for index, (stage, window) in enumerate(zip(stages, windows)):
+        for name in ("scheduler", "denoise"):
+            if window is not None and stage[name] != stages[first][name]:
+                logging.warning(f"Switch samplers: continuous handoff samples one schedule; stage {index + 1}'s "
+                                f"{name} {stage[name]!r} is ignored, stage {first + 1}'s {stages[first][name]!r} "
+                                f"applies.")
+
+
+def _decide_bridge(vae_src, vae_dst, src_index, dst_index):
+    """Whether a bridge is needed between two stages; the reason goes to the debug log and the profile."""
+    needed, reason = _bridge_decision(vae_src, vae_dst)
+    if vae_src is not None and vae_dst is not None and src_index != dst_index:
+        label = f"Stage {src_index + 1}→{dst_index + 1}"
+        logging.debug(f"Switch samplers: {label} bridge {'taken' if needed else 'skipped'}, {reason}.")
+        _instant("bridge_decision", "bridge", transition=label, bridged=needed, reason=reason)
+    return needed
+
+
+def _compile_plan(stages, handoff_mode="restart", renoise=True):
+    """
+    Turn a list of `_stage` dicts into the sampling calls that actually run:
+      - zero-step stages are dropped (and so are the bridges around them),
+      - a bridge is only kept between stages whose VAEs actually differ
+        (see `_bridge_decision`), and a latent resize only where the stage
+        scale changes,
+      - in "continuous" handoff, adjacent stages sharing model, sampler,
+        scheduler, cfg and conditioning are fused into one call over their
+        combined slice of the schedule (restart stages re-noise, so they never fuse).
+    A resize in "continuous" handoff is treated like a bridge when `renoise`
+    is set: the low-res call finishes clean and the next one re-noises.
+    "continuous" samples one schedule, so every call takes the first active
+    stage's scheduler and denoise; differing values are logged and ignored.
+    Returns (calls, tail) where `tail` is a final (src_vae, dst_vae, adapter)
+    bridge needed when trailing zero-step stages change the output VAE.
+    """
+    windows = _stage_windows([s["steps"] for s in stages], handoff_mode)
+
+    # a stage without a VAE keeps the previous one, like vae2 defaulting to vae1
+    vaes, vae = [], None
+    for stage in stages:
+        vae = stage.get("vae") if stage.get("vae") is not None else vae
+        vaes.append(vae)
+
+    first = next((i for i, w in enumerate(windows) if w is not None), 0)
+    shared = {"scheduler": stages[first]["scheduler"], "denoise": stages[first]["denoise"]} if stages else {}
+    if handoff_mode == "continuous":
+        _warn_unshared(stages, windows, first)
+
+    calls = []
+    space = vaes[0] if vaes else None  # the input latent lives in the first stage's VAE space
+    scale = 1.0  # ... and at full resolution
+    for index, (stage, window, stage_vae) in enumerate(zip(stages, windows, vaes)):
+        if window is None:
+            continue
+        call = dict(stage, vae=stage_vae, index=index, window=dict(window), scale=stage.get("scale", 1.0))
+        prev_index = calls[-1]["index"] if calls else 0
+        call["bridge_from"] = space if _decide_bridge(space, stage_vae, prev_index, index) else None
+        call["resize"] = call["scale"] != scale
+        if handoff_mode == "continuous":
+            call.update(shared)
+            if (call["bridge_from"] is not None or (call["resize"] and renoise)) and calls:
+                # the VAE round trip needs a clean image: finish the previous call and
+                # let this one re-noise at the first sigma of its own slice
+                calls[-1]["window"]["force_full_denoise"] = True
+                call["window"]["add_noise"] = True
+        calls.append(call)
+        space = stage_vae if stage_vae is not None else space
+        scale = call["scale"]
+
+    if handoff_mode == "continuous":
+        fused = []
+        for call in calls:
+            if fused and _fusable(fused[-1], call):
+                fused[-1]["window"]["last_step"] = call["window"]["last_step"]
+                fused[-1]["window"]["force_full_denoise"] = call["window"]["force_full_denoise"]
+                continue
+            fused.append(call)
+        calls = fused
+
+    tail = None
+    last = calls[-1]["index"] if calls else 0
+    if stages and _decide_bridge(space, vaes[-1], last, len(stages) - 1):
+        tail = (space, vaes[-1], stages[-1].get("bridge_adapter"))
+    return calls, tail
+
+
+def _carry(latent, samples):
+    """New latent dict for bridged samples; batch_index survives, masks of the old space do not."""
+    out = {"samples": samples}
+    if isinstance(latent, dict) and "batch_index" in latent:
+        out["batch_index"] = latent["batch_index"]
+    return out
+
+
+def _make_bridge(vae_src, vae_dst, adapter_name, src_index, dst_index, options):
+    temporal = _temporal_settings(options)
+    causal = any(_vae_profile(vae)["temporal_factor"] for vae in (vae_src, vae_dst) if vae is not None)
+
+    def bridge_frames(samples):
+        return _bridge_latent(samples, vae_src, vae_dst, adapter_name=adapter_name,
+                              label=f"Stage {src_index + 1}→{dst_index + 1}", src_name=f"VAE{src_index + 1}",
+                              context="multi-step", spill=options.get("latent_spill", "off"),
+                              **_bridge_kwargs(options))
+
+    def bridge(samples):
+        # video latents cross the bridge one temporal window at a time, unless a VAE is causal in time
+        return _stream_frames(bridge_frames, samples, temporal[0], causal) if temporal else bridge_frames(samples)
+    return bridge
+
+
+def _call_bridges(calls, i, options):
+    """(pre_bridge, bridge) around compiled call `i`: into the first call, and out into the next one."""
+    call = calls[i]
+    pre_bridge = None
+    if i == 0 and call["bridge_from"] is not None:
+        pre_bridge = _make_bridge(call["bridge_from"], call["vae"], call["bridge_adapter"], 0, call["index"], options)
+
+    nxt = calls[i + 1] if i + 1 < len(calls) else None
+    bridge = None
+    if nxt is not None and nxt["bridge_from"] is not None:
+        bridge = _make_bridge(nxt["bridge_from"], nxt["vae"], nxt["bridge_adapter"], call["index"], nxt["index"],
+                              options)
+    return pre_bridge, bridge
+
+
+def _call_sampler_kwargs(call, seed, options):
+    kwargs = dict(sampler_name=call["sampler_name"], scheduler=call["scheduler"], cfg=call["cfg"],
+                  positive=call["positive"], negative=call["negative"], seed=seed + call["index"],
+                  denoise=call["denoise"], precision=options.get("precision", "fp32"), **call["window"])
+    if call.get("cfg_truncate_sigma"):
+        # only when set, so stage cache keys of untruncated stages stay as they were
+        kwargs["cfg_truncate_sigma"] = call["cfg_truncate_sigma"]
+    if options.get("micro_batch", "on_oom") != "on_oom":
+        kwargs["micro_batch"] = options["micro_batch"]
+    return kwargs
+
+
+def _call_key(prev_key, calls, i, sampler_kwargs, options):
+    """Stage cache key of call `i`, chained from the key of whatever produced its input."""
+    if prev_key is None:
+        return None
+    call = calls[i]
+    nxt = calls[i + 1] if i + 1 < len(calls) else None
+    pre = (call["bridge_from"], call["vae"], call["bridge_adapter"]) \
+        if i == 0 and call["bridge_from"] is not None else None
+    post = (nxt["bridge_from"], nxt["vae"], nxt["bridge_adapter"]) \
+        if nxt is not None and nxt["bridge_from"] is not None else None
+    resize = (call["scale"], options.get("upscale_method", "bicubic")) if call.get("resize") else None
+    return _stage_key(prev_key, call["model"], sampler_kwargs, pre, post,
+                      _bridge_kwargs(options) if pre or post else None, call.get("stop"), resize,
+                      _temporal_settings(options))
+
+
+def _window_steps(window):
+    return window.get("last_step", window["steps"]) - window.get("start_step", 0)
+
+
+def _run_call(call, out, sampler_kwargs, pre_bridge, bridge, options, stop=None, resize=None, sampled=None,
+              on_sampled=None):
+    """
+    Sample one compiled call on `out`, applying the bridges and resize around
+    it. With `sampled` (this call's output checkpointed before its bridge)
+    only the outbound bridge runs; `on_sampled` receives that output before
+    the bridge otherwise.
+    """
+    with _span(f"stage {call['index'] + 1}", "stage", model=type(call["model"]).__name__,
+               steps=_window_steps(call["window"]), sampler=call["sampler_name"], cfg=call["cfg"]):
+        if sampled is not None:
+            out = sampled
+        else:
+            if pre_bridge is not None:
+                out = _carry(out, pre_bridge(out["samples"]))
+            if resize is not None:
+                with _span("resize", "resize", src_shape=list(out["samples"].shape)):
+                    out = _carry(out, resize(out["samples"]))
+
+            temporal = _temporal_settings(options)
+            pipeline_chunk = options.get("pipeline_chunk", 0)
+            if temporal is not None and _use_temporal(out, temporal[0]):
+                # every model call runs window by window, the sampler steps the whole clip
+                out = _sample_temporal(call["model"], out, sampler_kwargs, *temporal, stop=stop)
+            elif bridge is not None and stop is None and _use_pipeline(out, pipeline_chunk):
+                # sample in batch chunks, bridging finished chunks on a worker thread
+                return _carry(out, _pipelined_sample_bridge(call["model"], out, sampler_kwargs, bridge,
+                                                            pipeline_chunk))
+            else:
+                out = _call_ksampler(call["model"], out, stop=stop, **sampler_kwargs)
+            if bridge is not None and on_sampled is not None:
+                on_sampled(out)
+        if bridge is not None:
+            out = _carry(out, bridge(out["samples"]))
+        return out
+
+
+def _tail_bridge(out, calls, tail, num_stages, options):
+    if tail is None:
+        return out
+    last = calls[-1]["index"] if calls else 0
+    return _carry(out, _make_bridge(tail[0], tail[1], tail[2], last, num_stages - 1, options)(out["samples"]))
+
+
+def _final_resize(out, stages, full_size, options):
+    """Bring the plan's output to the last stage's scale, which a trailing zero-step stage would otherwise skip."""
+    if not stages:
+        return out
+    scale = stages[-1].get("scale", 1.0)
+    if _spatial_size(out["samples"]) == _target_size(full_size, scale):
+        return out
+    with _span("resize", "resize", src_shape=list(out["samples"].shape)):
+        resize = _latent_resizer(full_size, scale, options.get("upscale_method", "bicubic"))
+        return _carry(out, resize(out["samples"]))
+
+
+def _call_meta(stop, planned):
+    return {"steps": (stop.steps_run if stop else 0) or planned,
+            "completed": stop.completed() if stop and stop.stopped_at is not None else None}
+
+
+def _run_stage_plan(stages, latent, seed, options, report=None):
+    """
+    Compile and run `stages` on `latent`. `options` carries the node-level
+    handoff, bridge, pipeline, residency, cache and precision inputs. Stage i samples
+    with `seed + i` (i being its position in the uncompiled plan).
+
+    Every call's output (after its bridge) is stored in the stage cache under
+    a key chained from the previous call's key, so when only a late stage
+    changes, the unchanged prefix is served from the cache.
+
+    With `stage_checkpoint` on, every call's output is also written to a
+    job directory and a re-run of the same job resumes from it, including a
+    call whose sampling finished but whose outbound bridge failed.
+
+    With adaptive switching a call may stop early; a continuous next call
+    then starts where it stopped. The steps actually run (cached calls
+    included) are written to `report["steps_used"]` when `report` is given.
+    """
+    handoff_mode = options.get("handoff_mode", "restart")
+    calls, tail = _compile_plan(stages, handoff_mode, options.get("upscale_renoise", True))
+    _plan_adaptive(calls, options, handoff_mode == "continuous")
+    out = latent if isinstance(latent, dict) else {"samples": latent}
+    steps_used = 0
+    full_size = _spatial_size(out["samples"])
+
+    use_cache, use_disk = _cache_settings(options)
+    job = _job_checkpoints(options, out, seed, stages, handoff_mode)
+    key = _stage_key("input", out) if use_cache or job is not None else None
+
+    with _stage_residency([c["model"] for c in calls], options) as residency:
+        for i, call in enumerate(calls):
+            sampler_kwargs = _call_sampler_kwargs(call, seed, options)
+            key = _call_key(key, calls, i, sampler_kwargs, options)
+            planned = _window_steps(call["window"])
+            cached, meta = _stage_cache.get_entry(key, use_disk) if use_cache else (None, None)
+            if cached is not None:
+                _instant("cache_hit", "cache", stage=call["index"] + 1)
+            elif job is not None:
+                cached, meta = job.load(i, "done", key)
+                if cached is not None:
+                    _instant("checkpoint_resume", "cache", stage=call["index"] + 1)
+                    logging.info(f"Switch samplers: stage {call['index'] + 1} resumed from {job.directory}.")
+            if cached is not None:
+                out = cached
+                if job is not None:
+                    job.save(i, "done", key, out, meta, sampler_kwargs, call["model"])
+            else:
+                stop = AdaptiveStop(call["stop"]) if call.get("stop") else None
+                resize = _latent_resizer(full_size, call["scale"], options.get("upscale_method", "bicubic")) \
+                    if call["resize"] else None
+                sampled, meta = job.load(i, "sampled", key) if job is not None else (None, None)
+                on_sampled = None
+                if sampled is not None:
+                    logging.info(f"Switch samplers: stage {call['index'] + 1} sampling resumed from "
+                                 f"{job.directory}, re-running its bridge.")
+                else:
+                    residency.enter(i)
+                    if job is not None:
+                        def on_sampled(sampled_out):
+                            job.save(i, "sampled", key, sampled_out, _call_meta(stop, planned), sampler_kwargs,
+                                     call["model"])
+                out = _run_call(call, out, sampler_kwargs, *_call_bridges(calls, i, options), options, stop, resize,
+                                sampled, on_sampled)
+                meta = meta or _call_meta(stop, planned)
+                if use_cache:
+                    _stage_cache.put(key, out, use_disk, meta)
+                if job is not None:
+                    job.save(i, "done", key, out, meta, sampler_kwargs, call["model"])
+
+            if _spatial_size(out["samples"]) != _target_size(full_size, call["scale"]):
+                # a bridge into a VAE with another spatial factor moved the full-size reference
+                full_size = tuple(round(d / call["scale"]) for d in _spatial_size(out["samples"]))
+
+            meta = meta or {}
+            steps_used += meta.get("steps", planned)
+            if meta.get("completed") is not None:
+                logging.info(f"Switch samplers: stage {call['index'] + 1} stopped early after "
+                             f"{meta['steps']} of {planned} steps.")
+                _continue_after_stop(calls, i, meta["completed"], handoff_mode == "continuous")
+
+            if i + 1 < len(calls):
+                # off the device while the next stage's model loads; streamed back per micro-batch
+                out = _carry(out, _spill(out["samples"], options.get("latent_spill", "off")))
+
+    if report is not None:
+        report["steps_used"] = steps_used
+    sampled_size = _spatial_size(out["samples"])
+    out = _tail_bridge(out, calls, tail, len(stages), options)
+    if _spatial_size(out["samples"]) != sampled_size:
+        # the tail bridge changed the spatial factor; the full-size reference follows it
+        full_size = tuple(round(f * a / b) for f, a, b in zip(full_size, _spatial_size(out["samples"]), sampled_size))
+    out = _final_resize(out, stages, full_size, options)
+    if job is not None:
+        job.finish()
+    return _output_latent(out, options.get("precision", "fp32"))
+
+
+def _plan_options_schema():
+    return {**_schema_for_handoff(), **_schema_for_bridge(()), **_schema_for_pipeline(), **_schema_for_residency(),
+            **_schema_for_stage_cache(), **_schema_for_precision(), **_schema_for_progressive(),
+            **_schema_for_temporal(), **_schema_for_spill(), **_schema_for_checkpoint(),
+            **_schema_for_micro_batch()}
+
+
+def _switch_stage_handler(model, latent, kwargs):
+    plan = list(kwargs.get("stage_plan") or [])
+    adapter = kwargs.get("bridge_adapter")
+    plan.append(_stage(model, kwargs.get("positive"), kwargs.get("negative"), kwargs.get("steps", 10),
+                       kwargs.get("sampler_name", cs.KSampler.SAMPLERS[0]),
+                       kwargs.get("scheduler", cs.KSampler.SCHEDULERS[0]),
+                       kwargs.get("cfg", 7.5), kwargs.get("denoise", 1.0), vae=kwargs.get("vae"),
+                       bridge_adapter=None if adapter == "none" else adapter, scale=kwargs.get("scale", 1.0),
+                       cfg_truncate_sigma=kwargs.get("cfg_truncate_sigma", 0.0)))
+    return plan
+
+
+def _stage_plan_handler(model, latent, kwargs):
+    stages = kwargs.get("stage_plan") or []
+    if not stages:
+        raise RuntimeError("Empty stage plan. Connect at least one Switch Sampler Stage node.")
+    return _run_stage_plan(stages, latent, kwargs.get("seed", 0), kwargs)
+
+
+SwitchSamplerStage = _make_node_class(
+    "SwitchSamplerStage",
+    lambda: {
+        "model": ("MODEL",),
+        "positive": ("CONDITIONING",),
+        "negative": ("CONDITIONING",),
+        "steps": ("INT", {"default": 10, "min": 0, "max": 10000}),
+        "sampler_name": (tuple(cs.KSampler.SAMPLERS),),
+        "scheduler": (tuple(cs.KSampler.SCHEDULERS),),
+        "cfg": ("FLOAT", {"default": 7.5, "min": 0.0, "max": 100.0, "step": 0.1}),
+        "denoise": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0, "step": 0.01}),
+    },
+    _switch_stage_handler,
+    return_types=("STAGE_PLAN",),
+    optional_schema_callable=lambda: {
+        "stage_plan": ("STAGE_PLAN",),
+        "vae": ("VAE",),
+        "bridge_adapter": (["none"] + adapter_names(),),
+        **_scale_input("scale"),
+        **_truncate_input("cfg_truncate_sigma"),
+    },
+    requires_latent=False,
+)
+
+StagePlanKSampler = _make_node_class(
+    "StagePlanKSampler",
+    lambda: {
+        "stage_plan": ("STAGE_PLAN",),
+        "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff}),
+        "latent_image": ("LATENT",),
+    },
+    _stage_plan_handler,
+    optional_schema_callable=_plan_options_schema,
+    profiled=True, previewed=True,
+)
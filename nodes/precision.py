@@ -0,0 +1,52 @@
+import torch
+
+from .capabilities import _model_profile
+
+PRECISION_MODES = ("fp32", "auto", "match-model", "bf16", "fp16")
+
+_FIXED = {"fp32": torch.float32, "bf16": torch.bfloat16, "fp16": torch.float16}
+_REDUCED = (torch.float16, torch.bfloat16)
+
+
+def _schema_for_precision():
+    return {
+        "precision": (PRECISION_MODES, {"default": "fp32",
+                                        "tooltip": "fp32: everything in fp32. auto: keep latents between stages in "
+                                                   "the model's dtype, sample in fp32. match-model: also sample in "
+                                                   "the model's dtype. The node's output is fp32 unless bf16/fp16 "
+                                                   "is picked."}),
+    }
+
+
+def _precision_dtypes(model, precision="fp32"):
+    """
+    (storage, sampling) dtypes for a stage under `precision`. Storage is what
+    latents are kept in between stages and across bridges; sampling is what
+    the sampler integrates in, which stays fp32 unless "match-model" asks
+    for the model's own dtype.
+    """
+    if precision in _FIXED:
+        return _FIXED[precision], torch.float32
+    dtype = _model_profile(model)["dtype"]
+    storage = dtype if dtype in _REDUCED else torch.float32
+    if precision == "match-model":
+        return storage, storage
+    return storage, torch.float32
+
+
+def _bridge_dtype(samples, precision="fp32"):
+    """Dtype the bridge resizes and returns in: the incoming latent's own reduced dtype, or the fixed one."""
+    if precision in _FIXED:
+        return _FIXED[precision]
+    if torch.is_tensor(samples) and samples.dtype in _REDUCED:
+        return samples.dtype
+    return torch.float32
+
+
+def _output_latent(latent, precision="fp32"):
+    """The node's final latent: fp32 unless `precision` fixes a reduced storage dtype."""
+    samples = latent["samples"]
+    dtype = _FIXED.get(precision, torch.float32)
+    if not torch.is_tensor(samples) or samples.dtype == dtype or not samples.is_floating_point():
+        return latent
+    return {**latent, "samples": samples.to(dtype)}
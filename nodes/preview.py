@@ -0,0 +1,103 @@
+import logging
+
+import comfy.utils
+import latent_preview
+
+PREVIEW_MODES = ("default", "off", "every_n", "final", "latent2rgb")
+
+
+def _schema_for_preview():
+    return {
+        "preview": (PREVIEW_MODES, {"default": "default",
+                                    "tooltip": "default: ComfyUI's preview on every step. off: progress bar only. "
+                                               "every_n: preview every preview_interval steps. final: last step "
+                                               "of each stage only. latent2rgb: cheap latent-to-RGB preview "
+                                               "regardless of the preview method setting."}),
+        "preview_interval": ("INT", {"default": 4, "min": 1, "max": 10000}),
+    }
+
+
+def _latent2rgb_previewer(model):
+    fmt = model.model.latent_format
+    factors = getattr(fmt, "latent_rgb_factors", None)
+    if factors is None:
+        return None
+    try:
+        return latent_preview.Latent2RGBPreviewer(factors, getattr(fmt, "latent_rgb_factors_bias", None))
+    except TypeError:
+        # older comfy without the bias argument
+        return latent_preview.Latent2RGBPreviewer(factors)
+
+
+def _default_previewer(model):
+    return latent_preview.get_previewer(model.load_device, model.model.latent_format)
+
+
+class _PreviewPolicy:
+    """
+    Preview settings of the node currently sampling, shared by every stage
+    it runs. Previewers are built once per model for the node's run rather
+    than per stage.
+    """
+
+    def __init__(self, mode, interval):
+        self.mode = mode
+        self.interval = max(1, int(interval))
+        self._previewers = {}
+
+    def previewer(self, model):
+        if self.mode == "off":
+            return None
+        kind = "latent2rgb" if self.mode == "latent2rgb" else "default"
+        key = (id(model), kind)
+        if key not in self._previewers:
+            build = _latent2rgb_previewer if kind == "latent2rgb" else _default_previewer
+            try:
+                self._previewers[key] = build(model)
+            except Exception as e:
+                logging.debug(f"No latent previewer for {type(model).__name__}: {e}")
+                self._previewers[key] = None
+        return self._previewers[key]
+
+    def due(self, step, total_steps):
+        final = step + 1 >= total_steps
+        if self.mode == "final":
+            return final
+        if self.mode == "every_n":
+            return final or (step + 1) % self.interval == 0
+        return True
+
+    def __enter__(self):
+        global _active
+        self._outer, _active = _active, self
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        _active = self._outer
+        self._previewers.clear()
+        return False
+
+
+_active = None
+
+
+def _previewing(kwargs):
+    return _PreviewPolicy(kwargs.get("preview", "default"), kwargs.get("preview_interval", 4))
+
+
+def _preview_callback(model, steps):
+    """Sampler step callback under the active preview policy; ComfyUI's own one for "default"."""
+    policy = _active
+    if policy is None or policy.mode == "default":
+        return latent_preview.prepare_callback(model, steps)
+
+    previewer = policy.previewer(model)
+    pbar = comfy.utils.ProgressBar(steps)
+
+    def callback(step, x0, x, total_steps):
+        image = None
+        if previewer is not None and policy.due(step, total_steps):
+            image = previewer.decode_latent_to_preview_image("JPEG", x0)
+        pbar.update_absolute(step + 1, total_steps, image)
+    return callback
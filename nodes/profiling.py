@@ -0,0 +1,277 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+import torch
+import comfy.model_management as mm
+
+PROFILE_MODES = ("off", "summary", "trace")
+
+
+def _schema_for_profiling():
+    return {
+        "profile": (PROFILE_MODES, {"default": "off",
+                                    "tooltip": "summary: per-stage timings and memory on the profile output. "
+                                               "trace: also write a Chrome trace (chrome://tracing, Perfetto)."}),
+        "profile_trace_path": ("STRING", {"default": "",
+                                          "tooltip": "Trace file; empty writes to output/switch_samplers_traces."}),
+    }
+
+
+# how often open spans sample the allocated device memory
+_POLL_S = 0.005
+
+
+def _rss_bytes():
+    """Current resident set size of the process, or None where /proc isn't available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "cat", "args", "start", "end", "tid", "peak", "high_water")
+
+    def __init__(self, profiler, name, cat, args):
+        self.profiler = profiler
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = self.end = 0.0
+        self.tid = 0
+        self.peak = 0
+        self.high_water = 0
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self.tid = threading.get_ident()
+        self.profiler._push(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.end = time.perf_counter()
+        self.profiler._pop(self)
+        return False
+
+
+class Profiler:
+    """
+    Records nested spans and instant events of one node execution.
+
+    On CUDA each span reports the peak allocated device memory while it was
+    open, without touching the global peak counter other code may rely on:
+    allocated memory is sampled at span boundaries and every `_POLL_S` by a
+    poller thread, and a rise of `max_memory_allocated` during the span is
+    exact. On CPU there is no peak to read; spans report the process RSS
+    when they end.
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.instants = []
+        self._local = threading.local()
+        self._cuda = torch.cuda.is_available()
+        self._open = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._poller = None
+        if self._cuda:
+            self._poller = threading.Thread(target=self._poll, name="switch-profiler", daemon=True)
+            self._poller.start()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _memory(self):
+        if self._cuda:
+            return torch.cuda.memory_allocated()
+        return _rss_bytes()
+
+    def _sample(self):
+        current = torch.cuda.memory_allocated()
+        with self._lock:
+            for span in self._open:
+                span.peak = max(span.peak, current)
+
+    def _poll(self):
+        while not self._stop.wait(_POLL_S):
+            self._sample()
+
+    def close(self):
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join()
+            self._poller = None
+
+    def _push(self, span):
+        if self._cuda:
+            span.high_water = torch.cuda.max_memory_allocated()
+            span.peak = self._memory()
+            with self._lock:
+                self._open.append(span)
+        self._stack().append(span)
+
+    def _pop(self, span):
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+        if not self._cuda:
+            span.peak = self._memory()
+        else:
+            high_water = torch.cuda.max_memory_allocated()
+            with self._lock:
+                self._open.remove(span)
+                # a new high-water mark can only have been reached while this span was open
+                span.peak = max(span.peak, self._memory(), high_water if high_water > span.high_water else 0)
+                for open_span in self._open:
+                    open_span.peak = max(open_span.peak, span.peak)
+        self.spans.append(span)
+
+    def span(self, name, cat, args):
+        return _Span(self, name, cat, args)
+
+    def instant(self, name, cat, args):
+        self.instants.append((name, cat, time.perf_counter(), threading.get_ident(), args))
+
+    def _memory_field(self):
+        return "peak_mem_bytes" if self._cuda else "rss_bytes"
+
+    def summary(self):
+        spans = []
+        totals = {}
+        for s in sorted(self.spans, key=lambda s: s.start):
+            dur = s.end - s.start
+            entry = {"name": s.name, "cat": s.cat, "start_s": round(s.start - self.origin, 6),
+                     "wall_s": round(dur, 6), self._memory_field(): s.peak, **s.args}
+            if s.args.get("steps") and dur > 0:
+                entry["steps_per_s"] = round(s.args["steps"] / dur, 3)
+            spans.append(entry)
+            totals[s.cat] = round(totals.get(s.cat, 0.0) + dur, 6)
+        events = [{"name": name, "cat": cat, "at_s": round(at - self.origin, 6), **args}
+                  for name, cat, at, _, args in self.instants]
+        return {"node": self.label, "memory": "cuda_allocated_peak" if self._cuda else "cpu_rss_at_end",
+                "spans": spans, "events": events, "totals_s": totals}
+
+    def chrome_trace(self):
+        pid = os.getpid()
+        events = []
+        for s in self.spans:
+            events.append({"name": s.name, "cat": s.cat, "ph": "X", "pid": pid, "tid": s.tid,
+                           "ts": (s.start - self.origin) * 1e6, "dur": (s.end - s.start) * 1e6,
+                           "args": {self._memory_field(): s.peak, **s.args}})
+        for name, cat, at, tid, args in self.instants:
+            events.append({"name": name, "cat": cat, "ph": "i", "s": "t", "pid": pid, "tid": tid,
+                           "ts": (at - self.origin) * 1e6, "args": args})
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"node": self.label}}
+
+
+# the profiler of the node currently executing; None keeps every hook a no-op
+_active = None
+
+
+def _span(name, cat="stage", **args):
+    """Context manager timing a block under the active profiler (a shared no-op when profiling is off)."""
+    profiler = _active
+    if profiler is None:
+        return _NULL_SPAN
+    return profiler.span(name, cat, args)
+
+
+def _instant(name, cat="event", **args):
+    profiler = _active
+    if profiler is not None:
+        profiler.instant(name, cat, args)
+
+
+def _traced_load(load_models_gpu):
+    """`mm.load_models_gpu` recording a "model_load" span per call, including the loads inside comfy's sampler."""
+    @functools.wraps(load_models_gpu)
+    def traced(models, *args, **kwargs):
+        with _span("model_load", "model_load", models=[type(m).__name__ for m in models]):
+            return load_models_gpu(models, *args, **kwargs)
+    traced._switch_traced = True
+    return traced
+
+
+def _default_trace_path(label):
+    try:
+        import folder_paths
+        root = folder_paths.get_output_directory()
+    except Exception:
+        root = os.getcwd()
+    return os.path.join(root, "switch_samplers_traces", f"{label}_{time.strftime('%Y%m%d-%H%M%S')}.json")
+
+
+class _Profiling:
+    def __init__(self, label, mode, trace_path):
+        self.label = label
+        self.mode = mode
+        self.trace_path = trace_path
+        self.profiler = None
+        self.report = ""
+        self._load = None
+
+    def __enter__(self):
+        global _active
+        if self.mode != "off":
+            self.profiler = _active = Profiler(self.label)
+            load = getattr(mm, "load_models_gpu", None)
+            if load is not None and not getattr(load, "_switch_traced", False):
+                self._load = load
+                mm.load_models_gpu = _traced_load(load)
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        if self.profiler is None:
+            return False
+        _active = None
+        if self._load is not None:
+            mm.load_models_gpu = self._load
+            self._load = None
+        self.profiler.close()
+        summary = self.profiler.summary()
+        if self.mode == "trace":
+            path = self.trace_path or _default_trace_path(self.label)
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                with open(path, "w") as f:
+                    json.dump(self.profiler.chrome_trace(), f)
+                summary["trace_file"] = path
+            except OSError as e:
+                logging.warning(f"Could not write profile trace {path}: {e}")
+        self.report = json.dumps(summary, indent=2)
+        return False
+
+
+def _profiling(label, kwargs):
+    return _Profiling(label, kwargs.get("profile", "off"), kwargs.get("profile_trace_path", ""))
@@ -0,0 +1,53 @@
+import torch
+import comfy.utils
+
+UPSCALE_METHODS = ("nearest-exact", "bilinear", "area", "bicubic", "bislerp")
+
+
+def _schema_for_progressive():
+    return {
+        "upscale_method": (UPSCALE_METHODS, {"default": "bicubic",
+                                             "tooltip": "Latent-space interpolation between stages of different scale."}),
+        "upscale_renoise": ("BOOLEAN", {"default": True,
+                                        "tooltip": "continuous handoff: finish the low-res stage clean and re-noise "
+                                                   "the upscaled latent to the next stage's starting sigma."}),
+    }
+
+
+def _scale_input(name, default=1.0):
+    return {name: ("FLOAT", {"default": default, "min": 0.125, "max": 1.0, "step": 0.025,
+                             "tooltip": "Latent resolution of this stage relative to the input latent."})}
+
+
+def _spatial_size(samples):
+    return tuple(samples.shape[-2:])
+
+
+def _target_size(full_size, scale):
+    return tuple(max(1, int(round(d * scale))) for d in full_size)
+
+
+def _resize_latent(samples, size, method="bicubic"):
+    """
+    Resize the last two dims of a 4D/5D latent to `size` (h, w) in latent
+    space with comfy's `common_upscale`. Video frames are folded into the
+    batch first, so every method (bislerp included) sees 4D (B*T, C, H, W).
+    """
+    if _spatial_size(samples) == tuple(size) or samples.shape[0] == 0:
+        return samples
+    h, w = size
+    if samples.ndim == 5:
+        b, c, t = samples.shape[:3]
+        frames = samples.transpose(1, 2).reshape(b * t, c, *samples.shape[-2:])
+        out = comfy.utils.common_upscale(frames, w, h, method, "disabled")
+        return out.reshape(b, t, c, h, w).transpose(1, 2)
+    return comfy.utils.common_upscale(samples, w, h, method, "disabled")
+
+
+def _latent_resizer(full_size, scale, method):
+    """Callable resizing samples to `scale` of `full_size`, as handed to `_run_call`."""
+    size = _target_size(full_size, scale)
+
+    def resize(samples):
+        return _resize_latent(samples, size, method) if torch.is_tensor(samples) else samples
+    return resize
@@ -0,0 +1,229 @@
+import logging
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+import comfy.model_management as mm
+
+
+RESIDENCY_MODES = ("off", "auto", "pinned_prefetch")
+
+
+def _schema_for_residency():
+    return {
+        "model_residency": (RESIDENCY_MODES, {"default": "off",
+                                              "tooltip": "off: ComfyUI loads each stage's model when it samples. "
+                                                         "auto: load every stage model up front and keep it resident "
+                                                         "when they all fit. pinned_prefetch: also pin the next stage's "
+                                                         "host weights and start copying them to the device while the "
+                                                         "current stage samples."}),
+    }
+
+
+def _model_size(model):
+    try:
+        return int(model.model_size())
+    except Exception:
+        pass
+    inner = getattr(model, "model", None)
+    if isinstance(inner, torch.nn.Module):
+        return sum(p.numel() * p.element_size() for p in inner.parameters())
+    return 0
+
+
+def _loaded_models():
+    fn = getattr(mm, "loaded_models", None)
+    if fn is None:
+        return []
+    try:
+        return fn()
+    except Exception:
+        return []
+
+
+def _is_loaded(model):
+    return any(m is model for m in _loaded_models())
+
+
+def _load(model):
+    if hasattr(mm, "load_models_gpu"):
+        # recorded as a model_load span by the profiler's load_models_gpu hook
+        mm.load_models_gpu([model])
+
+
+def _prefetch_host_weights(model, buffers, device, budget):
+    """
+    Copy the weights `model` still holds in host memory into page-locked
+    `buffers` (parameter name -> tensor, reused across runs), then queue
+    copies of them to `device` on a side stream until `budget` bytes are
+    used. Meant for a worker thread: the parameters are only read, and the
+    calling thread installs the result with `_install_prefetched`. Returns
+    (staged, done event), or None without CUDA.
+    """
+    inner = getattr(model, "model", None)
+    if not isinstance(inner, torch.nn.Module) or not torch.cuda.is_available():
+        return None
+    staged = {}
+    stream = torch.cuda.Stream(device)
+    with torch.cuda.stream(stream):
+        for name, p in inner.named_parameters():
+            if p.device.type != "cpu":
+                continue
+            pinned = p.data if p.is_pinned() else buffers.get(name)
+            if pinned is None or pinned.shape != p.shape or pinned.dtype != p.dtype:
+                pinned = buffers[name] = torch.empty_like(p.data, pin_memory=True)
+            if pinned.data_ptr() != p.data_ptr():
+                pinned.copy_(p.data)
+            size = p.numel() * p.element_size()
+            on_device = None
+            if size <= budget:
+                on_device = pinned.to(device, non_blocking=True)
+                budget -= size
+            staged[name] = (p, p.data_ptr(), pinned, on_device)
+    done = torch.cuda.Event()
+    done.record(stream)
+    return staged, done
+
+
+def _install_prefetched(staged, done):
+    """
+    On the thread that loads models: point every parameter that is still the
+    host tensor the prefetch read at its device copy, or at its pinned buffer
+    so the loader copies it by DMA.
+    """
+    torch.cuda.current_stream().wait_event(done)
+    for p, ptr, pinned, on_device in staged.values():
+        if p.device.type == "cpu" and p.data_ptr() == ptr:
+            p.data = on_device if on_device is not None else pinned
+
+
+class ResidencyManager:
+    """
+    Sees the whole stage plan up front. When every stage model fits on the
+    device they are loaded once and stay resident across stages and across
+    consecutive prompts using the same plan; otherwise the next stage's model
+    can be pinned and partly copied to the device in the background while
+    the current stage samples. Pinned buffers are kept per model across
+    prompts, so repeated runs skip the page-locked allocations. Cold-load
+    times are remembered per model to report the load time saved.
+    """
+
+    def __init__(self):
+        self._cold_load_s = weakref.WeakKeyDictionary()
+        self._pinned = weakref.WeakKeyDictionary()
+        self._last_plan = ()
+        self.saved_s = 0.0
+
+    def _pinned_buffers(self, model):
+        """Pinned host buffers of `model`'s weights, keyed by its inner module so clones share them."""
+        inner = getattr(model, "model", model)
+        try:
+            return self._pinned.setdefault(inner, {})
+        except TypeError:
+            return {}
+
+    def begin(self, models, mode="off"):
+        return _StageResidency(self, list(models), mode)
+
+    def _timed_load(self, model):
+        """Load `model`, remembering how long a cold load took. Returns True if it was cold."""
+        if _is_loaded(model):
+            return False
+        start = time.perf_counter()
+        _load(model)
+        self._cold_load_s[model] = time.perf_counter() - start
+        return True
+
+
+class _StageResidency:
+    def __init__(self, manager, models, mode):
+        self.manager = manager
+        self.models = models
+        self.mode = mode
+        self.saved_s = 0.0
+        self.resident = False
+        self._prefetches = {}
+        self._pool = None
+        self._loaded_up_front = set()
+
+    def __enter__(self):
+        unique = list({id(m): m for m in self.models if m is not None}.values())
+        if self.mode == "off" or not unique:
+            return self
+
+        plan = tuple(id(m) for m in unique)
+        device = mm.get_torch_device()
+        needed = sum(_model_size(m) for m in unique if not _is_loaded(m))
+        try:
+            headroom = mm.minimum_inference_memory()
+        except Exception:
+            headroom = 1024 ** 3
+        if needed + headroom <= mm.get_free_memory(device):
+            for m in unique:
+                if self.manager._timed_load(m):
+                    self._loaded_up_front.add(id(m))
+            self.resident = True
+            if plan == self.manager._last_plan:
+                logging.info("Switch samplers: stage models kept resident from the previous prompt.")
+        self.manager._last_plan = plan
+        return self
+
+    def enter(self, stage):
+        """Call right before stage `stage` samples."""
+        if self.mode == "off" or stage >= len(self.models):
+            return
+        model = self.models[stage]
+        prefetch = self._prefetches.pop(id(model), None)
+        if prefetch is not None:
+            try:
+                staged = prefetch.result()
+            except Exception as e:
+                # only an optimization: the loader copies the weights as usual
+                logging.warning(f"Switch samplers: prefetching stage {stage + 1}'s weights failed: {e}")
+                staged = None
+            if staged is not None:
+                _install_prefetched(*staged)
+        previous = self.models[stage - 1] if stage > 0 else None
+        if model is not None and model is not previous and id(model) not in self._loaded_up_front \
+                and _is_loaded(model):
+            # a cold load would have happened right here
+            self.saved_s += self.manager._cold_load_s.get(model, 0.0)
+
+        upcoming = self.models[stage + 1] if stage + 1 < len(self.models) else None
+        if self.mode == "pinned_prefetch" and not self.resident and upcoming is not None \
+                and upcoming is not model and not _is_loaded(upcoming) and id(upcoming) not in self._prefetches:
+            self._prefetch(upcoming, model)
+
+    def _prefetch(self, upcoming, current):
+        """Pin and copy `upcoming`'s host weights on a worker thread, into the device memory `current` leaves free."""
+        device = mm.get_torch_device()
+        try:
+            headroom = mm.minimum_inference_memory()
+        except Exception:
+            headroom = 1024 ** 3
+        budget = mm.get_free_memory(device) - headroom
+        if current is not None and not _is_loaded(current):
+            budget -= _model_size(current)
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="switch-prefetch")
+        self._prefetches[id(upcoming)] = self._pool.submit(
+            _prefetch_host_weights, upcoming, self.manager._pinned_buffers(upcoming), device, budget)
+
+    def __exit__(self, *exc):
+        if self._pool is not None:
+            # device copies of stages that never ran are dropped; the pinned buffers stay with the manager
+            self._pool.shutdown(wait=True)
+        self._prefetches = {}
+        self.manager.saved_s += self.saved_s
+        if self.saved_s > 0:
+            logging.info(f"Switch samplers: ~{self.saved_s:.2f}s of model loading saved "
+                         f"({self.manager.saved_s:.2f}s this session).")
+        return False
+
+
+_residency = ResidencyManager()
+
+
+def _stage_residency(models, kwargs):
+    return _residency.begin(models, kwargs.get("model_residency", "off"))
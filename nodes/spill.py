@@ -0,0 +1,88 @@
+import os
+import tempfile
+import weakref
+
+import torch
+
+from .profiling import _span
+
+SPILL_MODES = ("off", "pinned", "disk")
+
+# ids of live spilled tensors; tensors can't go in a WeakSet (== is elementwise)
+_spilled = set()
+
+
+def _schema_for_spill():
+    return {
+        "latent_spill": (SPILL_MODES, {"default": "off",
+                                       "tooltip": "Keep latents between stages and decoded bridge pixels off the "
+                                                  "sampling device. pinned: page-locked host memory. disk: "
+                                                  "memory-mapped files on local disk. They go back to the device "
+                                                  "one micro-batch at a time."}),
+    }
+
+
+def _spill_dir():
+    env = os.environ.get("SWITCH_SAMPLERS_SPILL_DIR")
+    if env:
+        return env
+    try:
+        import folder_paths
+        return folder_paths.get_temp_directory()
+    except Exception:
+        return tempfile.gettempdir()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _to_pinned(samples):
+    host = samples.detach().to("cpu")
+    if torch.cuda.is_available() and not host.is_pinned():
+        host = host.pin_memory()
+    return host
+
+
+def _to_disk(samples):
+    directory = _spill_dir()
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix="switch_samplers_spill_", suffix=".bin", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        f.truncate(samples.numel() * samples.element_size())
+    mapped = torch.from_file(path, shared=True, size=samples.numel(), dtype=samples.dtype).view(samples.shape)
+    mapped.copy_(samples.detach())
+    try:
+        # the mapping outlives the name on POSIX, so the file is gone as soon as the tensor is
+        os.remove(path)
+    except OSError:
+        weakref.finalize(mapped, _remove, path)
+    return mapped
+
+
+def _spill(samples, mode="off"):
+    """
+    Move `samples` off the sampling device: into pinned host memory, or into
+    a memory-mapped file under `_spill_dir()`. Other values pass through.
+    """
+    if mode == "off" or not torch.is_tensor(samples) or samples.numel() == 0:
+        return samples
+    with _span("spill", "spill", mode=mode, bytes=samples.numel() * samples.element_size()):
+        out = _to_disk(samples) if mode == "disk" else _to_pinned(samples)
+    key = id(out)
+    _spilled.add(key)
+    weakref.finalize(out, _spilled.discard, key)
+    return out
+
+
+def _is_spilled(samples):
+    return torch.is_tensor(samples) and id(samples) in _spilled
+
+
+def _unspill(samples, device):
+    """Copy one batch chunk of a spilled latent to `device`, asynchronously from pinned memory."""
+    with _span("unspill", "spill", bytes=samples.numel() * samples.element_size()):
+        return samples.to(device, non_blocking=samples.is_pinned())
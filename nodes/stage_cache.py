@@ -0,0 +1,440 @@
+import enum
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+
+import torch
+
+STAGE_CACHE_MODES = ("off", "memory", "memory+disk")
+
+# parameters hashed per module when fingerprinting model / VAE weights
+_SAMPLED_PARAMS = 8
+_SAMPLED_VALUES = 256
+
+# option objects nested deeper than this make a stage uncacheable (also stops reference cycles)
+_OPTION_DEPTH = 8
+
+
+def _schema_for_stage_cache():
+    return {
+        "stage_cache": (STAGE_CACHE_MODES, {"default": "off",
+                                             "tooltip": "Reuse stage outputs when only later stages change."}),
+        "stage_cache_mb": ("INT", {"default": 1024, "min": 0, "max": 1 << 20, "step": 64}),
+    }
+
+
+class _Uncacheable(Exception):
+    pass
+
+
+def _tensor_digest(h, t):
+    t = t.detach()
+    h.update(f"T{tuple(t.shape)}{t.dtype}".encode())
+    if t.numel():
+        h.update(t.cpu().contiguous().view(-1).view(torch.uint8).numpy().tobytes())
+
+
+_module_fingerprints = weakref.WeakKeyDictionary()
+
+
+def _inner_module(obj):
+    for attr in ("model", "first_stage_model"):
+        inner = getattr(obj, attr, None)
+        if isinstance(inner, torch.nn.Module):
+            return inner
+    return obj if isinstance(obj, torch.nn.Module) else None
+
+
+def _patch_revision(obj):
+    """
+    Cheap identity of the current patch set: the patcher's uuid plus which
+    patch entries and object patches are attached.
+    """
+    patches = getattr(obj, "patches", None)
+    if not isinstance(patches, dict):
+        return None
+    object_patches = getattr(obj, "object_patches", None) or {}
+    return (getattr(obj, "patches_uuid", None),
+            tuple((key, tuple(id(p) for p in patches[key])) for key in sorted(patches, key=str)),
+            tuple((key, id(object_patches[key])) for key in sorted(object_patches, key=str)))
+
+
+def _feed_patch(h, value, depth=0):
+    """
+    Patch entries as ModelPatcher keeps them: (strength, data, strength_model,
+    offset, function) tuples whose data is tensors, nested tuples of them or
+    weight adapter objects. Tensor contents are hashed, not just their shape.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        h.update(f"{type(value).__name__}:{value!r};".encode())
+    elif torch.is_tensor(value):
+        _tensor_digest(h, value)
+    elif isinstance(value, (list, tuple)):
+        h.update(b"[")
+        for item in value:
+            _feed_patch(h, item, depth)
+        h.update(b"]")
+    elif isinstance(value, dict):
+        h.update(b"{")
+        for key in sorted(value, key=str):
+            h.update(f"{key}=".encode())
+            _feed_patch(h, value[key], depth)
+        h.update(b"}")
+    elif callable(value) and hasattr(value, "__qualname__"):
+        _feed_option(h, value)
+    elif depth < 3 and hasattr(value, "weights"):
+        # comfy.weight_adapter objects (LoRA, LoHa, ...) keep their tensors in `weights`
+        h.update(type(value).__name__.encode())
+        _feed_patch(h, value.weights, depth + 1)
+    else:
+        raise _Uncacheable(f"patch of type {type(value).__name__}")
+
+
+def _feed_patches(h, obj):
+    patches = getattr(obj, "patches", None)
+    if not isinstance(patches, dict):
+        return
+    for key in sorted(patches, key=str):
+        h.update(f"{key}:".encode())
+        for p in patches[key]:
+            _feed_patch(h, p)
+
+
+def _base_weight(obj, name, param):
+    """`param` as loaded from disk: ComfyUI patches weights in place and keeps the originals in `backup`."""
+    backup = getattr(obj, "backup", None)
+    original = backup.get(name) if isinstance(backup, dict) else None
+    if original is None:
+        return param
+    return getattr(original, "weight", original)
+
+
+def _feed_weights(h, module, weight=None):
+    """A sample of `module`'s parameters: `_SAMPLED_VALUES` values of `_SAMPLED_PARAMS` of them."""
+    params = list(module.named_parameters())
+    h.update(str(len(params)).encode())
+    step = max(1, len(params) // _SAMPLED_PARAMS)
+    for name, p in params[::step][:_SAMPLED_PARAMS]:
+        h.update(name.encode())
+        _tensor_digest(h, (weight(name, p) if weight else p).detach().reshape(-1)[:_SAMPLED_VALUES])
+
+
+def _feed_attributes(h, obj, path, skip_private=False):
+    h.update(f"{type(obj).__module__}.{type(obj).__qualname__}(".encode())
+    attrs = vars(obj)
+    for key in sorted(attrs):
+        if key.startswith("__") or (skip_private and key.startswith("_")):
+            continue
+        h.update(f"{key}=".encode())
+        _feed_option(h, attrs[key], path)
+    h.update(b")")
+
+
+def _feed_option(h, value, path=()):
+    """
+    Model options and object patches (model_sampling with its shift, attention
+    patches, wrappers) by content: containers item by item, modules by their
+    buffers, a sample of their weights and their plain attributes, functions
+    by name plus what they close over or are bound to, other objects by their
+    attributes. Anything else, or nesting deeper than `_OPTION_DEPTH`, makes
+    the stage uncacheable rather than letting distinct options share a key.
+    `path` holds the ids of the enclosing objects; a reference back to one of
+    them is hashed as such.
+    """
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes, torch.dtype, torch.device,
+                                           enum.Enum)):
+        h.update(f"{type(value).__name__}:{value!r};".encode())
+        return
+    if torch.is_tensor(value):
+        _tensor_digest(h, value)
+        return
+    if isinstance(value, type):
+        h.update(f"class {value.__module__}.{value.__qualname__};".encode())
+        return
+    if inspect.ismodule(value):
+        h.update(f"module {value.__name__};".encode())
+        return
+    if id(value) in path:
+        h.update(f"ref:{path.index(id(value))};".encode())
+        return
+    if len(path) >= _OPTION_DEPTH:
+        raise _Uncacheable(f"option nested deeper than {_OPTION_DEPTH} levels")
+    inner = path + (id(value),)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        h.update(f"{type(value).__name__}[".encode())
+        for item in (sorted(value, key=repr) if isinstance(value, (set, frozenset)) else value):
+            _feed_option(h, item, inner)
+        h.update(b"]")
+    elif isinstance(value, dict):
+        h.update(b"{")
+        for key in sorted(value, key=str):
+            h.update(f"{key}=".encode())
+            _feed_option(h, value[key], inner)
+        h.update(b"}")
+    elif isinstance(value, torch.nn.Module):
+        for name, buf in value.named_buffers():
+            h.update(name.encode())
+            _tensor_digest(h, buf)
+        _feed_weights(h, value)
+        # parameters, buffers and submodules live in underscored attributes and are covered above
+        _feed_attributes(h, value, inner, skip_private=True)
+    elif inspect.ismethod(value):
+        h.update(f"method {value.__func__.__module__}.{value.__func__.__qualname__};".encode())
+        _feed_option(h, value.__self__, inner)
+    elif inspect.isfunction(value):
+        h.update(f"function {value.__module__}.{value.__qualname__};".encode())
+        try:
+            closure = [cell.cell_contents for cell in value.__closure__ or ()]
+        except ValueError:
+            raise _Uncacheable(f"function {value.__qualname__} with an unset closure cell")
+        _feed_option(h, [closure, value.__defaults__, value.__kwdefaults__], inner)
+    elif isinstance(value, functools.partial):
+        h.update(b"partial;")
+        _feed_option(h, [value.func, value.args, value.keywords], inner)
+    elif inspect.isbuiltin(value):
+        h.update(f"builtin {value.__module__}.{value.__qualname__};".encode())
+        owner = getattr(value, "__self__", None)
+        if owner is not None and not inspect.ismodule(owner):
+            _feed_option(h, owner, inner)
+    elif hasattr(value, "__dict__"):
+        _feed_attributes(h, value, inner)
+    else:
+        raise _Uncacheable(f"option of type {type(value).__name__}")
+
+
+def _module_fingerprint(obj):
+    """
+    Content fingerprint of a model / VAE: a sample of its unpatched weights
+    plus the full contents of its patches, object patches and model options.
+    Cached per object and patch revision, so it stays stable across restarts
+    (for the disk tier) yet is cheap per prompt.
+    """
+    revision = _patch_revision(obj)
+    try:
+        cached = _module_fingerprints.get(obj)
+    except TypeError:
+        raise _Uncacheable(type(obj).__name__)
+    if cached is not None and cached[0] == revision:
+        return cached[1]
+
+    module = _inner_module(obj)
+    if module is None:
+        raise _Uncacheable(type(obj).__name__)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(type(obj).__name__.encode())
+    _feed_patches(h, obj)
+    h.update(b"object_patches:")
+    _feed_option(h, getattr(obj, "object_patches", None) or {})
+    h.update(b"model_options:")
+    _feed_option(h, getattr(obj, "model_options", None))
+    _feed_weights(h, module, functools.partial(_base_weight, obj))
+    digest = h.hexdigest()
+    try:
+        _module_fingerprints[obj] = (revision, digest)
+    except TypeError:
+        pass
+    return digest
+
+
+def _feed(h, value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        h.update(f"{type(value).__name__}:{value!r};".encode())
+    elif torch.is_tensor(value):
+        _tensor_digest(h, value)
+    elif isinstance(value, dict):
+        h.update(b"{")
+        for key in sorted(value, key=str):
+            h.update(f"{key}=".encode())
+            _feed(h, value[key])
+        h.update(b"}")
+    elif isinstance(value, (list, tuple)):
+        h.update(b"[")
+        for item in value:
+            _feed(h, item)
+        h.update(b"]")
+    else:
+        h.update(_module_fingerprint(value).encode())
+
+
+def _stage_key(*parts):
+    """Hash of models, conditioning, latents and parameters; None when something can't be hashed."""
+    h = hashlib.blake2b(digest_size=20)
+    try:
+        for part in parts:
+            _feed(h, part)
+    except _Uncacheable as e:
+        logging.debug(f"Stage cache skipped, unhashable input: {e}")
+        return None
+    return h.hexdigest()
+
+
+def _latent_nbytes(latent):
+    return sum(v.numel() * v.element_size() for v in latent.values() if torch.is_tensor(v))
+
+
+def _detach_latent(latent):
+    return {k: (v.detach().cpu().clone() if torch.is_tensor(v) else v) for k, v in latent.items()}
+
+
+def _default_cache_dir():
+    env = os.environ.get("SWITCH_SAMPLERS_CACHE_DIR")
+    if env:
+        return env
+    try:
+        import folder_paths
+        return os.path.join(folder_paths.get_user_directory(), "switch_samplers_cache")
+    except Exception:
+        return os.path.join(tempfile.gettempdir(), "switch_samplers_cache")
+
+
+def _save_latent(path, latent, meta=None):
+    """Write a latent dict and its JSON-able `meta` to a safetensors file atomically; False on failure."""
+    from safetensors.torch import save_file
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        sd = {k: v.contiguous() for k, v in latent.items() if torch.is_tensor(v)}
+        if "batch_index" in latent:
+            sd["batch_index"] = torch.tensor(list(latent["batch_index"]), dtype=torch.int64)
+        save_file(sd, path + ".tmp", metadata={"meta": json.dumps(meta)})
+        os.replace(path + ".tmp", path)
+    except Exception as e:
+        logging.warning(f"Switch samplers could not write {path}: {e}")
+        return False
+    return True
+
+
+def _load_latent(path):
+    """(latent, meta) read back from `_save_latent`, or (None, None) when unreadable."""
+    try:
+        from safetensors import safe_open
+        from safetensors.torch import load_file
+        sd = load_file(path, device="cpu")
+        with safe_open(path, framework="pt") as f:
+            meta = json.loads((f.metadata() or {}).get("meta", "null"))
+    except Exception as e:
+        logging.warning(f"Switch samplers could not read {path}: {e}")
+        return None, None
+    latent = {"samples": sd["samples"]}
+    if "noise_mask" in sd:
+        latent["noise_mask"] = sd["noise_mask"]
+    if "batch_index" in sd:
+        latent["batch_index"] = sd["batch_index"].tolist()
+    return latent, meta
+
+
+class StageCache:
+    """
+    Stage outputs keyed by `_stage_key`: an in-memory LRU bounded by bytes,
+    backed by an optional safetensors directory on disk with the same budget.
+    Entries may carry a small JSON-able `meta` dict (e.g. steps actually run).
+    """
+
+    def __init__(self, max_bytes=1 << 30, cache_dir=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, use_disk=False):
+        return self.get_entry(key, use_disk)[0]
+
+    def get_entry(self, key, use_disk=False):
+        """(latent, meta) for `key`, or (None, None) on a miss."""
+        if key is None:
+            return None, None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _detach_latent(entry[0]), entry[2]
+        latent, meta = self._disk_get(key) if use_disk else (None, None)
+        if latent is not None:
+            self.hits += 1
+            self._memory_put(key, latent, meta)
+            return _detach_latent(latent), meta
+        self.misses += 1
+        return None, None
+
+    def put(self, key, latent, use_disk=False, meta=None):
+        if key is None:
+            return
+        latent = _detach_latent(latent)
+        self._memory_put(key, latent, meta)
+        if use_disk:
+            self._disk_put(key, latent, meta)
+
+    def _memory_put(self, key, latent, meta=None):
+        size = _latent_nbytes(latent)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (latent, size, meta)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, old_size, _) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir or _default_cache_dir(), f"{key}.safetensors")
+
+    def _disk_get(self, key):
+        path = self._disk_path(key)
+        if not os.path.isfile(path):
+            return None, None
+        latent, meta = _load_latent(path)
+        if latent is not None:
+            os.utime(path)
+        return latent, meta
+
+    def _disk_put(self, key, latent, meta=None):
+        path = self._disk_path(key)
+        if _save_latent(path, latent, meta):
+            self._evict_disk(os.path.dirname(path))
+
+    def _evict_disk(self, directory):
+        files = []
+        for name in os.listdir(directory):
+            if name.endswith(".safetensors"):
+                full = os.path.join(directory, name)
+                st = os.stat(full)
+                files.append((st.st_mtime, st.st_size, full))
+        total = sum(f[1] for f in files)
+        for _, size, full in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(full)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+_stage_cache = StageCache()
+
+
+def _cache_settings(options):
+    """(use_cache, use_disk) for a node's options, resizing the shared cache to its budget."""
+    mode = options.get("stage_cache", "off")
+    if mode == "off":
+        return False, False
+    _stage_cache.max_bytes = int(options.get("stage_cache_mb", 1024)) * 1024 * 1024
+    return _stage_cache.max_bytes > 0, mode == "memory+disk"
@@ -1,7 +1,17 @@
-from .helpers import _call_ksampler, _make_node_class
+from .adaptive import _schema_for_adaptive
+from .checkpoint import _schema_for_checkpoint
+from .guidance import _truncate_input
+from .helpers import _make_node_class, _schema_for_handoff
+from .microbatch import _schema_for_micro_batch
+from .plan import _run_stage_plan, _stage
+from .precision import _schema_for_precision
+from .residency import _schema_for_residency
+from .spill import _schema_for_spill
+from .stage_cache import _schema_for_stage_cache
+from .temporal import _schema_for_temporal
 import comfy.samplers as cs
 
-def _step_switch_handler(model, latent, kwargs):
+def _step_switch_stages(kwargs):
     switch_point = kwargs.get("switch_point", 10)
     total_steps  = kwargs.get("total_steps", 20)
 
@@ -17,24 +27,26 @@ def _step_switch_handler(model, latent, kwargs):
     denoise_before = kwargs.get("denoise_before", 1.0)
     denoise_after  = kwargs.get("denoise_after", 1.0)
 
-    seed = kwargs.get("seed", 0)
+    truncate_before = kwargs.get("cfg_truncate_sigma_before", 0.0)
+    truncate_after  = kwargs.get("cfg_truncate_sigma_after", 0.0)
 
     m1 = kwargs.get("model1")
     m2 = kwargs.get("model2", m1)  # default to m1 if not provided
 
-    # Stage 1
-    out = _call_ksampler(m1, latent, switch_point, sampler_before, scheduler_before,
-                         cfg_before, kwargs.get("positive"), kwargs.get("negative"),
-                         seed, denoise_before)
+    pos, neg = kwargs.get("positive"), kwargs.get("negative")
+    stages = [
+        _stage(m1, pos, neg, switch_point, sampler_before, scheduler_before, cfg_before, denoise_before,
+               cfg_truncate_sigma=truncate_before),
+        _stage(m2, pos, neg, max(total_steps - switch_point, 0), sampler_after, scheduler_after, cfg_after,
+               denoise_after, cfg_truncate_sigma=truncate_after),
+    ]
+    return stages
 
-    # Stage 2
-    steps_after = max(total_steps - switch_point, 0)
-    if steps_after > 0:
-        out = _call_ksampler(m2, out, steps_after, sampler_after, scheduler_after,
-                             cfg_after, kwargs.get("positive"), kwargs.get("negative"),
-                             seed + 1, denoise_after)
 
-    return out
+def _step_switch_handler(model, latent, kwargs):
+    report = {}
+    out = _run_stage_plan(_step_switch_stages(kwargs), latent, kwargs.get("seed", 0), kwargs, report)
+    return out, report["steps_used"]
 
 
 
@@ -56,4 +68,10 @@ StepSwitchKSampler = _make_node_class("StepSwitchKSampler", lambda: {
     "denoise_after":  ("FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0, "step": 0.01}),
     "latent_image": ("LATENT",),
 
-}, _step_switch_handler)
+}, _step_switch_handler, extra_outputs=(("INT", "steps_used"),),
+    optional_schema_callable=lambda: {
+    **_schema_for_handoff(), **_schema_for_residency(), **_schema_for_stage_cache(),
+    **_schema_for_precision(), **_schema_for_adaptive(), **_schema_for_temporal(), **_schema_for_spill(),
+    **_schema_for_checkpoint(), **_schema_for_micro_batch(),
+    **_truncate_input("cfg_truncate_sigma_before"), **_truncate_input("cfg_truncate_sigma_after")},
+    profiled=True, previewed=True)
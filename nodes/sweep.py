@@ -0,0 +1,233 @@
+import itertools
+import json
+import logging
+
+import torch
+import comfy.samplers as cs
+
+from .helpers import _make_node_class, _schema_for_handoff
+from .microbatch import _schema_for_micro_batch
+from .plan import (_call_key, _call_sampler_kwargs, _call_bridges, _compile_plan, _run_call, _tail_bridge,
+                   _window_steps)
+from .precision import _output_latent, _precision_dtypes, _schema_for_precision
+from .profiling import _instant
+from .residency import _schema_for_residency, _stage_residency
+from .stage_cache import _cache_settings, _schema_for_stage_cache, _stage_cache, _stage_key
+from .step_switch import _step_switch_stages
+
+# swept StepSwitchKSampler inputs: (name, cast, allowed values or None)
+_SWEEP_PARAMS = (
+    ("switch_point", int, None),
+    ("sampler_before", str, lambda: cs.KSampler.SAMPLERS),
+    ("scheduler_before", str, lambda: cs.KSampler.SCHEDULERS),
+    ("cfg_before", float, None),
+    ("sampler_after", str, lambda: cs.KSampler.SAMPLERS),
+    ("scheduler_after", str, lambda: cs.KSampler.SCHEDULERS),
+    ("cfg_after", float, None),
+)
+
+
+def _parse_values(text, name, cast, choices=None):
+    """Comma- or newline-separated values of one swept input, in order and without duplicates."""
+    values = []
+    for raw in str(text).replace("\n", ",").split(","):
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            value = cast(raw)
+        except ValueError:
+            raise ValueError(f"Sweep input '{name}': cannot read '{raw}' as {cast.__name__}.")
+        if choices is not None and value not in choices():
+            raise ValueError(f"Sweep input '{name}': unknown value '{value}'.")
+        if value not in values:
+            values.append(value)
+    if not values:
+        raise ValueError(f"Sweep input '{name}' is empty.")
+    return values
+
+
+def _sweep_configs(kwargs):
+    """Every combination of the swept values, as dicts of StepSwitchKSampler inputs."""
+    names = [name for name, _, _ in _SWEEP_PARAMS]
+    grids = [_parse_values(kwargs.get(name, ""), name, cast, choices) for name, cast, choices in _SWEEP_PARAMS]
+    return [dict(zip(names, combo)) for combo in itertools.product(*grids)]
+
+
+# samplers whose steps depend only on the current latent and sigma: a window
+# resumed from its own intermediate latent samples exactly like the whole window
+_RESUMABLE_SAMPLERS = ("euler", "heun", "dpm_2", "ddim")
+
+
+def _resumable_head(calls, options):
+    """Grouping key of a plan's first call if it may be split into resumed segments, else None."""
+    call = calls[0] if calls else None
+    if call is None or call["index"] != 0 or call["sampler_name"] not in _RESUMABLE_SAMPLERS:
+        return None
+    storage, sampling = _precision_dtypes(call["model"], options.get("precision", "fp32"))
+    if storage != sampling:
+        # segment outputs are stored rounded, the whole window never is
+        return None
+    window = call["window"]
+    return (id(call["model"]), id(call["positive"]), id(call["negative"]), id(call["bridge_from"]), call["resize"],
+            call["sampler_name"], call["scheduler"], call["cfg"], call["denoise"],
+            call.get("cfg_truncate_sigma", 0.0), window["steps"], window.get("add_noise", True))
+
+
+def _split_at_switch_points(plans, options):
+    """
+    Continuous handoff: cut every plan's first call at the switch points of
+    the other plans starting the same way, so [0, 4), [0, 6) and [0, 8) become
+    [0, 4) → [4, 6) → [6, 8) chains whose shared segments the prefix tree
+    samples once. Later segments continue from the previous one's latent
+    without new noise, which only equals the uncut window for
+    `_RESUMABLE_SAMPLERS` at a stored precision equal to the sampling one.
+    """
+    heads = [_resumable_head(calls, options) for calls, _ in plans]
+    cuts = {}
+    for (calls, _), head in zip(plans, heads):
+        if head is not None:
+            cuts.setdefault(head, set()).add(calls[0]["window"]["last_step"])
+
+    split = []
+    for (calls, tail), head in zip(plans, heads):
+        if head is None:
+            split.append((calls, tail))
+            continue
+        call, window = calls[0], calls[0]["window"]
+        bounds = [0] + sorted(c for c in cuts[head] if c < window["last_step"]) + [window["last_step"]]
+        segments = []
+        for k, (start, last) in enumerate(zip(bounds, bounds[1:])):
+            if last == window["last_step"]:
+                segment = dict(window, start_step=start)
+            else:
+                segment = dict(window, start_step=start, last_step=last, force_full_denoise=False)
+            if k > 0:
+                segment["add_noise"] = False
+            segments.append(dict(call, window=segment) if k == 0 else
+                            dict(call, window=segment, bridge_from=None, resize=False))
+        split.append((segments + calls[1:], tail))
+    return split
+
+
+def _call_signature(calls, i, sampler_kwargs):
+    """Identity of compiled call `i` together with everything that fed into it, for prefix sharing."""
+    call = calls[i]
+    nxt = calls[i + 1] if i + 1 < len(calls) else None
+    return (
+        id(call["model"]), id(sampler_kwargs["positive"]), id(sampler_kwargs["negative"]),
+        tuple(sorted((k, v) for k, v in sampler_kwargs.items() if k not in ("positive", "negative"))),
+        (id(call["bridge_from"]), id(call["vae"]), call["bridge_adapter"]) if i == 0 else None,
+        (id(nxt["bridge_from"]), id(nxt["vae"]), nxt["bridge_adapter"]) if nxt is not None else None,
+    )
+
+
+def _prefix_tree(plans, seed, options):
+    """
+    Merge the compiled plans into a tree whose edges are sampling calls:
+    plans that agree on their first k calls share the first k nodes, so
+    each shared prefix is sampled once. Leaves list the plan indices.
+    """
+    root = {"children": {}, "leaves": []}
+    for index, (calls, _) in enumerate(plans):
+        node = root
+        for i in range(len(calls)):
+            sampler_kwargs = _call_sampler_kwargs(calls[i], seed, options)
+            sig = _call_signature(calls, i, sampler_kwargs)
+            node = node["children"].setdefault(sig, {"calls": calls, "i": i, "sampler_kwargs": sampler_kwargs,
+                                                     "children": {}, "leaves": []})
+        node["leaves"].append(index)
+    return root
+
+
+def _run_prefix_tree(root, plans, num_stages, latent, options, residency, stats):
+    """Depth-first walk of the tree; only the latents on the current path are held."""
+    use_cache, use_disk = _cache_settings(options)
+    results = {}
+
+    def visit(node, out, key):
+        for child in node["children"].values():
+            calls, i = child["calls"], child["i"]
+            child_key = _call_key(key, calls, i, child["sampler_kwargs"], options)
+            res = _stage_cache.get(child_key, use_disk)
+            if res is None:
+                residency.enter(calls[i]["index"])
+                res = _run_call(calls[i], out, child["sampler_kwargs"], *_call_bridges(calls, i, options), options)
+                _stage_cache.put(child_key, res, use_disk)
+                stats["sampler_calls"] += 1
+                stats["sampled_steps"] += _window_steps(calls[i]["window"])
+            else:
+                _instant("cache_hit", "cache", stage=calls[i]["index"] + 1)
+                stats["cache_hits"] += 1
+            visit(child, res, child_key)
+        for index in node["leaves"]:
+            calls, tail = plans[index]
+            results[index] = _tail_bridge(out, calls, tail, num_stages, options)
+
+    visit(root, latent, _stage_key("input", latent) if use_cache else None)
+    return results
+
+
+def _step_switch_sweep_handler(model, latent, kwargs):
+    configs = _sweep_configs(kwargs)
+    seed = kwargs.get("seed", 0)
+    handoff_mode = kwargs.get("handoff_mode", "restart")
+    latent = latent if isinstance(latent, dict) else {"samples": latent}
+
+    stage_lists = [_step_switch_stages({**kwargs, **config}) for config in configs]
+    plans = [_compile_plan(stages, handoff_mode) for stages in stage_lists]
+    stats = {"sampler_calls": 0, "cache_hits": 0, "sampled_steps": 0,
+             "unshared_calls": sum(len(calls) for calls, _ in plans),
+             "unshared_steps": sum(_window_steps(c["window"]) for calls, _ in plans for c in calls)}
+    if handoff_mode == "continuous":
+        plans = _split_at_switch_points(plans, kwargs)
+    root = _prefix_tree(plans, seed, kwargs)
+
+    with _stage_residency([stage["model"] for stage in stage_lists[0]], kwargs) as residency:
+        results = _run_prefix_tree(root, plans, len(stage_lists[0]), latent, kwargs, residency, stats)
+
+    outputs = [results[i]["samples"] for i in range(len(configs))]
+    if any(o.shape[1:] != outputs[0].shape[1:] for o in outputs):
+        raise RuntimeError("Sweep results have different latent shapes and cannot be batched together.")
+    logging.info(f"Step switch sweep: {len(configs)} configs, {stats['sampler_calls']} sampler calls "
+                 f"instead of {stats['unshared_calls']} ({stats['cache_hits']} from the stage cache), "
+                 f"{stats['sampled_steps']} of {stats['unshared_steps']} steps sampled.")
+
+    manifest, start = [], 0
+    for config, out in zip(configs, outputs):
+        manifest.append({"batch_index": list(range(start, start + out.shape[0])), **config})
+        start += out.shape[0]
+    summary = json.dumps({"configs": manifest, **stats}, indent=2)
+    return _output_latent({"samples": torch.cat(outputs)}, kwargs.get("precision", "fp32")), summary
+
+
+def _sweep_string(default):
+    return ("STRING", {"default": default, "multiline": False,
+                       "tooltip": "Comma-separated values; every combination is sampled."})
+
+
+StepSwitchSweepKSampler = _make_node_class("StepSwitchSweepKSampler", lambda: {
+    "model1": ("MODEL",),
+    "model2": ("MODEL",),
+    "positive": ("CONDITIONING",),
+    "negative": ("CONDITIONING",),
+    "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff}),
+    "total_steps": ("INT", {"default": 20, "min": 2}),
+    "switch_point": _sweep_string("10"),
+    "sampler_before": _sweep_string(cs.KSampler.SAMPLERS[0]),
+    "sampler_after": _sweep_string(cs.KSampler.SAMPLERS[0]),
+    "scheduler_before": _sweep_string(cs.KSampler.SCHEDULERS[0]),
+    "scheduler_after": _sweep_string(cs.KSampler.SCHEDULERS[0]),
+    "cfg_before": _sweep_string("7.5"),
+    "cfg_after": _sweep_string("7.5"),
+    "denoise_before": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0, "step": 0.01}),
+    "denoise_after": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0, "step": 0.01}),
+    "latent_image": ("LATENT",),
+}, _step_switch_sweep_handler,
+    return_types=("LATENT", "STRING"),
+    return_names=("LATENT", "manifest"),
+    optional_schema_callable=lambda: {
+        **_schema_for_handoff(), **_schema_for_residency(), **_schema_for_stage_cache(),
+        **_schema_for_precision(), **_schema_for_micro_batch()},
+    profiled=True, previewed=True,
+)
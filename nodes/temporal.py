@@ -0,0 +1,116 @@
+import torch
+
+from .helpers import _call_ksampler
+
+
+def _schema_for_temporal():
+    return {
+        "temporal_window": ("INT", {"default": 0, "min": 0, "max": 4096,
+                                    "tooltip": "Latent frames per model call for video latents; the predictions "
+                                               "of overlapping windows are blended at every step. 0 runs the "
+                                               "model on the whole clip."}),
+        "temporal_stride": ("INT", {"default": 0, "min": 0, "max": 4096,
+                                    "tooltip": "Frames between window starts. 0 uses 3/4 of the window."}),
+    }
+
+
+def _temporal_settings(options):
+    """(window, stride) when temporal windowing is on, else None."""
+    window = int(options.get("temporal_window", 0) or 0)
+    if window <= 0:
+        return None
+    stride = int(options.get("temporal_stride", 0) or 0) or max(1, window - window // 4)
+    return window, min(stride, window)
+
+
+def _use_temporal(latent, window):
+    samples = latent["samples"] if isinstance(latent, dict) else latent
+    return torch.is_tensor(samples) and samples.ndim == 5 and 0 < window < samples.shape[2]
+
+
+def _window_starts(frames, window, stride):
+    if frames <= window:
+        return [0]
+    return list(range(0, frames - window, stride)) + [frames - window]
+
+
+def _frame_weights(n, overlap, device):
+    """Linear ramp over `overlap` frames at both ends of a window; never zero."""
+    r = torch.clamp((torch.arange(n, device=device, dtype=torch.float32) + 1) / (overlap + 1), max=1.0)
+    return torch.minimum(r, r.flip(0))[None, None, :, None, None]
+
+
+def _slice_cond(c, t0, t1, frames):
+    """Model-call kwargs cut to frames [t0, t1): 5D tensors with the clip's frame count, e.g. c_concat."""
+    return {k: v[:, :, t0:t1] if torch.is_tensor(v) and v.ndim == 5 and v.shape[2] == frames else v
+            for k, v in c.items()}
+
+
+def _window_wrapper(window, stride, previous=None):
+    """
+    `model_function_wrapper` running every model call over a 5D latent in
+    overlapping windows of `window` frames and blending the windows'
+    predictions linearly, so each step sees one prediction for the whole
+    clip. `previous` is a wrapper already set on the model; it runs per window.
+    """
+    overlap = window - stride
+
+    def apply(apply_model, args):
+        if previous is not None:
+            return previous(apply_model, args)
+        return apply_model(args["input"], args["timestep"], **args["c"])
+
+    def wrapper(apply_model, args):
+        x = args["input"]
+        if x.ndim != 5 or x.shape[2] <= window:
+            return apply(apply_model, args)
+        frames = x.shape[2]
+        out = wsum = None
+        for t0 in _window_starts(frames, window, stride):
+            t1 = t0 + window
+            pred = apply(apply_model, {**args, "input": x[:, :, t0:t1], "c": _slice_cond(args["c"], t0, t1, frames)})
+            if out is None:
+                out = torch.zeros((*pred.shape[:2], frames, *pred.shape[3:]), dtype=torch.float32,
+                                  device=pred.device)
+                wsum = torch.zeros((1, 1, frames, 1, 1), dtype=torch.float32, device=pred.device)
+            weights = _frame_weights(t1 - t0, overlap, pred.device)
+            out[:, :, t0:t1].addcmul_(pred.float(), weights)
+            wsum[:, :, t0:t1] += weights
+        return out.div_(wsum).to(pred.dtype)
+    return wrapper
+
+
+def _windowed_model(model, window, stride):
+    """`model` cloned with `_window_wrapper` installed, chaining any model_function_wrapper it already had."""
+    windowed = model.clone()
+    previous = windowed.model_options.get("model_function_wrapper")
+    windowed.model_options["model_function_wrapper"] = _window_wrapper(window, stride, previous)
+    return windowed
+
+
+def _sample_temporal(model, latent, sampler_kwargs, window, stride, stop=None):
+    """
+    Run one `_call_ksampler` stage over a 5D (B, C, T, H, W) latent with
+    temporal context windows: the sampler integrates the whole clip, and
+    every model call inside it is split into overlapping windows whose
+    predictions are blended (see `_window_wrapper`). Noise and the schedule
+    are the whole clip's, so an adaptive `stop` applies as usual.
+    """
+    return _call_ksampler(_windowed_model(model, window, stride), latent, stop=stop, **sampler_kwargs)
+
+
+def _stream_frames(bridge_fn, samples, window, causal=False):
+    """
+    Bridge a 5D latent `window` frames at a time. Image-VAE round trips
+    return frames folded into the batch (B*T, C, H, W); those come back in
+    the same batch-major order as bridging the whole clip would give.
+    `causal` (a VAE with temporal compression, e.g. Wan/Hunyuan) bridges the
+    whole clip, since its frames depend on the ones before them.
+    """
+    if causal or not _use_temporal(samples, window):
+        return bridge_fn(samples)
+    batch = samples.shape[0]
+    outs = [bridge_fn(samples[:, :, t0:t0 + window]) for t0 in range(0, samples.shape[2], window)]
+    if outs[0].ndim == 5:
+        return torch.cat(outs, dim=2)
+    return torch.cat([o.reshape(batch, -1, *o.shape[1:]) for o in outs], dim=1).reshape(-1, *outs[0].shape[1:])
@@ -0,0 +1,62 @@
+"""
+The package is tested on CPU against the stub `comfy.*` modules and fake
+models/VAEs from benchmarks/, like the benchmarks and the headless stub
+backend. The repo is imported as `switch_samplers`.
+"""
+import os
+import sys
+
+import pytest
+import torch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "benchmarks", "stubs"), os.path.join(ROOT, "benchmarks"),
+                os.path.join(ROOT, "headless")]
+
+from backends import load_package  # noqa: E402
+from fakes import FakeModel, FakeVAE, fake_conditioning  # noqa: E402
+
+load_package()
+
+
+@pytest.fixture(autouse=True)
+def _isolated_dirs(tmp_path, monkeypatch):
+    """Stage cache, checkpoints and spill files under the test's tmp dir; shared caches start empty."""
+    from switch_samplers.nodes.noise import _noise_provider
+    from switch_samplers.nodes.stage_cache import _stage_cache
+    for name in ("CACHE", "CHECKPOINT", "SPILL"):
+        monkeypatch.setenv(f"SWITCH_SAMPLERS_{name}_DIR", str(tmp_path / name.lower()))
+    _stage_cache.clear()
+    _noise_provider.clear()
+    yield
+    _stage_cache.clear()
+
+
+@pytest.fixture
+def cond():
+    return fake_conditioning()
+
+
+@pytest.fixture
+def model():
+    return FakeModel(4, seed=1)
+
+
+@pytest.fixture
+def latent():
+    return {"samples": torch.randn(2, 4, 8, 8, generator=torch.Generator().manual_seed(0))}
+
+
+def step_switch_inputs(model1, model2, cond, **extra):
+    return dict(model1=model1, model2=model2, positive=cond, negative=cond, seed=3, total_steps=6, switch_point=3,
+                sampler_before="euler", sampler_after="euler", scheduler_before="normal",
+                scheduler_after="normal", cfg_before=5.0, cfg_after=5.0, **extra)
+
+
+def multistep_inputs(cond, **extra):
+    inputs = dict(positive=cond, negative=cond, seed=3)
+    for i in (1, 2, 3):
+        inputs.update({f"steps_stage{i}": 2, f"sampler_stage{i}": "euler", f"scheduler_stage{i}": "normal",
+                       f"cfg_stage{i}": 5.0})
+    inputs.update(extra)
+    return inputs
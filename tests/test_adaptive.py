@@ -0,0 +1,48 @@
+import pytest
+import torch
+
+from conftest import FakeModel, FakeVAE, step_switch_inputs
+from switch_samplers.nodes import cross_step_switch, step_switch
+from switch_samplers.nodes.adaptive import AdaptiveStop, _StageStopped
+
+
+class ConstSampling:
+    """Flow-model noise scaling, like comfy's CONST model sampling."""
+
+    def inverse_noise_scaling(self, sigma, latent):
+        return latent / (1.0 - sigma)
+
+
+def _spec(hand_off):
+    return {"mode": "sigma", "sigma": 0.6, "tol": 0.0, "min_steps": 1, "hand_off": hand_off}
+
+
+@pytest.mark.parametrize("hand_off, scale", [("noisy", 1 / (1 - 0.75)), ("clean", 1.0)])
+def test_stopped_latent_undoes_the_noise_scaling(hand_off, scale):
+    model = FakeModel()
+    model.model_sampling = ConstSampling()
+    stop = AdaptiveStop(_spec(hand_off))
+    callback = stop.wrap(None, model, 4, "normal", 1.0)
+    x0, x = torch.zeros(1, 4, 2, 2), torch.ones(1, 4, 2, 2)
+    callback(0, x0, x, 4)
+    # the stub schedule is 1.0, 0.75, 0.5, ...; step 1 reaches switch_sigma 0.6 at its next sigma
+    with pytest.raises(_StageStopped) as stopped:
+        callback(1, x0, x, 4)
+    expected = x * scale if hand_off == "noisy" else x0
+    assert torch.allclose(stopped.value.latent, expected)
+    assert stop.steps_run == 2
+
+
+@pytest.mark.parametrize("node, extra", [
+    (step_switch.StepSwitchKSampler, {}),
+    (cross_step_switch.CrossStepSwitchKSampler, {"vae1": FakeVAE(seed=1), "vae2": FakeVAE(seed=1)}),
+])
+def test_steps_used_comes_after_profile(cond, latent, node, extra):
+    assert node.RETURN_NAMES == ("LATENT", "profile", "steps_used")
+    assert node.RETURN_TYPES == ("LATENT", "STRING", "INT")
+    inputs = step_switch_inputs(FakeModel(seed=1), FakeModel(seed=2), cond, adaptive_switch="sigma",
+                                switch_sigma=0.6, **extra)
+    out, profile, steps_used = node().sample(latent_image=latent, **inputs)
+    assert out["samples"].shape == latent["samples"].shape
+    assert isinstance(profile, str)
+    assert steps_used < 6
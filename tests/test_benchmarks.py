@@ -0,0 +1,46 @@
+"""The benchmark runner is run as a script, like CI does: it imports the package itself."""
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+RUN = os.path.join(ROOT, "benchmarks", "run.py")
+SMOKE = ["--quick", "--repeats", "1", "--warmup", "0", "--steps", "2"]
+
+
+def _run(*args):
+    return subprocess.run([sys.executable, RUN, *SMOKE, *args], capture_output=True, text=True, cwd=ROOT)
+
+
+def test_quick_run_covers_every_case_and_layout(tmp_path):
+    out = tmp_path / "bench.json"
+    proc = _run("--out", str(out))
+    assert proc.returncode == 0, proc.stderr
+    results = json.loads(out.read_text())
+    cases = {r["case"] for r in results["results"]}
+    assert {"ksampler_baseline", "bridge_vae", "step_switch", "cross_multistep"} <= cases
+    layouts = {(r["case"], r["layout"]) for r in results["results"]}
+    assert layouts == {(case, layout) for case in cases for layout in ("4d", "5d")}
+    assert results["meta"]["steps"] == 2
+
+
+def test_compare_flags_regressions(tmp_path):
+    baseline = tmp_path / "before.json"
+    assert _run("--cases", "bridge_vae", "--out", str(baseline)).returncode == 0
+    data = json.loads(baseline.read_text())
+    for result in data["results"]:
+        result["median_ms"] = 1e-3
+    baseline.write_text(json.dumps(data))
+
+    proc = _run("--cases", "bridge_vae", "--out", str(tmp_path / "after.json"), "--compare", str(baseline))
+    assert proc.returncode == 0 and "REGRESSION" in proc.stdout
+    proc = _run("--cases", "bridge_vae", "--out", str(tmp_path / "after.json"), "--compare", str(baseline),
+                "--fail-on-regression")
+    assert proc.returncode == 1
+
+
+def test_unknown_case_is_rejected(tmp_path):
+    proc = _run("--cases", "nope", "--out", str(tmp_path / "x.json"))
+    assert proc.returncode != 0 and "Unknown cases: nope" in proc.stderr
@@ -0,0 +1,40 @@
+import torch
+
+from conftest import FakeVAE
+from switch_samplers.nodes.bridge import _bridge_latent, _vae_bridge
+
+
+def _clip(batch=2, frames=5):
+    return torch.randn(batch, 4, frames, 4, 4, generator=torch.Generator().manual_seed(0))
+
+
+def _recording(vae):
+    decoded = []
+    decode = vae.decode
+
+    def record(samples):
+        decoded.append(samples.shape[2] if samples.ndim == 5 else samples.shape[0])
+        return decode(samples)
+    vae.decode = record
+    return decoded
+
+
+def test_video_bridge_decodes_chunk_by_chunk():
+    src, dst = FakeVAE(seed=1), FakeVAE(16, seed=2)
+    decoded = _recording(src)
+    samples = _clip()
+    out = _bridge_latent(samples, src, dst, memory_mb=64, frame_chunk=2, tile_overlap=0)
+    assert decoded == [2, 2, 1]
+    # folded batch-major like the untiled bridge
+    assert out.shape == (2 * 5, 16, 4, 4)
+    assert torch.allclose(out, _vae_bridge(samples, src, dst), atol=1e-5)
+
+
+def test_causal_video_vae_decodes_the_whole_clip():
+    src, dst = FakeVAE(seed=1), FakeVAE(16, seed=2)
+    src.temporal_compression_decode = lambda: 4
+    decoded = _recording(src)
+    samples = _clip()
+    out = _bridge_latent(samples, src, dst, memory_mb=64, frame_chunk=2, tile_overlap=0)
+    assert decoded == [5]
+    assert torch.allclose(out, _vae_bridge(samples, src, dst), atol=1e-5)
@@ -0,0 +1,49 @@
+import torch
+
+from conftest import FakeModel, FakeVAE, step_switch_inputs
+from switch_samplers.nodes import cross_step_switch, helpers, microbatch
+from switch_samplers.nodes.bridge import _blend_ramp, _blend_weights
+from switch_samplers.nodes.buffers import BufferPool, _buffer_pool
+
+
+def test_lease_reuses_buffers_until_cleared():
+    pool = BufferPool()
+    with pool.lease() as take:
+        first = take((4, 4), torch.float32, "cpu")
+    with pool.lease() as take:
+        assert take((4, 4), torch.float32, "cpu") is first
+    pool.clear()
+    with pool.lease() as take:
+        assert take((4, 4), torch.float32, "cpu") is not first
+
+
+def test_node_run_leaves_no_idle_buffers(cond, latent):
+    inputs = step_switch_inputs(FakeModel(seed=1), FakeModel(16, seed=2), cond, vae1=FakeVAE(seed=1),
+                                vae2=FakeVAE(16, seed=2), bridge_memory_mb=1)
+    cross_step_switch.CrossStepSwitchKSampler().sample(latent_image=latent, **inputs)
+    assert _buffer_pool.misses > 0
+    assert _buffer_pool._bytes == 0 and not _buffer_pool._free
+
+
+def test_oom_clears_the_pool(model, latent, cond, monkeypatch):
+    with _buffer_pool.lease() as take:
+        take((8,), torch.float32, "cpu")
+    assert _buffer_pool._bytes > 0
+    sample = helpers.csample.sample
+
+    def oom_above_1(m, noise, *args, **kwargs):
+        if noise.shape[0] > 1:
+            assert _buffer_pool._bytes > 0
+            raise microbatch._OOM_EXCEPTION("out of memory")
+        assert _buffer_pool._bytes == 0
+        return sample(m, noise, *args, **kwargs)
+    monkeypatch.setattr(helpers.csample, "sample", oom_above_1)
+    helpers._call_ksampler(model, latent, 2, "euler", "normal", 5.0, cond, cond, seed=1)
+
+
+def test_blend_weights_are_cached_on_the_cpu():
+    _blend_ramp.cache_clear()
+    weights = _blend_weights(8, 8, 2, torch.device("cpu"))
+    assert weights.shape == (1, 1, 8, 8) and weights.min() > 0
+    assert _blend_ramp(8, 8, 2).device.type == "cpu"
+    assert _blend_ramp.cache_info().currsize == 1
@@ -0,0 +1,47 @@
+import torch
+
+from conftest import FakeModel, FakeVAE
+from switch_samplers.nodes.capabilities import _model_profile, _vae_profile
+
+
+class VideoVAE:
+    downscale_ratio = (lambda a: a, 8, 8)  # comfy's video VAEs keep a callable for time
+    latent_channels = 16
+
+    def temporal_compression_decode(self):
+        return 4
+
+
+def test_model_profile_is_resolved_once_per_model():
+    model = FakeModel(16)
+    profile = _model_profile(model)
+    assert profile["latent_channels"] == 16 and profile["dtype"] == torch.float32
+    model.latent_channels = 4
+    assert _model_profile(model) is profile
+    assert _model_profile(FakeModel(4))["latent_channels"] == 4
+
+
+def test_vae_profile_reads_spatial_and_temporal_factors():
+    assert _vae_profile(FakeVAE(factor=16))["spatial_factor"] == 16
+    video = _vae_profile(VideoVAE())
+    assert (video["spatial_factor"], video["temporal_factor"], video["latent_channels"]) == (8, 4, 16)
+
+
+def test_vae_profile_falls_back_to_the_default_factor():
+    class Bare:
+        pass
+
+    profile = _vae_profile(Bare())
+    assert profile["spatial_factor"] == 8 and profile["temporal_factor"] is None
+
+
+def test_objects_without_weakrefs_are_profiled_every_time():
+    class Slotted:
+        __slots__ = ("latent_channels",)
+
+    vae = Slotted()
+    vae.latent_channels = 4
+    assert _vae_profile(vae)["latent_channels"] == 4
+    vae.latent_channels = 16
+    assert _vae_profile(vae)["latent_channels"] == 16
+
@@ -0,0 +1,106 @@
+import os
+
+import pytest
+import torch
+
+from conftest import FakeModel, FakeVAE, multistep_inputs, step_switch_inputs
+from switch_samplers.nodes import cross_multistep, plan, step_switch
+from switch_samplers.nodes.checkpoint import _checkpoint_root
+
+
+@pytest.fixture
+def sampler_calls(monkeypatch):
+    """Seeds of the `_call_ksampler` calls the plan makes; set `fail_at` to raise on that call."""
+    class Calls(list):
+        fail_at = None
+
+    calls, original = Calls(), plan._call_ksampler
+
+    def call(model, out, **kwargs):
+        calls.append(kwargs["seed"])
+        if len(calls) == calls.fail_at:
+            raise KeyboardInterrupt("interrupted")
+        return original(model, out, **kwargs)
+    monkeypatch.setattr(plan, "_call_ksampler", call)
+    return calls
+
+
+def _cross_inputs(cond):
+    return multistep_inputs(cond, model1=FakeModel(4, seed=1), model2=FakeModel(16, seed=2), vae1=FakeVAE(4, seed=1),
+                            vae2=FakeVAE(16, seed=2), vae3=FakeVAE(4, seed=1), positive1=cond, negative1=cond)
+
+
+def test_interrupted_job_resumes_at_first_unfinished_stage(cond, latent, sampler_calls):
+    inputs = step_switch_inputs(FakeModel(seed=1), FakeModel(seed=2), cond, stage_checkpoint="resume")
+    node = step_switch.StepSwitchKSampler()
+    reference = node.sample(latent_image=latent, **dict(inputs, stage_checkpoint="off"))[0]["samples"]
+
+    sampler_calls.clear()
+    sampler_calls.fail_at = 2
+    with pytest.raises(KeyboardInterrupt):
+        node.sample(latent_image=latent, **inputs)
+    sampler_calls.clear()
+    sampler_calls.fail_at = None
+    out = node.sample(latent_image=latent, **inputs)[0]["samples"]
+    assert sampler_calls == [4]
+    assert torch.equal(out, reference)
+    # resume mode removes the job once it completed
+    assert os.listdir(_checkpoint_root()) == []
+
+
+def test_failed_bridge_reruns_only_the_bridge(cond, latent, sampler_calls, monkeypatch):
+    inputs = _cross_inputs(cond)
+    node = cross_multistep.CrossMultiStepKSampler()
+    reference = node.sample(latent_image=latent, **inputs)[0]["samples"]
+
+    original, failed = plan._bridge_latent, []
+
+    def bridge(samples, src, dst, **kwargs):
+        if "2→3" in kwargs["label"] and not failed:
+            failed.append(True)
+            raise RuntimeError("Stage 2→3 encode failed")
+        return original(samples, src, dst, **kwargs)
+    monkeypatch.setattr(plan, "_bridge_latent", bridge)
+
+    sampler_calls.clear()
+    with pytest.raises(RuntimeError):
+        node.sample(latent_image=latent, stage_checkpoint="resume", **inputs)
+    sampler_calls.clear()
+    out = node.sample(latent_image=latent, stage_checkpoint="resume", **inputs)[0]["samples"]
+    assert sampler_calls == [5]
+    assert torch.equal(out, reference)
+
+
+@pytest.mark.parametrize("stage_cache, rerun", [("off", [3, 4]), ("memory", [])])
+def test_kept_job_is_a_cache_only_with_the_stage_cache_on(cond, latent, sampler_calls, stage_cache, rerun):
+    inputs = step_switch_inputs(FakeModel(seed=1), FakeModel(seed=2), cond, stage_checkpoint="keep")
+    node = step_switch.StepSwitchKSampler()
+    node.sample(latent_image=latent, **inputs)
+    assert len(os.listdir(_checkpoint_root())) == 1
+    from switch_samplers.nodes.stage_cache import _stage_cache
+    _stage_cache.clear()
+
+    sampler_calls.clear()
+    node.sample(latent_image=latent, stage_cache=stage_cache, **inputs)
+    assert sampler_calls == rerun
+
+
+def test_swapped_lora_does_not_resume_stale_stages(cond, latent, sampler_calls):
+    base = FakeModel(seed=1)
+    node = step_switch.StepSwitchKSampler()
+
+    def patched(seed):
+        m = base.clone()
+        g = torch.Generator().manual_seed(seed)
+        m.patches = {"model.0.weight": [(1.0, ("lora", (torch.randn(4, 2, generator=g),)), 1.0, None, None)]}
+        return m
+
+    sampler_calls.fail_at = 2
+    first = patched(1)
+    with pytest.raises(KeyboardInterrupt):
+        node.sample(latent_image=latent, **step_switch_inputs(first, first, cond, stage_checkpoint="resume"))
+    sampler_calls.clear()
+    sampler_calls.fail_at = None
+    other = patched(2)
+    node.sample(latent_image=latent, **step_switch_inputs(other, other, cond, stage_checkpoint="resume"))
+    assert sampler_calls == [3, 4]
@@ -0,0 +1,68 @@
+import comfy.samplers
+import pytest
+import torch
+
+from conftest import FakeModel
+from switch_samplers.nodes.guidance import _cfg_passes, _guided_model
+from switch_samplers.nodes.helpers import _call_ksampler
+
+
+class Counting(FakeModel):
+    """Records the sigma of every denoiser call, its clones' included."""
+
+    def __init__(self):
+        super().__init__(seed=1)
+        self.sigmas = []
+
+    def denoise(self, x, sigma):
+        self.sigmas.append(sigma)
+        return super().denoise(x, sigma)
+
+
+def _sample(model, latent, cond, **kwargs):
+    kwargs = dict(dict(cfg=5.0, cfg_truncate_sigma=0.0), **kwargs)
+    return _call_ksampler(model, latent, 6, "euler", "normal", positive=cond, negative=cond, seed=0, **kwargs)
+
+
+def test_cfg_passes():
+    model = FakeModel()
+    assert (_cfg_passes(model, 1.0), _cfg_passes(model, 5.0)) == (1, 2)
+    model.model_options["disable_cfg1_optimization"] = True
+    assert _cfg_passes(model, 1.0) == 2
+
+
+@pytest.mark.parametrize("truncate, calls", [(0.0, 12), (0.5, 10), (2.0, 6)])
+def test_negative_pass_is_dropped_below_the_threshold(latent, cond, truncate, calls):
+    # the stub schedule is 1, 5/6, 4/6, 3/6, 2/6, 1/6: two steps below 0.5
+    model = Counting()
+    _sample(model, latent, cond, cfg_truncate_sigma=truncate)
+    assert len(model.sigmas) == calls
+    assert "sampler_calc_cond_batch_function" not in model.model_options
+
+
+def test_truncated_steps_sample_the_cond_alone(latent, cond):
+    # with identical cond and uncond, CFG at any scale is the cond prediction
+    full = _sample(FakeModel(seed=1), latent, cond)
+    truncated = _sample(FakeModel(seed=1), latent, cond, cfg_truncate_sigma=0.5)
+    assert torch.allclose(full["samples"], truncated["samples"], atol=1e-5)
+
+
+def test_nothing_to_drop_keeps_the_model():
+    model = FakeModel()
+    assert _guided_model(model, 5.0) is model
+    assert _guided_model(model, 1.0, 0.5) is model
+    assert _guided_model(model, 5.0, 0.5) is not model
+
+
+def test_an_existing_hook_is_chained(latent, cond):
+    model = Counting()
+    seen = []
+
+    def hook(args):
+        seen.append(args["conditions"][1] is None)
+        return comfy.samplers.calc_cond_batch(args["model"], args["conditions"], args["input"], args["sigma"],
+                                              args["model_options"])
+    model.model_options["sampler_calc_cond_batch_function"] = hook
+    _sample(model, latent, cond, cfg_truncate_sigma=0.5)
+    assert seen == [False] * 4 + [True] * 2
+    assert model.model_options["sampler_calc_cond_batch_function"] is hook
@@ -0,0 +1,76 @@
+import json
+import os
+import sys
+
+import pytest
+import torch
+
+from conftest import ROOT
+
+HEADLESS = os.path.join(ROOT, "headless")
+
+JOBS = [
+    {"id": "multi", "node": "MultiStepKSampler",
+     "inputs": {"model1": "sd", "model2": "sd", "model3": "refiner", "positive": "a cat", "negative": "blurry",
+                "seed": 1, "latent_image": {"width": 64, "height": 64, "batch_size": 2},
+                **{f"{k}_stage{i}": v for i in (1, 2, 3)
+                   for k, v in (("steps", 2), ("sampler", "euler"), ("scheduler", "normal"), ("cfg", 5.0))}}},
+    {"id": "cross", "node": "CrossStepSwitchKSampler",
+     "inputs": {"model1": "sd", "model2": "flux:16", "vae1": "sd", "vae2": "flux:16", "positive1": "a dog",
+                "negative1": "", "positive2": "a dog", "negative2": "", "seed": 2,
+                "latent_image": {"width": 64, "height": 64}, "total_steps": 4, "switch_point": 2,
+                "sampler_before": "euler", "sampler_after": "euler", "scheduler_before": "normal",
+                "scheduler_after": "normal", "cfg_before": 5.0, "cfg_after": 5.0}},
+    {"id": "broken", "node": "NoSuchNode", "inputs": {}},
+]
+
+
+@pytest.fixture
+def runner(monkeypatch):
+    """headless/run.py as `run`, importable by name in spawned workers too."""
+    monkeypatch.syspath_prepend(HEADLESS)
+    monkeypatch.delitem(sys.modules, "run", raising=False)
+    import run
+    yield run
+    sys.modules.pop("run", None)
+
+
+def _results(out_dir):
+    with open(os.path.join(out_dir, "results.jsonl")) as f:
+        return {r["id"]: r for r in map(json.loads, f)}
+
+
+def _run(runner, out_dir, workers):
+    failed = runner.run(JOBS, str(out_dir), backend="stub", workers=workers)
+    records = _results(out_dir)
+    assert failed == 1
+    assert records["broken"]["status"] == "error" and "Unknown node" in records["broken"]["error"]
+    assert records["multi"]["status"] == records["cross"]["status"] == "ok"
+    return records
+
+
+def test_in_process_and_worker_runs_write_the_same_latents(runner, tmp_path):
+    # workers first: the in-process stub setup puts benchmarks/ (with its own run.py) ahead on sys.path
+    parallel = _run(runner, tmp_path / "parallel", 2)
+    serial = _run(runner, tmp_path / "serial", 1)
+    assert {r["worker"] for r in serial.values()} == {os.getpid()}
+    assert os.getpid() not in {r["worker"] for r in parallel.values() if r["status"] == "ok"}
+
+    shapes = {"multi": (2, 4, 8, 8), "cross": (1, 16, 8, 8)}
+    for job, shape in shapes.items():
+        assert serial[job]["outputs"]["LATENT"] == str(tmp_path / "serial" / f"{job}.latent")
+        first = runner._load_latent(serial[job]["outputs"]["LATENT"])["samples"]
+        second = runner._load_latent(parallel[job]["outputs"]["LATENT"])["samples"]
+        assert first.shape == shape
+        assert torch.equal(first, second)
+    assert serial["cross"]["outputs"]["steps_used"] == 4
+    assert serial["cross"]["outputs"]["profile"] == ""
+
+
+def test_read_jobs_numbers_and_validates_ids(runner, tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    path.write_text('{"node": "MultiStepKSampler"}\n\n{"id": "a", "node": "StepSwitchKSampler"}\n')
+    assert [job["id"] for job in runner._read_jobs(str(path))] == ["1", "a"]
+    path.write_text('{"id": "a", "node": "X"}\n{"id": "a", "node": "X"}\n')
+    with pytest.raises(ValueError, match="duplicate job id 'a'"):
+        runner._read_jobs(str(path))
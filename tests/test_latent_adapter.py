@@ -0,0 +1,84 @@
+import pytest
+import torch
+
+from conftest import FakeVAE
+from switch_samplers.nodes import latent_adapter
+from switch_samplers.nodes.bridge import _bridge_latent
+from switch_samplers.nodes.latent_adapter import (LatentAdapter, fit_latent_adapter, load_latent_adapter,
+                                                  resolve_latent_adapter, save_latent_adapter)
+
+
+def _paired(frames=None):
+    g = torch.Generator().manual_seed(0)
+    shape = (3, 4) + ((frames,) if frames else ()) + (8, 8)
+    src = torch.randn(*shape, generator=g)
+    proj = torch.randn(16, 4, generator=g)
+    dst = torch.einsum("oc,bc...->bo...", proj, src) + 0.5
+    return src, dst
+
+
+def test_fit_recovers_a_linear_channel_map():
+    src, dst = _paired()
+    adapter = fit_latent_adapter(src, dst, ridge=0.0)
+    assert (adapter.in_channels, adapter.out_channels) == (4, 16)
+    assert torch.allclose(adapter.apply(src), dst, atol=1e-3)
+
+
+def test_video_latents_and_spatial_scale():
+    src, dst = _paired(frames=3)
+    dst = torch.nn.functional.interpolate(dst.reshape(3, -1, 8, 8), size=(16, 16)).reshape(3, 16, 3, 16, 16)
+    adapter = fit_latent_adapter(src, dst)
+    assert adapter.spatial_scale == 2.0
+    assert adapter.apply(src).shape == dst.shape
+
+
+def test_apply_rejects_the_wrong_channel_count():
+    adapter = fit_latent_adapter(*_paired())
+    with pytest.raises(ValueError, match="4 input channels"):
+        adapter.apply(torch.zeros(1, 16, 8, 8))
+
+
+def test_save_load_round_trip_is_cached(tmp_path):
+    src, dst = _paired()
+    adapter = fit_latent_adapter(src, dst)
+    path = str(tmp_path / "a.safetensors")
+    save_latent_adapter(adapter, path)
+    loaded = load_latent_adapter(path)
+    assert loaded is load_latent_adapter(path)
+    assert isinstance(loaded, LatentAdapter)
+    assert torch.allclose(loaded.apply(src), adapter.apply(src))
+
+
+def test_missing_adapter_resolves_to_none(tmp_path):
+    assert resolve_latent_adapter("none") is None
+    assert resolve_latent_adapter(str(tmp_path / "missing.safetensors")) is None
+
+
+def test_adapter_bridge_skips_the_vaes(tmp_path):
+    src, dst = _paired()
+    path = str(tmp_path / "a.safetensors")
+    save_latent_adapter(fit_latent_adapter(src, dst), path)
+    vae_src, vae_dst = FakeVAE(seed=1), FakeVAE(16, seed=2)
+    vae_src.decode = None  # any VAE round trip would fail
+    out = _bridge_latent(src, vae_src, vae_dst, bridge_mode="adapter", adapter_name=path)
+    assert out.shape == (3, 16, 8, 8)
+
+
+def test_adapter_bridge_falls_back_to_the_vaes(tmp_path):
+    src, dst = _paired()
+    path = str(tmp_path / "a.safetensors")
+    save_latent_adapter(fit_latent_adapter(dst, src), path)  # 16 -> 4, doesn't fit a 4-channel latent
+    vae_src, vae_dst = FakeVAE(seed=1), FakeVAE(16, seed=2)
+    out = _bridge_latent(src, vae_src, vae_dst, bridge_mode="adapter", adapter_name=path)
+    assert torch.equal(out, _bridge_latent(src, vae_src, vae_dst))
+
+
+def test_cli_fits_from_latent_files(tmp_path, capsys):
+    from safetensors.torch import save_file
+    src, dst = _paired()
+    save_file({"samples": src}, str(tmp_path / "src.latent"))
+    save_file({"latent_tensor": dst.contiguous()}, str(tmp_path / "dst.latent"))
+    out = str(tmp_path / "out.safetensors")
+    latent_adapter.main(["--src", str(tmp_path / "src.latent"), "--dst", str(tmp_path / "dst.latent"), "--out", out])
+    assert "4->16 channels" in capsys.readouterr().out
+    assert load_latent_adapter(out).out_channels == 16
@@ -0,0 +1,69 @@
+import pytest
+import torch
+
+from switch_samplers.nodes import helpers, microbatch
+from switch_samplers.nodes.helpers import _call_ksampler
+from switch_samplers.nodes.microbatch import _chunk_seed
+
+
+def _sample(model, latent, cond, **extra):
+    return _call_ksampler(model, latent, 4, extra.pop("sampler_name", "euler_ancestral"), "normal", 5.0, cond, cond,
+                          seed=7, **extra)["samples"]
+
+
+@pytest.fixture
+def oom_above(monkeypatch):
+    """Make the sampler raise OOM for chunks larger than the given size; records the chunk sizes it saw."""
+    sizes, original = [], helpers.csample.sample
+
+    def sample(model, noise, *args, **kwargs):
+        sizes.append(noise.shape[0])
+        if noise.shape[0] > sample.limit:
+            raise microbatch._OOM_EXCEPTION("out of memory")
+        return original(model, noise, *args, **kwargs)
+    sample.limit, sample.sizes = 1 << 30, sizes
+    monkeypatch.setattr(helpers.csample, "sample", sample)
+    return sample
+
+
+def test_on_oom_runs_the_whole_batch(model, latent, cond, oom_above):
+    whole = _sample(model, latent, cond, micro_batch="off")
+    assert torch.equal(_sample(model, latent, cond), whole)
+    assert oom_above.sizes == [2, 2]
+
+
+def test_split_after_oom_gives_chunks_their_own_noise(model, latent, cond, oom_above):
+    oom_above.limit = 1
+    out = _sample(model, latent, cond)
+    assert oom_above.sizes == [2, 1, 1]
+    first = _sample(model, {"samples": latent["samples"][:1]}, cond, micro_batch="off")
+    assert torch.equal(out[:1], first)
+    # the second chunk does not replay the first chunk's per-step noise
+    replayed = _sample(model, {"samples": latent["samples"][1:]}, cond, micro_batch="off")
+    assert not torch.equal(out[1:], replayed)
+    assert torch.equal(_sample(model, latent, cond), out)
+
+
+def test_split_is_identical_for_deterministic_samplers(model, latent, cond, oom_above):
+    whole = _sample(model, latent, cond, sampler_name="euler", micro_batch="off")
+    oom_above.limit = 1
+    # equal up to the rounding of batched convolutions
+    assert torch.allclose(_sample(model, latent, cond, sampler_name="euler"), whole, atol=1e-5)
+
+
+def test_off_never_splits(model, latent, cond, oom_above):
+    oom_above.limit = 1
+    with pytest.raises(microbatch._OOM_EXCEPTION):
+        _sample(model, latent, cond, micro_batch="off")
+
+
+def test_auto_sizes_chunks_from_free_memory(model, latent, cond, oom_above, monkeypatch):
+    monkeypatch.setattr(microbatch, "_sample_bytes", lambda *args: 1 << 30)
+    monkeypatch.setattr(microbatch.mm, "get_free_memory", lambda *args: 1 << 30)
+    _sample(model, latent, cond, micro_batch="auto")
+    assert oom_above.sizes == [1, 1]
+
+
+def test_chunk_seed():
+    assert _chunk_seed(7, 0) == 7
+    assert len({_chunk_seed(7, start) for start in range(4)}) == 4
@@ -0,0 +1,46 @@
+import torch
+
+from switch_samplers.nodes import helpers, noise
+from switch_samplers.nodes.noise import NoiseProvider, _noise_provider
+
+
+def test_noise_matches_comfy_and_is_generated_once(latent):
+    provider = NoiseProvider()
+    samples = latent["samples"]
+    first = provider.get(samples, 5)
+    assert torch.equal(first, noise.csample.prepare_noise(samples, 5))
+    assert provider.get(samples, 5) is first
+    assert (provider.hits, provider.misses) == (1, 1)
+    assert not torch.equal(provider.get(samples, 6), first)
+
+
+def test_batch_index_and_disabled_noise_are_part_of_the_key(latent):
+    provider = NoiseProvider()
+    samples = latent["samples"]
+    shifted = provider.get(samples, 5, batch_inds=[1, 2])
+    assert torch.equal(shifted, noise.csample.prepare_noise(samples, 5, [1, 2]))
+    assert torch.equal(shifted[0], provider.get(samples, 5, batch_inds=[1, 0])[0])
+    assert not provider.get(samples, 5, disable_noise=True).any()
+
+
+def test_lru_stays_within_its_bounds(latent):
+    samples = latent["samples"]
+    provider = NoiseProvider(max_entries=2)
+    for seed in range(3):
+        provider.get(samples, seed)
+    assert len(provider._cache) == 2
+    provider.get(samples, 0)
+    assert provider.misses == 4
+
+    small = NoiseProvider(max_bytes=samples.numel() * samples.element_size() - 1)
+    small.get(samples, 0)
+    assert not small._cache
+
+
+def test_sampler_draws_noise_once_per_call(model, latent, cond, monkeypatch):
+    drawn, hits = [], _noise_provider.hits
+    prepare = noise.csample.prepare_noise
+    monkeypatch.setattr(noise.csample, "prepare_noise", lambda *args: drawn.append(1) or prepare(*args))
+    for _ in range(2):
+        helpers._call_ksampler(model, latent, 2, "euler", "normal", 5.0, cond, cond, seed=9)
+    assert len(drawn) == 1 and _noise_provider.hits == hits + 1
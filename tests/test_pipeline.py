@@ -0,0 +1,77 @@
+import threading
+
+import comfy.model_management as mm
+import pytest
+import torch
+
+from conftest import FakeModel, FakeVAE, step_switch_inputs
+from switch_samplers.nodes import pipeline
+from switch_samplers.nodes.cross_step_switch import CrossStepSwitchKSampler
+from switch_samplers.nodes.pipeline import _pipelined_sample_bridge
+
+
+def _kwargs(cond):
+    return dict(steps=4, sampler_name="euler_ancestral", scheduler="normal", cfg=5.0, positive=cond, negative=cond,
+                seed=7)
+
+
+@pytest.mark.parametrize("sampler", ["euler_ancestral", "dpmpp_sde", "euler"])
+@pytest.mark.parametrize("handoff", ["restart", "continuous"])
+@pytest.mark.parametrize("chunk", [1, 3])
+def test_pipelined_node_matches_the_unpipelined_node(cond, sampler, handoff, chunk):
+    latent = {"samples": torch.randn(4, 4, 8, 8, generator=torch.Generator().manual_seed(0))}
+    inputs = step_switch_inputs(FakeModel(seed=1), FakeModel(16, seed=2), cond, positive1=cond, negative1=cond,
+                                vae1=FakeVAE(seed=1), vae2=FakeVAE(16, seed=2), handoff_mode=handoff)
+    inputs.update(sampler_before=sampler, sampler_after=sampler)
+    whole = CrossStepSwitchKSampler().sample(latent_image=latent, **inputs)[0]["samples"]
+    out = CrossStepSwitchKSampler().sample(latent_image=latent, pipeline_chunk=chunk, **inputs)[0]["samples"]
+    assert out.shape == whole.shape == (4, 16, 8, 8)
+    # only the chunked VAE convolutions may round differently
+    assert torch.allclose(out, whole, atol=1e-5)
+
+
+def test_bridge_overlaps_the_next_chunk(model, cond, latent, monkeypatch):
+    second_chunk = threading.Event()
+    sample = pipeline._call_ksampler
+    calls = []
+
+    def recording(*args, **kwargs):
+        calls.append(kwargs["within_batch"])
+        if len(calls) == 2:
+            second_chunk.set()
+        return sample(*args, **kwargs)
+    monkeypatch.setattr(pipeline, "_call_ksampler", recording)
+
+    overlapped = []
+
+    def bridge(samples):
+        if not overlapped:
+            # the first chunk's bridge runs while the second chunk samples
+            overlapped.append(second_chunk.wait(timeout=10))
+            overlapped.append(threading.current_thread() is not threading.main_thread())
+        return samples * 2
+    out = _pipelined_sample_bridge(model, latent, _kwargs(cond), bridge, 1)
+    assert calls == [(2, 0), (2, 1)] and overlapped == [True, True]
+    assert out.shape == (2, 4, 8, 8)
+
+
+def test_bridge_loads_keep_the_sampling_model(model, cond, latent, monkeypatch):
+    loads = []
+    monkeypatch.setattr(mm, "load_models_gpu", lambda models, *args, **kwargs: loads.append(list(models)))
+    vae = FakeVAE(seed=1)
+
+    def bridge(samples):
+        mm.load_models_gpu([vae])
+        return samples
+    _pipelined_sample_bridge(model, latent, _kwargs(cond), bridge, 1)
+    assert loads == [[vae, model]] * 2
+    # restored once the stage is done
+    mm.load_models_gpu([vae])
+    assert loads[-1] == [vae]
+
+
+def test_bridge_errors_reach_the_caller(model, cond, latent):
+    def bridge(samples):
+        raise RuntimeError("bridge failed")
+    with pytest.raises(RuntimeError, match="bridge failed"):
+        _pipelined_sample_bridge(model, latent, _kwargs(cond), bridge, 1)
@@ -0,0 +1,98 @@
+import logging
+
+import pytest
+import torch
+
+from conftest import FakeModel, FakeVAE, multistep_inputs
+from switch_samplers.nodes.multistep import MultiStepKSampler
+from switch_samplers.nodes.plan import StagePlanKSampler, SwitchSamplerStage, _compile_plan, _stage
+
+
+def _stages(cond, model=None, **second):
+    model = model or FakeModel()
+    first = _stage(model, cond, cond, 4, "euler", "normal", 5.0, denoise=0.8)
+    later = dict(dict(sampler_name="dpmpp_2m", scheduler="normal", cfg=5.0, denoise=0.8), **second)
+    return [first, _stage(FakeModel(seed=2), cond, cond, 4, later["sampler_name"], later["scheduler"],
+                          later["cfg"], denoise=later["denoise"])]
+
+
+def test_continuous_uses_the_first_stage_schedule(cond, caplog):
+    with caplog.at_level(logging.WARNING):
+        calls, _ = _compile_plan(_stages(cond, scheduler="karras", denoise=0.5), "continuous")
+    assert [(c["scheduler"], c["denoise"]) for c in calls] == [("normal", 0.8), ("normal", 0.8)]
+    assert "stage 2's scheduler 'karras' is ignored" in caplog.text
+    assert "stage 2's denoise 0.5 is ignored" in caplog.text
+
+
+def test_continuous_shares_the_first_active_stage(cond, caplog):
+    stages = _stages(cond, scheduler="karras")
+    stages[0]["steps"] = 0
+    with caplog.at_level(logging.WARNING):
+        calls, _ = _compile_plan(stages, "continuous")
+    assert [c["scheduler"] for c in calls] == ["karras"]
+    assert caplog.text == ""
+
+
+def test_restart_keeps_per_stage_schedules(cond, caplog):
+    with caplog.at_level(logging.WARNING):
+        calls, _ = _compile_plan(_stages(cond, scheduler="karras", denoise=0.5), "restart")
+    assert [(c["scheduler"], c["denoise"]) for c in calls] == [("normal", 0.8), ("karras", 0.5)]
+    assert caplog.text == ""
+
+
+@pytest.mark.parametrize("handoff, calls", [("continuous", 1), ("restart", 2)])
+def test_continuous_fuses_matching_stages(cond, handoff, calls):
+    model = FakeModel()
+    stages = [_stage(model, cond, cond, 3, "euler", "normal", 5.0) for _ in range(2)]
+    compiled, tail = _compile_plan(stages, handoff)
+    assert len(compiled) == calls and tail is None
+    if handoff == "continuous":
+        assert compiled[0]["window"] == {"steps": 6, "start_step": 0, "last_step": 6, "add_noise": True,
+                                         "force_full_denoise": True}
+
+
+def test_zero_step_stages_are_dropped_with_their_bridges(cond):
+    vae1, vae2 = FakeVAE(seed=1), FakeVAE(16, seed=2)
+    model = FakeModel()
+    stages = [_stage(model, cond, cond, 3, "euler", "normal", 5.0, vae=vae1),
+              _stage(model, cond, cond, 0, "euler", "normal", 5.0, vae=vae2),
+              _stage(model, cond, cond, 3, "euler", "normal", 5.0, vae=vae1)]
+    calls, tail = _compile_plan(stages)
+    assert [c["index"] for c in calls] == [0, 2]
+    assert all(c["bridge_from"] is None for c in calls) and tail is None
+
+
+def test_bridges_only_where_the_vae_changes(cond):
+    vae1, vae2 = FakeVAE(seed=1), FakeVAE(16, seed=2)
+    model = FakeModel()
+    stages = [_stage(model, cond, cond, 3, "euler", "normal", 5.0, vae=vae1),
+              _stage(model, cond, cond, 3, "euler", "normal", 5.0),  # keeps vae1
+              _stage(model, cond, cond, 3, "euler", "normal", 5.0, vae=vae2, bridge_adapter="a"),
+              _stage(model, cond, cond, 0, "euler", "normal", 5.0, vae=vae1, bridge_adapter="b")]
+    calls, tail = _compile_plan(stages)
+    assert [c["bridge_from"] for c in calls] == [None, None, vae1]
+    assert calls[2]["bridge_adapter"] == "a"
+    # the trailing zero-step stage still moves the output back into its VAE's space
+    assert tail == (vae2, vae1, "b")
+
+
+def test_stage_nodes_chain_into_a_plan(cond, latent):
+    model1, model2 = FakeModel(seed=1), FakeModel(seed=2)
+    stage = SwitchSamplerStage()
+    plan, = stage.sample(model=model1, positive=cond, negative=cond, steps=2, sampler_name="euler",
+                         scheduler="normal", cfg=5.0, denoise=1.0)
+    plan, = stage.sample(model=model2, positive=cond, negative=cond, steps=2, sampler_name="euler",
+                         scheduler="normal", cfg=5.0, denoise=1.0, stage_plan=plan, bridge_adapter="none")
+    assert [s["model"] for s in plan] == [model1, model2]
+    assert plan[1]["bridge_adapter"] is None
+
+    out, profile = StagePlanKSampler().sample(stage_plan=plan, seed=3, latent_image=latent)
+    expected, _ = MultiStepKSampler().sample(latent_image=latent, model1=model1, model2=model2, model3=model2,
+                                              **multistep_inputs(cond, steps_stage3=0))
+    assert torch.equal(out["samples"], expected["samples"])
+    assert isinstance(profile, str)
+
+
+def test_empty_plan_is_an_error(latent):
+    with pytest.raises(RuntimeError, match="Empty stage plan"):
+        StagePlanKSampler().sample(stage_plan=[], seed=0, latent_image=latent)
@@ -0,0 +1,29 @@
+import pytest
+import torch
+
+from conftest import FakeModel, multistep_inputs
+from switch_samplers.nodes import multistep
+from switch_samplers.nodes.precision import _precision_dtypes
+
+
+def _bf16_model(seed):
+    model = FakeModel(seed=seed)
+    model.model_dtype = lambda: torch.bfloat16
+    return model
+
+
+def test_default_is_fp32(model):
+    schema = multistep.MultiStepKSampler.INPUT_TYPES()
+    assert schema["optional"]["precision"][1]["default"] == "fp32"
+    assert _precision_dtypes(_bf16_model(1)) == (torch.float32, torch.float32)
+
+
+@pytest.mark.parametrize("precision, dtype", [("fp32", torch.float32), ("auto", torch.float32),
+                                              ("match-model", torch.float32), ("bf16", torch.bfloat16),
+                                              ("fp16", torch.float16)])
+def test_output_dtype(cond, latent, precision, dtype):
+    inputs = multistep_inputs(cond, model1=_bf16_model(1), model2=_bf16_model(2), model3=_bf16_model(3),
+                              precision=precision)
+    out = multistep.MultiStepKSampler().sample(latent_image=latent, **inputs)[0]["samples"]
+    assert out.dtype == dtype
+    assert out.shape == latent["samples"].shape
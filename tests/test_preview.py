@@ -0,0 +1,66 @@
+import latent_preview
+import pytest
+
+from conftest import FakeModel, multistep_inputs
+from switch_samplers.nodes.multistep import MultiStepKSampler
+from switch_samplers.nodes.preview import _PreviewPolicy
+
+
+class LatentFormat:
+    latent_rgb_factors = [[0.1, 0.2, 0.3]] * 4
+
+
+@pytest.fixture
+def previewers(monkeypatch):
+    """Every previewer built, each recording the steps it decoded."""
+    built = []
+
+    class Recording(latent_preview.Latent2RGBPreviewer):
+        def __init__(self, *args):
+            super().__init__(*args)
+            self.decoded = 0
+            built.append(self)
+
+        def decode_latent_to_preview_image(self, preview_format, x0):
+            self.decoded += 1
+            return super().decode_latent_to_preview_image(preview_format, x0)
+
+    monkeypatch.setattr(latent_preview, "Latent2RGBPreviewer", Recording)
+    monkeypatch.setattr(latent_preview, "get_previewer", lambda device, fmt: Recording(fmt.latent_rgb_factors))
+    return built
+
+
+def _models():
+    models = [FakeModel(seed=i) for i in (1, 2)]
+    for model in models:
+        model.model.latent_format = LatentFormat()
+    return models
+
+
+@pytest.mark.parametrize("mode, interval, due", [
+    ("final", 4, [5]),
+    ("every_n", 2, [1, 3, 5]),
+    ("every_n", 4, [3, 5]),
+    ("latent2rgb", 4, [0, 1, 2, 3, 4, 5]),
+])
+def test_due_steps(mode, interval, due):
+    policy = _PreviewPolicy(mode, interval)
+    assert [step for step in range(6) if policy.due(step, 6)] == due
+
+
+@pytest.mark.parametrize("mode, decoded", [("final", 3), ("latent2rgb", 6), ("off", 0)])
+def test_node_previews_under_the_policy(cond, latent, previewers, mode, decoded):
+    m1, m2 = _models()
+    MultiStepKSampler().sample(latent_image=latent, model1=m1, model2=m2, model3=m2,
+                               **multistep_inputs(cond, preview=mode))
+    # one previewer per model for the whole run, however many stages it samples
+    assert len(previewers) == (0 if mode == "off" else 2)
+    assert sum(p.decoded for p in previewers) == decoded
+
+
+def test_previewers_are_rebuilt_per_run(cond, latent, previewers):
+    m1, m2 = _models()
+    for _ in range(2):
+        MultiStepKSampler().sample(latent_image=latent, model1=m1, model2=m2, model3=m2,
+                                   **multistep_inputs(cond, preview="final"))
+    assert len(previewers) == 4
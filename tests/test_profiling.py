@@ -0,0 +1,66 @@
+import json
+
+import pytest
+import torch
+
+from conftest import FakeModel, step_switch_inputs
+from switch_samplers.nodes import profiling, step_switch
+from switch_samplers.nodes.profiling import Profiler, _profiling, _span
+
+
+def _run(cond, latent, **extra):
+    inputs = step_switch_inputs(FakeModel(seed=1), FakeModel(seed=2), cond, profile="summary", **extra)
+    return json.loads(step_switch.StepSwitchKSampler().sample(latent_image=latent, **inputs)[1])
+
+
+def test_cpu_spans_report_current_rss(cond, latent):
+    summary = _run(cond, latent)
+    assert summary["memory"] == "cpu_rss_at_end"
+    stage = next(s for s in summary["spans"] if s["cat"] == "stage")
+    assert "rss_bytes" in stage and "peak_mem_bytes" not in stage
+
+
+def test_model_loads_are_recorded_and_the_hook_removed(cond, latent, monkeypatch):
+    monkeypatch.setattr(profiling.mm, "_loaded", [])
+    load = profiling.mm.load_models_gpu
+    summary = _run(cond, latent, model_residency="auto")
+    loads = [s for s in summary["spans"] if s["name"] == "model_load"]
+    assert [s["models"] for s in loads] == [["FakeModel"], ["FakeModel"]]
+    assert profiling.mm.load_models_gpu is load
+
+
+@pytest.fixture
+def fake_cuda(monkeypatch):
+    """CUDA memory counters driven by the test; resetting the peak is an error."""
+    state = {"allocated": 100, "high_water": 500}
+    monkeypatch.setattr(torch.cuda, "is_available", lambda: True)
+    monkeypatch.setattr(torch.cuda, "memory_allocated", lambda *a: state["allocated"])
+    monkeypatch.setattr(torch.cuda, "max_memory_allocated", lambda *a: state["high_water"])
+    monkeypatch.setattr(torch.cuda, "reset_peak_memory_stats", lambda *a: pytest.fail("peak stats reset"))
+    monkeypatch.setattr(profiling, "_POLL_S", 3600)
+    return state
+
+
+def test_cuda_peak_without_resetting_the_global_counter(fake_cuda):
+    with _profiling("test", {"profile": "summary"}) as profile:
+        with _span("outer", "stage"):
+            with _span("quiet", "sampler"):
+                # below the old high-water mark: only the samples count
+                fake_cuda["allocated"] = 300
+            fake_cuda["allocated"] = 100
+            with _span("spike", "bridge"):
+                fake_cuda["high_water"] = 900
+    peaks = {s["name"]: s["peak_mem_bytes"] for s in json.loads(profile.report)["spans"]}
+    assert peaks == {"outer": 900, "quiet": 300, "spike": 900}
+
+
+def test_poller_samples_open_spans(fake_cuda):
+    profiler = Profiler("test")
+    try:
+        with profiler.span("stage", "stage", {}) as span:
+            fake_cuda["allocated"] = 700
+            profiler._sample()
+            fake_cuda["allocated"] = 100
+        assert span.peak == 700
+    finally:
+        profiler.close()
@@ -0,0 +1,46 @@
+import pytest
+import torch
+
+from conftest import FakeModel, FakeVAE, multistep_inputs
+from switch_samplers.nodes import cross_multistep, multistep, progressive
+from switch_samplers.nodes.progressive import _resize_latent
+
+
+def _inputs(cond, **extra):
+    return multistep_inputs(cond, model1=FakeModel(seed=1), model2=FakeModel(seed=2), model3=FakeModel(seed=3),
+                            scale_stage1=0.5, scale_stage2=0.5, **extra)
+
+
+def test_zero_step_last_stage_still_returns_full_size(cond):
+    latent = {"samples": torch.randn(1, 4, 16, 16, generator=torch.Generator().manual_seed(0))}
+    out = multistep.MultiStepKSampler().sample(latent_image=latent, **_inputs(cond, steps_stage3=0))[0]["samples"]
+    assert out.shape == (1, 4, 16, 16)
+
+
+def test_final_resize_follows_a_tail_bridge(cond):
+    latent = {"samples": torch.randn(1, 4, 16, 16, generator=torch.Generator().manual_seed(0))}
+    inputs = _inputs(cond, steps_stage3=0, vae1=FakeVAE(seed=1), vae2=FakeVAE(seed=1),
+                     vae3=FakeVAE(16, seed=3, factor=16))
+    out = cross_multistep.CrossMultiStepKSampler().sample(latent_image=latent, **inputs)[0]["samples"]
+    # full size in the 16x VAE's space is half the input's latent size
+    assert out.shape == (1, 16, 8, 8)
+
+
+def test_resize_folds_video_frames_into_the_batch(monkeypatch):
+    seen = []
+    upscale = progressive.comfy.utils.common_upscale
+    monkeypatch.setattr(progressive.comfy.utils, "common_upscale",
+                        lambda s, *args: seen.append(s.shape) or upscale(s, *args))
+    clip = torch.randn(2, 4, 3, 8, 8)
+    out = _resize_latent(clip, (16, 16), "bislerp")
+    assert seen == [(6, 4, 8, 8)]
+    assert out.shape == (2, 4, 3, 16, 16)
+    assert torch.allclose(out[:, :, 1], _resize_latent(clip[:, :, 1], (16, 16), "bislerp"))
+
+
+def test_resize_errors_are_not_swallowed(monkeypatch):
+    def fail(*args):
+        raise RuntimeError("bislerp failed")
+    monkeypatch.setattr(progressive.comfy.utils, "common_upscale", fail)
+    with pytest.raises(RuntimeError, match="bislerp failed"):
+        _resize_latent(torch.randn(1, 4, 8, 8), (16, 16), "bislerp")
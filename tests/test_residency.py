@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+import torch
+
+from conftest import FakeModel, step_switch_inputs
+from switch_samplers.nodes import residency, step_switch
+
+
+@pytest.fixture
+def loaded(monkeypatch):
+    monkeypatch.setattr(residency.mm, "_loaded", [])
+    return residency.mm._loaded
+
+
+def test_default_leaves_loading_to_comfy(cond, latent, loaded):
+    node = step_switch.StepSwitchKSampler()
+    assert node.INPUT_TYPES()["optional"]["model_residency"][1]["default"] == "off"
+    node.sample(latent_image=latent, **step_switch_inputs(FakeModel(seed=1), FakeModel(seed=2), cond))
+    assert loaded == []
+
+
+def test_auto_loads_every_stage_model_up_front(cond, latent, loaded):
+    model1, model2 = FakeModel(seed=1), FakeModel(seed=2)
+    step_switch.StepSwitchKSampler().sample(latent_image=latent, model_residency="auto",
+                                            **step_switch_inputs(model1, model2, cond))
+    assert loaded == [model1, model2]
+
+
+def test_pinned_prefetch_runs_in_the_background_and_keeps_its_buffers(monkeypatch, loaded):
+    model1, model2 = FakeModel(seed=1), FakeModel(seed=2)
+    # too big to keep both resident, so the next stage is prefetched
+    monkeypatch.setattr(residency.mm, "get_free_memory", lambda *args: 0)
+    release = threading.Event()
+    prefetched, installed = [], []
+
+    def prefetch(model, buffers, device, budget):
+        release.wait(timeout=10)
+        prefetched.append((model, buffers, threading.current_thread() is not threading.main_thread()))
+        return model, "done"
+    monkeypatch.setattr(residency, "_prefetch_host_weights", prefetch)
+    monkeypatch.setattr(residency, "_install_prefetched",
+                        lambda staged, done: installed.append((staged, threading.get_ident())))
+
+    buffers = []
+    for _ in range(2):
+        with residency._stage_residency([model1, model2], {"model_residency": "pinned_prefetch"}) as res:
+            res.enter(0)
+            # stage 1 samples while the prefetch is still running
+            assert prefetched == [] and installed == []
+            release.set()
+            res.enter(1)
+            assert installed == [(model2, threading.get_ident())]
+        (model, kept, on_worker), = prefetched
+        assert model is model2 and on_worker
+        buffers.append(kept)
+        for record in (prefetched, installed):
+            record.clear()
+        release.clear()
+    # one set of pinned buffers per model, reused by the next prompt
+    assert buffers[0] is buffers[1] is residency._residency._pinned_buffers(model2.clone())
+
+    with residency._stage_residency([model1, model2], {"model_residency": "auto"}) as res:
+        res.enter(0)
+    assert prefetched == []
+
+
+def test_failed_prefetch_leaves_loading_to_comfy(monkeypatch, loaded):
+    monkeypatch.setattr(residency.mm, "get_free_memory", lambda *args: 0)
+
+    def prefetch(*args):
+        raise RuntimeError("out of pinned memory")
+    monkeypatch.setattr(residency, "_prefetch_host_weights", prefetch)
+    with residency._stage_residency([FakeModel(seed=1), FakeModel(seed=2)],
+                                    {"model_residency": "pinned_prefetch"}) as res:
+        res.enter(0)
+        res.enter(1)
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="pinning needs CUDA")
+def test_prefetch_installs_device_copies_within_the_budget():
+    model = FakeModel()
+    params = dict(model.model.named_parameters())
+    buffers = {}
+    device = torch.device("cuda")
+    sizes = {name: p.numel() * p.element_size() for name, p in params.items()}
+    first = next(iter(sizes))
+    residency._install_prefetched(*residency._prefetch_host_weights(model, buffers, device, sizes[first]))
+    assert params[first].device.type == "cuda"
+    rest = [p for name, p in params.items() if name != first]
+    assert all(p.device.type == "cpu" and p.is_pinned() for p in rest)
+    assert set(buffers) == set(params)
@@ -0,0 +1,100 @@
+import gc
+import os
+
+import pytest
+import torch
+
+from conftest import FakeModel, FakeVAE, multistep_inputs
+from switch_samplers.nodes import bridge, helpers, microbatch, plan, spill
+from switch_samplers.nodes.bridge import _bridge_latent
+from switch_samplers.nodes.cross_multistep import CrossMultiStepKSampler
+from switch_samplers.nodes.multistep import MultiStepKSampler
+from switch_samplers.nodes.spill import _is_spilled, _spill, _spill_dir, _unspill
+
+
+@pytest.mark.parametrize("mode", ["pinned", "disk"])
+def test_spill_keeps_the_values_off_the_device(mode):
+    samples = torch.randn(2, 4, 8, 8)
+    out = _spill(samples, mode)
+    assert out.device.type == "cpu"
+    assert torch.equal(out, samples) and _is_spilled(out)
+    assert not _is_spilled(samples)
+
+
+def test_disk_spill_leaves_no_files():
+    samples = torch.randn(2, 4, 8, 8)
+    out = _spill(samples, "disk")
+    assert out.data_ptr() != samples.data_ptr()
+    # the mapping outlives the file name
+    assert os.listdir(_spill_dir()) == []
+    key = id(out)
+    del out
+    gc.collect()
+    assert key not in spill._spilled
+
+
+def test_off_passes_through():
+    samples = torch.randn(1, 4, 2, 2)
+    assert _spill(samples, "off") is samples and not _is_spilled(samples)
+
+
+@pytest.mark.parametrize("mode", ["pinned", "disk"])
+def test_latents_between_stages_are_spilled(cond, latent, monkeypatch, mode):
+    spilled = []
+
+    def record(samples, spill_mode="off"):
+        out = _spill(samples, spill_mode)
+        spilled.append(_is_spilled(out))
+        return out
+    monkeypatch.setattr(plan, "_spill", record)
+    m1, m2 = FakeModel(seed=1), FakeModel(seed=2)
+    inputs = multistep_inputs(cond)
+    expected, _ = MultiStepKSampler().sample(latent_image=latent, model1=m1, model2=m2, model3=m2, **inputs)
+    out, _ = MultiStepKSampler().sample(latent_image=latent, model1=m1, model2=m2, model3=m2, latent_spill=mode,
+                                        **inputs)
+    # once after each stage but the last
+    assert spilled == [False, False, True, True]
+    assert torch.equal(out["samples"], expected["samples"])
+
+
+def test_bridge_pixels_are_spilled(latent, monkeypatch):
+    modes = []
+
+    def record(samples, spill_mode="off"):
+        modes.append(spill_mode)
+        return _spill(samples, spill_mode)
+    monkeypatch.setattr(bridge, "_spill", record)
+    src, dst = FakeVAE(seed=1), FakeVAE(16, seed=2)
+    out = _bridge_latent(latent["samples"], src, dst, spill="disk")
+    assert modes == ["disk"]
+    assert torch.equal(out, _bridge_latent(latent["samples"], src, dst))
+
+
+def test_cross_node_accepts_spill(cond, latent):
+    inputs = dict(multistep_inputs(cond), positive1=cond, negative1=cond, model1=FakeModel(seed=1),
+                  model2=FakeModel(16, seed=2), model3=FakeModel(16, seed=3), vae1=FakeVAE(seed=1),
+                  vae2=FakeVAE(16, seed=2))
+    out, _ = CrossMultiStepKSampler().sample(latent_image=latent, latent_spill="pinned", **inputs)
+    assert out["samples"].shape == (2, 16, 8, 8)
+
+
+@pytest.mark.parametrize("micro_batch", ["on_oom", "off"])
+def test_spilled_latents_stream_to_the_device_per_chunk(model, cond, monkeypatch, micro_batch):
+    latent = {"samples": torch.randn(4, 4, 8, 8, generator=torch.Generator().manual_seed(0))}
+    kwargs = dict(steps=4, sampler_name="euler_ancestral", scheduler="normal", cfg=5.0, positive=cond,
+                  negative=cond, seed=7, micro_batch=micro_batch)
+    whole = helpers._call_ksampler(model, latent, **kwargs)["samples"]
+
+    # room for the model and two latents at a time
+    monkeypatch.setattr(microbatch, "_sample_bytes", lambda *args: 1 << 30)
+    monkeypatch.setattr(microbatch.mm, "get_free_memory", lambda *args: (2 << 30) + model.model_size())
+    transfers = []
+
+    def unspill(samples, device):
+        transfers.append(samples.shape[0])
+        return _unspill(samples, device)
+    monkeypatch.setattr(helpers, "_unspill", unspill)
+    out = helpers._call_ksampler(model, {"samples": _spill(latent["samples"], "disk")}, **kwargs)["samples"]
+    assert transfers == [2, 2]
+    # the chunks draw the whole batch's per-step noise
+    assert torch.allclose(out, whole, atol=1e-5)
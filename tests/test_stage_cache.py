@@ -0,0 +1,145 @@
+import torch
+
+from conftest import FakeModel, step_switch_inputs
+from switch_samplers.nodes import step_switch
+from switch_samplers.nodes.stage_cache import _cache_settings, _schema_for_stage_cache, _stage_cache, _stage_key
+
+
+def _lora(seed):
+    g = torch.Generator().manual_seed(seed)
+    return ("lora", (torch.randn(4, 2, generator=g), torch.randn(2, 4, generator=g), None, None))
+
+
+def _patched(base, lora):
+    m = base.clone()
+    m.patches = {"model.0.weight": [(1.0, lora, 1.0, None, None)]}
+    return m
+
+
+def test_cache_is_off_by_default():
+    assert _schema_for_stage_cache()["stage_cache"][1]["default"] == "off"
+    assert _cache_settings({}) == (False, False)
+
+
+def test_key_covers_patch_contents_not_just_strengths():
+    base = FakeModel(seed=1)
+    a, b = _patched(base, _lora(1)), _patched(base, _lora(2))
+    # same uuid and strengths, different LoRA tensors
+    assert a.patches_uuid == b.patches_uuid
+    assert _stage_key(a) != _stage_key(b)
+    assert _stage_key(a) == _stage_key(_patched(base, _lora(1)))
+
+
+def test_key_ignores_weights_patched_in_place():
+    m = FakeModel(seed=1)
+    before = _stage_key(m)
+    weight = m.model[0].weight
+    m.backup = {"0.weight": type("Backup", (), {"weight": weight.clone()})()}
+    with torch.no_grad():
+        weight.add_(1.0)
+    m.patches_uuid = object()
+    assert _stage_key(m) == before
+
+
+def test_unhashable_patch_disables_the_key():
+    m = FakeModel(seed=1).clone()
+    m.patches = {"model.0.weight": [(1.0, object(), 1.0, None, None)]}
+    assert _stage_key(m) is None
+
+
+def test_swapped_lora_is_not_served_from_cache(cond):
+    base = FakeModel(seed=1)
+    latent = {"samples": torch.randn(1, 4, 8, 8)}
+    node = step_switch.StepSwitchKSampler()
+    first = _patched(base, _lora(1))
+    node.sample(latent_image=latent, **step_switch_inputs(first, first, cond, stage_cache="memory"))
+    hits = _stage_cache.hits
+    other = _patched(base, _lora(2))
+    node.sample(latent_image=latent, **step_switch_inputs(other, other, cond, stage_cache="memory"))
+    assert _stage_cache.hits == hits
+    node.sample(latent_image=latent, **step_switch_inputs(other, other, cond, stage_cache="memory"))
+    assert _stage_cache.hits == hits + 2
+
+
+class ModelSamplingFlow(torch.nn.Module):
+    """Like comfy's ModelSamplingDiscreteFlow: the shift is a plain attribute next to the sigmas buffer."""
+
+    def __init__(self, shift):
+        super().__init__()
+        self.shift = shift
+        self.register_buffer("sigmas", torch.linspace(1.0, 0.0, 10) * shift / (1 + (shift - 1) * 0.5))
+
+
+class AttnPatch:
+    def __init__(self, seed):
+        self.weight = torch.randn(4, 4, generator=torch.Generator().manual_seed(seed))
+
+    def __call__(self, q, k, v, extra_options):
+        return q, k, v
+
+
+def _with_shift(base, shift):
+    m = base.clone()
+    m.object_patches = {"model_sampling": ModelSamplingFlow(shift)}
+    return m
+
+
+def _with_attn_patch(base, patch):
+    m = base.clone()
+    m.model_options["transformer_options"]["patches_replace"] = {"attn1": {("input", 1): patch}}
+    return m
+
+
+def test_key_covers_object_patches():
+    base = FakeModel(seed=1)
+    assert _stage_key(_with_shift(base, 3.0)) != _stage_key(_with_shift(base, 6.0))
+    assert _stage_key(_with_shift(base, 3.0)) == _stage_key(_with_shift(base, 3.0))
+    assert _stage_key(_with_shift(base, 3.0)) != _stage_key(base)
+
+
+def test_key_covers_option_object_contents():
+    base = FakeModel(seed=1)
+    a, b = _with_attn_patch(base, AttnPatch(1)), _with_attn_patch(base, AttnPatch(2))
+    assert _stage_key(a) != _stage_key(b)
+    assert _stage_key(a) == _stage_key(_with_attn_patch(base, AttnPatch(1)))
+
+
+def test_key_covers_what_option_functions_close_over():
+    def wrapper_for(scale):
+        def wrapper(apply_model, args):
+            return apply_model(args["input"], args["timestep"], **args["c"]) * scale
+        return wrapper
+
+    base = FakeModel(seed=1)
+    keys = []
+    for scale in (1.0, 2.0, 1.0):
+        m = base.clone()
+        m.model_options["model_function_wrapper"] = wrapper_for(scale)
+        keys.append(_stage_key(m))
+    assert keys[0] != keys[1] and keys[0] == keys[2]
+
+
+def test_option_that_cant_be_fingerprinted_disables_the_key():
+    m = FakeModel(seed=1).clone()
+    m.model_options["transformer_options"]["patches"] = {"attn1_patch": [object()]}
+    assert _stage_key(m) is None
+
+
+def test_reference_cycles_in_options_are_hashed():
+    m = FakeModel(seed=1).clone()
+    patch = AttnPatch(1)
+    patch.owner = patch
+    m.model_options["transformer_options"]["patches_replace"] = {"attn1": {("input", 1): patch}}
+    assert _stage_key(m) is not None
+
+
+def test_changed_shift_is_not_served_from_cache(cond):
+    base = FakeModel(seed=1)
+    latent = {"samples": torch.randn(1, 4, 8, 8)}
+    node = step_switch.StepSwitchKSampler()
+    first = _with_shift(base, 3.0)
+    node.sample(latent_image=latent, **step_switch_inputs(first, first, cond, stage_cache="memory"))
+    hits = _stage_cache.hits
+    other = _with_shift(base, 6.0)
+    node.sample(latent_image=latent, **step_switch_inputs(other, other, cond, stage_cache="memory"))
+    assert _stage_cache.hits == hits
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+import torch
+
+from conftest import FakeModel, step_switch_inputs
+from switch_samplers.nodes.step_switch import StepSwitchKSampler
+from switch_samplers.nodes.sweep import _SWEEP_PARAMS, StepSwitchSweepKSampler, _parse_values
+
+
+def _sweep_inputs(cond, **sweep):
+    inputs = step_switch_inputs(FakeModel(seed=1), FakeModel(seed=2), cond)
+    # swept inputs are strings of values
+    inputs.update({name: str(inputs[name]) for name, _, _ in _SWEEP_PARAMS})
+    inputs.update(sweep)
+    return inputs
+
+
+def test_parse_values_keeps_order_and_drops_duplicates():
+    assert _parse_values("3, 2\n3,,", "switch_point", int) == [3, 2]
+    with pytest.raises(ValueError, match="cannot read 'x' as int"):
+        _parse_values("1, x", "switch_point", int)
+    with pytest.raises(ValueError, match="unknown value 'nope'"):
+        _parse_values("nope", "sampler_after", str, lambda: ["euler"])
+    with pytest.raises(ValueError, match="is empty"):
+        _parse_values(" , ", "cfg_after", float)
+
+
+def test_sweep_matches_single_runs_and_shares_prefixes(cond, latent):
+    inputs = _sweep_inputs(cond, sampler_after="euler, dpmpp_2m", cfg_after="5.0, 3.0")
+    out, manifest, _ = StepSwitchSweepKSampler().sample(latent_image=latent, **inputs)
+    manifest = json.loads(manifest)
+
+    # four configs, one shared first stage
+    assert manifest["unshared_calls"] == 8 and manifest["sampler_calls"] == 5
+    assert out["samples"].shape[0] == 4 * latent["samples"].shape[0]
+    single_inputs = step_switch_inputs(inputs["model1"], inputs["model2"], cond)
+    for config in manifest["configs"]:
+        single = dict(single_inputs, sampler_after=config["sampler_after"], cfg_after=config["cfg_after"])
+        expected = StepSwitchKSampler().sample(latent_image=latent, **single)[0]["samples"]
+        assert torch.equal(out["samples"][config["batch_index"]], expected)
+
+
+def test_rerun_is_served_from_the_stage_cache(cond, latent):
+    inputs = _sweep_inputs(cond, switch_point="2, 4", stage_cache="memory")
+    first, manifest, _ = StepSwitchSweepKSampler().sample(latent_image=latent, **inputs)
+    assert json.loads(manifest)["cache_hits"] == 0
+    again, manifest, _ = StepSwitchSweepKSampler().sample(latent_image=latent, **inputs)
+    manifest = json.loads(manifest)
+    assert manifest["sampler_calls"] == 0 and manifest["cache_hits"] == 4
+    assert torch.equal(first["samples"], again["samples"])
+
+
+class Counting(FakeModel):
+    def __init__(self, seed):
+        super().__init__(seed=seed)
+        self.calls = []  # shared with clones
+
+    def denoise(self, x, sigma):
+        self.calls.append(sigma)
+        return super().denoise(x, sigma)
+
+
+@pytest.mark.parametrize("sampler, steps_before", [("euler", 8), ("dpmpp_2m", 18)])
+def test_continuous_sweep_resumes_from_shorter_switch_points(cond, latent, sampler, steps_before):
+    inputs = _sweep_inputs(cond, switch_point="4, 6, 8", sampler_before=sampler, handoff_mode="continuous")
+    inputs.update(model1=Counting(seed=1), total_steps=12)
+    out, manifest, _ = StepSwitchSweepKSampler().sample(latent_image=latent, **inputs)
+    manifest = json.loads(manifest)
+
+    # euler samples [0, 4) once, then [4, 6) and [6, 8) from the cached latents; dpmpp_2m keeps its history
+    assert manifest["unshared_steps"] == 36
+    assert manifest["sampled_steps"] == steps_before + 18
+    assert len(inputs["model1"].calls) == 2 * steps_before
+    single_inputs = step_switch_inputs(inputs["model1"], inputs["model2"], cond, handoff_mode="continuous")
+    single_inputs.update(sampler_before=sampler, total_steps=12)
+    for config in manifest["configs"]:
+        single = dict(single_inputs, switch_point=config["switch_point"])
+        expected = StepSwitchKSampler().sample(latent_image=latent, **single)[0]["samples"]
+        assert torch.equal(out["samples"][config["batch_index"]], expected)
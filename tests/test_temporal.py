@@ -0,0 +1,73 @@
+import pytest
+import torch
+
+from conftest import FakeModel, FakeVAE, multistep_inputs
+from switch_samplers.nodes import multistep, plan, temporal
+from switch_samplers.nodes.temporal import _window_wrapper
+
+
+@pytest.fixture
+def clip():
+    return {"samples": torch.randn(1, 4, 8, 8, 8, generator=torch.Generator().manual_seed(0))}
+
+
+def _apply_model(x, t, **c):
+    return x * 0.5 + c.get("c_concat", 0)
+
+
+def test_windows_blend_every_model_call(clip):
+    seen, x = [], clip["samples"]
+
+    def previous(apply_model, args):
+        seen.append((args["input"].shape[2], args["c"]["c_concat"].shape[2], args["c"]["transformer_options"]))
+        return apply_model(args["input"], args["timestep"], **args["c"])
+
+    c = {"c_concat": torch.ones_like(x), "transformer_options": {"k": 1}}
+    out = _window_wrapper(4, 3, previous)(_apply_model, {"input": x, "timestep": torch.ones(1), "c": c,
+                                                         "cond_or_uncond": [0]})
+    # windows at frames 0, 3 and 4; the previous wrapper and conditioning see each window
+    assert seen == [(4, 4, {"k": 1})] * 3
+    assert torch.allclose(out, _apply_model(x, None, **c))
+
+
+def test_windowed_stage_matches_unwindowed_for_a_framewise_model(cond, clip):
+    inputs = multistep_inputs(cond, model1=FakeModel(seed=1), model2=FakeModel(seed=2), model3=FakeModel(seed=3))
+    node = multistep.MultiStepKSampler()
+    whole = node.sample(latent_image=clip, **inputs)[0]["samples"]
+    windowed = node.sample(latent_image=clip, temporal_window=3, temporal_stride=2, **inputs)[0]["samples"]
+    assert windowed.shape == whole.shape
+    assert torch.allclose(windowed, whole, atol=1e-5)
+
+
+def test_model_calls_are_windowed_inside_one_sampler_run(cond, clip, monkeypatch):
+    calls, original = [], plan._call_ksampler
+    monkeypatch.setattr(plan, "_call_ksampler", lambda *a, **k: calls.append(1) or original(*a, **k))
+    sizes, denoise = [], FakeModel.denoise
+    monkeypatch.setattr(FakeModel, "denoise",
+                        lambda self, x, sigma: sizes.append(x.shape[2]) or denoise(self, x, sigma))
+    inputs = multistep_inputs(cond, model1=FakeModel(seed=1), model2=FakeModel(seed=2), model3=FakeModel(seed=3))
+    multistep.MultiStepKSampler().sample(latent_image=clip, temporal_window=4, temporal_stride=3, **inputs)
+    assert set(sizes) == {4}
+    # 3 stages x 2 steps x (cond, uncond) model calls, each split into 3 windows
+    assert len(sizes) == 3 * 2 * 2 * 3
+
+
+def test_adaptive_stop_reaches_the_windowed_sampler(model, clip, monkeypatch):
+    seen = {}
+    monkeypatch.setattr(temporal, "_call_ksampler", lambda m, latent, stop=None, **kw: seen.update(stop=stop, model=m))
+    stop = object()
+    temporal._sample_temporal(model, clip, {"seed": 1}, 4, 3, stop=stop)
+    assert seen["stop"] is stop
+    assert seen["model"] is not model and "model_function_wrapper" not in model.model_options
+
+
+@pytest.mark.parametrize("causal, frames", [(False, [2, 2, 2, 2]), (True, [8])])
+def test_bridge_windows_only_non_causal_vaes(clip, monkeypatch, causal, frames):
+    seen = []
+    monkeypatch.setattr(plan, "_bridge_latent", lambda samples, *a, **k: seen.append(samples.shape[2]) or samples)
+    src, dst = FakeVAE(seed=1), FakeVAE(16, seed=2)
+    if causal:
+        dst.temporal_compression_decode = lambda: 4
+    bridge = plan._make_bridge(src, dst, None, 0, 1, {"temporal_window": 2})
+    assert torch.equal(bridge(clip["samples"]), clip["samples"])
+    assert seen == frames
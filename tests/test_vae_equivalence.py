@@ -0,0 +1,55 @@
+import pytest
+import torch
+
+from conftest import FakeModel, FakeVAE, step_switch_inputs
+from switch_samplers.nodes.bridge import _bridge_decision
+from switch_samplers.nodes.capabilities import _vae_fingerprint
+from switch_samplers.nodes.cross_step_switch import CrossStepSwitchKSampler
+
+
+class ScaledFormat:
+    def __init__(self, scale):
+        self.scale_factor = scale
+
+
+def test_one_file_loaded_twice_is_the_same_latent_space():
+    vae, again = FakeVAE(seed=1), FakeVAE(seed=1)
+    again.first_stage_model.half()  # the same weights loaded at fp16
+    assert _vae_fingerprint(vae) == _vae_fingerprint(again)
+    assert _bridge_decision(vae, again) == (False, "equivalent VAEs (same latent format, channels, scaling and "
+                                                   "weights)")
+
+
+@pytest.mark.parametrize("change, field", [
+    (lambda vae: setattr(vae, "latent_format", ScaledFormat(0.18215)), "latent_format"),
+    (lambda vae: setattr(vae, "downscale_ratio", 16), "spatial_factor"),
+    (lambda vae: vae.first_stage_model["to_rgb"].add_(1.0), "weights"),
+])
+def test_any_difference_keeps_the_bridge(change, field):
+    vae, other = FakeVAE(seed=1), FakeVAE(seed=1)
+    change(other)
+    needed, reason = _bridge_decision(vae, other)
+    assert needed and field in reason
+
+
+def test_trivial_decisions():
+    vae = FakeVAE(seed=1)
+    assert _bridge_decision(vae, vae) == (False, "same VAE")
+    assert _bridge_decision(vae, None) == (False, "no VAE on one side")
+    assert _bridge_decision(vae, FakeVAE(16, seed=2))[0]
+
+
+def test_vaes_without_weights_are_bridged():
+    vae, other = FakeVAE(seed=1), FakeVAE(seed=1)
+    del other.first_stage_model
+    assert _bridge_decision(vae, other) == (True, "VAE weights can't be fingerprinted")
+
+
+def test_equivalent_vaes_skip_the_round_trip(cond, latent):
+    vae1, vae2 = FakeVAE(seed=1), FakeVAE(seed=1)
+    vae2.decode = vae2.encode = None  # any bridge through vae2 would fail
+    vae1.decode = None
+    inputs = step_switch_inputs(FakeModel(seed=1), FakeModel(seed=2), cond, positive1=cond, negative1=cond)
+    out = CrossStepSwitchKSampler().sample(latent_image=latent, vae1=vae1, vae2=vae2, **inputs)[0]
+    same = CrossStepSwitchKSampler().sample(latent_image=latent, vae1=vae1, vae2=vae1, **inputs)[0]
+    assert torch.equal(out["samples"], same["samples"])